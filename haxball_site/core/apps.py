@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     name = 'core'
     verbose_name = '1. Социалочка'
+
+    def ready(self):
+        from haxball_site import fragments  # noqa: F401 подключаем сигналы сброса кэша фрагментов
@@ -0,0 +1,36 @@
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from .models import LikeDislike, Profile
+
+
+def karma_by_author(users=None):
+    """
+    Карма {id пользователя: карма} одним запросом: сумма голосов за новые комментарии и посты автора,
+    голоса автора за самого себя не считаются.
+    """
+    votes = (
+        LikeDislike.objects.filter(Q(n_comments__isnull=False) | Q(posts__isnull=False))
+        .annotate(author=Coalesce('n_comments__author', 'posts__author'))
+        .exclude(user=F('author'))
+    )
+    if users is not None:
+        votes = votes.filter(author__in=users)
+    return dict(votes.order_by().values('author').annotate(karma=Sum('vote')).values_list('author', 'karma'))
+
+
+def refresh_karma(users=None):
+    """Пересчитывает карму всех (или указанных) пользователей и сохраняет изменившиеся. Возвращает их профили."""
+    karma = karma_by_author(users)
+    profiles = Profile.objects.select_related('name').only('id', 'karma', 'name__username')
+    if users is not None:
+        profiles = profiles.filter(name__in=users)
+
+    changed = []
+    for profile in profiles:
+        value = karma.get(profile.name_id, 0)
+        if profile.karma != value:
+            profile.karma = value
+            changed.append(profile)
+    Profile.objects.bulk_update(changed, ['karma'], batch_size=500)
+    return changed
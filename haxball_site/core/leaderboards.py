@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import NewComment
+
+# В кэше держим больше, чем показываем: тогда уменьшение лайков у комментария из топа
+# почти никогда не требует пересчета - следующий кандидат уже в списке
+LEADERBOARD_SIZE = getattr(settings, 'TOP_COMMENTS_LEADERBOARD_SIZE', 25)
+LEADERBOARD_TIMEOUT = getattr(settings, 'TOP_COMMENTS_LEADERBOARD_TIMEOUT', 60 * 60)
+WINDOWS = ('day', 'week', 'month', 'year')
+
+
+def window_starts(now=None):
+    """Начала текущих дня, недели (с понедельника), месяца и года в локальном времени."""
+    day = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'day': day,
+        'week': day - timezone.timedelta(days=day.weekday()),
+        'month': day.replace(day=1),
+        'year': day.replace(month=1, day=1),
+    }
+
+
+def _key(window, start):
+    # Дата начала в ключе: с новым днем/неделей/... просто начинается новый список, старый протухнет сам
+    return f'core:top_comments:{window}:{start.date().isoformat()}'
+
+
+def _rank(entry):
+    comment_id, likes = entry
+    return -likes, -comment_id
+
+
+def compute_leaderboard(start):
+    """Топ комментариев с начала окна одним запросом по индексу лайков: [(id, лайки)]."""
+    return list(
+        NewComment.objects.filter(created__gte=start)
+        .order_by('-likes_count', '-id')
+        .values_list('id', 'likes_count')[:LEADERBOARD_SIZE]
+    )
+
+
+def get_leaderboard(window, start):
+    key = _key(window, start)
+    board = cache.get(key)
+    if board is None:
+        board = compute_leaderboard(start)
+        cache.set(key, board, LEADERBOARD_TIMEOUT)
+    return board
+
+
+def update_leaderboards(comment):
+    """
+    Переносит новый счетчик лайков комментария в списки окон, в которые он попадает, без запросов к базе.
+    Если комментарий выпал из заполненного списка, следующего за ним не знаем - такой список сбрасываем.
+    """
+    for window, start in window_starts().items():
+        if comment.created < start:
+            continue
+        key = _key(window, start)
+        board = cache.get(key)
+        if board is None:
+            continue
+
+        entry = (comment.id, comment.likes_count)
+        others = [item for item in board if item[0] != comment.id]
+        was_listed = len(others) < len(board)
+        is_full = len(board) >= LEADERBOARD_SIZE
+        if is_full and others and _rank(entry) > _rank(others[-1]):
+            if was_listed:
+                cache.delete(key)
+            continue
+
+        cache.set(key, sorted([*others, entry], key=_rank)[:LEADERBOARD_SIZE], LEADERBOARD_TIMEOUT)
+
+
+def top_comments(count):
+    """{окно: комментарии} для сайдбара: четыре списка из кэша и один запрос за самими комментариями."""
+    boards = {
+        window: get_leaderboard(window, start)[:count] for window, start in window_starts().items()
+    }
+    comments = (
+        NewComment.objects.select_related('author')
+        .prefetch_related('content_object')
+        .in_bulk({comment_id for board in boards.values() for comment_id, _ in board})
+    )
+    return {
+        window: [comments[comment_id] for comment_id, _ in board if comment_id in comments]
+        for window, board in boards.items()
+    }
+
+
+def clear_leaderboards():
+    for window, start in window_starts().items():
+        cache.delete(_key(window, start))
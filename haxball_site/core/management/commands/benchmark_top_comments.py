@@ -0,0 +1,126 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from core.leaderboards import clear_leaderboards, top_comments, update_leaderboards, window_starts
+from core.models import LikeDislike, NewComment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить старый подсчет топа комментариев (Count по голосам) с кэшируемыми списками '
+        'на сгенерированных данных. Все данные создаются в транзакции и откатываются'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=1_000_000)
+        parser.add_argument('--votes', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=1000, help='сколько существующих пользователей голосуют')
+        parser.add_argument('--repeat', type=int, default=20, help='повторов каждого замера')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.order_by('id').values_list('id', flat=True)[:options['users']])
+        if not users:
+            raise CommandError('Нужен хотя бы один пользователь')
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            comment_ids = self.generate(users, options['comments'], options['votes'])
+            print(
+                f'Generated {options["comments"]} comments and {options["votes"]} votes '
+                f'in {time.perf_counter() - started:.1f}s'
+            )
+
+            repeat = options['repeat']
+            clear_leaderboards()
+            self.report('old: Count over votes, 4 windows', self.old_top_comments, repeat)
+            self.report('new: cold cache', lambda: (clear_leaderboards(), top_comments(5)), repeat)
+            self.report('new: warm cache', lambda: top_comments(5), repeat)
+
+            # Голоса за свежие комментарии - именно они двигают дневной и недельный топ
+            recent = list(
+                NewComment.objects.filter(id__gte=comment_ids[0], created__gte=window_starts()['week'])
+                .only('id', 'created', 'likes_count')[:1000]
+            )
+            if recent:
+                def vote():
+                    comment = random.choice(recent)
+                    comment.likes_count += 1
+                    update_leaderboards(comment)
+
+                self.report('new: leaderboard update per vote', vote, repeat * 50)
+
+            clear_leaderboards()
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def generate(users, comments, votes):
+        comment_table = NewComment._meta.db_table
+        vote_table = LikeDislike._meta.db_table
+        post_type = ContentType.objects.get_for_model(Post).id
+        comment_type = ContentType.objects.get_for_model(NewComment).id
+
+        with connection.cursor() as cursor:
+            # id берем из RETURNING: по max(id) до вставки нельзя, последовательность не откатывается
+            cursor.execute(
+                f'''
+                WITH inserted AS (
+                INSERT INTO {comment_table} (content_type_id, object_id, author_id, body, created, version, path,
+                                             descendants_count, likes_count, dislikes_count)
+                SELECT %s, 1 + mod(g, 5000), (%s::int[])[1 + floor(random() * %s)::int], 'benchmark',
+                       now() - random() * interval '730 days', 1, '', 0, 0, 0
+                FROM generate_series(1, %s) g
+                RETURNING id
+                )
+                SELECT array_agg(id ORDER BY id) FROM inserted
+                ''',
+                [post_type, users, len(users), comments],
+            )
+            (comment_ids,) = cursor.fetchone()
+            # Голоса распределены неравномерно: небольшая часть комментариев собирает большинство лайков
+            cursor.execute(
+                f'''
+                INSERT INTO {vote_table} (vote, user_id, content_type_id, object_id)
+                SELECT CASE WHEN random() < 0.8 THEN 1 ELSE -1 END, (%s::int[])[1 + floor(random() * %s)::int],
+                       %s, (%s::int[])[1 + floor(power(random(), 3) * %s)::int]
+                FROM generate_series(1, %s)
+                ''',
+                [users, len(users), comment_type, comment_ids, len(comment_ids), votes],
+            )
+            cursor.execute(
+                f'''
+                UPDATE {comment_table} c SET likes_count = v.likes, dislikes_count = v.dislikes
+                FROM (
+                    SELECT object_id, count(*) FILTER (WHERE vote > 0) likes, count(*) FILTER (WHERE vote < 0) dislikes
+                    FROM {vote_table} WHERE content_type_id = %s AND object_id BETWEEN %s AND %s
+                    GROUP BY object_id
+                ) v
+                WHERE c.id = v.object_id
+                ''',
+                [comment_type, comment_ids[0], comment_ids[-1]],
+            )
+            cursor.execute(f'ANALYZE {comment_table}')
+            cursor.execute(f'ANALYZE {vote_table}')
+        return comment_ids
+
+    @staticmethod
+    def old_top_comments():
+        # Прежний show_top_comments: четыре сортировки по Count голосов по всей таблице
+        comments = NewComment.objects.annotate(
+            like_total=Count('votes', filter=Q(votes__vote__gt=0)),
+            dislike_total=Count('votes', filter=Q(votes__vote__lt=0)),
+        )
+        for start in window_starts().values():
+            list(comments.filter(created__gte=start).order_by('-like_total')[:5])
+
+    @staticmethod
+    def report(title, func, repeat):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        print(f'{title}: {(time.perf_counter() - started) / repeat * 1000:.2f} ms')
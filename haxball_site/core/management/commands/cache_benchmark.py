@@ -0,0 +1,45 @@
+import os
+import tempfile
+import time
+
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.management.base import BaseCommand
+from haxball_site.shm_cache import SharedMemoryCache
+
+# Типичные размеры фрагментов: сайдбар, таблица лиги, зал славы
+FRAGMENT_SIZES = (1024, 16 * 1024, 96 * 1024)
+
+
+class Command(BaseCommand):
+    help = 'Сравнить скорость SharedMemoryCache и FileBasedCache на фрагментах типичного размера'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ops', type=int, default=2000, help='операций каждого типа на размер фрагмента')
+        parser.add_argument('--keys', type=int, default=200, help='количество разных ключей')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as tmp:
+            backends = {
+                'file': FileBasedCache(os.path.join(tmp, 'file_cache'), {'OPTIONS': {'MAX_ENTRIES': 10000}}),
+                'shm': SharedMemoryCache(os.path.join(tmp, 'shm_cache'), {}),
+            }
+            print(f'{"backend":<8}{"size":>10}{"set, us":>12}{"get, us":>12}')
+            for size in FRAGMENT_SIZES:
+                fragment = 'x' * size
+                for name, backend in backends.items():
+                    set_time, get_time = self.run(backend, fragment, options['ops'], options['keys'])
+                    print(f'{name:<8}{size:>10}{set_time:>12.1f}{get_time:>12.1f}')
+                    backend.clear()
+
+    @staticmethod
+    def run(backend, fragment, ops, keys):
+        started = time.perf_counter()
+        for i in range(ops):
+            backend.set(f'fragment:{i % keys}', fragment, 300)
+        set_time = (time.perf_counter() - started) / ops * 1e6
+
+        started = time.perf_counter()
+        for i in range(ops):
+            backend.get(f'fragment:{i % keys}')
+        get_time = (time.perf_counter() - started) / ops * 1e6
+        return set_time, get_time
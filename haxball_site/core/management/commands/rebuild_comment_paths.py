@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from core.models import NewComment
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать пути в дереве комментариев и счетчики ответов по полю parent'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='только показать расхождения, ничего не сохраняя')
+
+    def handle(self, *args, **options):
+        parents = dict(NewComment.objects.values_list('id', 'parent'))
+        paths = {}
+
+        def build_path(comment_id):
+            # Итеративно, чтобы глубокие ветки не упирались в лимит рекурсии
+            chain = []
+            while comment_id is not None and comment_id not in paths:
+                chain.append(comment_id)
+                comment_id = parents.get(comment_id)
+            prefix = paths.get(comment_id, '')
+            for chain_id in reversed(chain):
+                prefix += NewComment.path_segment(chain_id)
+                paths[chain_id] = prefix
+            return paths[chain[0]] if chain else prefix
+
+        descendants = dict.fromkeys(parents, 0)
+        for comment_id in parents:
+            for ancestor_id in NewComment.path_ids(build_path(comment_id))[:-1]:
+                descendants[ancestor_id] += 1
+
+        stale = []
+        for comment in NewComment.objects.only('id', 'path', 'descendants_count').iterator():
+            if comment.path != paths[comment.id] or comment.descendants_count != descendants[comment.id]:
+                comment.path = paths[comment.id]
+                comment.descendants_count = descendants[comment.id]
+                stale.append(comment)
+
+        print(f'Mismatches found: {len(stale)}')
+        if not options['check']:
+            NewComment.objects.bulk_update(stale, ['path', 'descendants_count'], batch_size=1000)
+            print(f'Comment paths rebuilt for {len(stale)} comments')
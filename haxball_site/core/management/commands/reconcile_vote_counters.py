@@ -0,0 +1,49 @@
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+
+from core.leaderboards import clear_leaderboards
+from core.models import LikeDislike, NewComment, Post
+
+COUNTER_FIELDS = ('likes_count', 'dislikes_count')
+
+
+class Command(BaseCommand):
+    help = 'Сверить сохраненные счетчики лайков/дизлайков комментариев и постов с голосами и исправить расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='только показать расхождения, ничего не сохраняя')
+
+    def handle(self, *args, **options):
+        total_mismatches = 0
+        for model in (NewComment, Post):
+            votes = (
+                LikeDislike.objects.filter(content_type=ContentType.objects.get_for_model(model))
+                .order_by().values('object_id')
+                .annotate(
+                    likes_count=Count('id', filter=Q(vote__gt=0)),
+                    dislikes_count=Count('id', filter=Q(vote__lt=0)),
+                )
+                .values_list('object_id', 'likes_count', 'dislikes_count')
+            )
+            live = {object_id: counters for object_id, *counters in votes}
+
+            stale = []
+            for obj in model.objects.only('id', *COUNTER_FIELDS).iterator():
+                counters = live.get(obj.id, [0, 0])
+                if [obj.likes_count, obj.dislikes_count] != counters:
+                    print(
+                        f'{model.__name__} {obj.id}: stored={obj.likes_count}/{obj.dislikes_count}, '
+                        f'live={counters[0]}/{counters[1]}'
+                    )
+                    obj.likes_count, obj.dislikes_count = counters
+                    stale.append(obj)
+
+            total_mismatches += len(stale)
+            if not options['check']:
+                model.objects.bulk_update(stale, COUNTER_FIELDS, batch_size=1000)
+
+        print(f'Mismatches found: {total_mismatches}')
+        if not options['check']:
+            clear_leaderboards()
+            print(f'Vote counters fixed: {total_mismatches}')
@@ -4,6 +4,7 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand, CommandError
 
+from core.leaderboards import clear_leaderboards
 from core.models import LikeDislike, NewComment
 
 
@@ -22,6 +23,8 @@ class Command(BaseCommand):
             count = int(options['user_names'][2])
         except NewComment.DoesNotExist:
             raise CommandError('Нет одного из пользователей')
+        if vote not in LikeDislike.COUNTER_FIELDS:
+            raise CommandError('Голос должен быть 1 или -1')
 
         users = User.objects.all()
         voting_users = []
@@ -31,6 +34,7 @@ class Command(BaseCommand):
             from_i = comment.votes.filter(user=i.id)
             if len(from_i) == 1:
                 ldl = from_i[0]
+                LikeDislike.change_counters(comment, removed=ldl.vote, added=vote)
                 ldl.vote = vote
                 ldl.save()
             else:
@@ -41,4 +45,7 @@ class Command(BaseCommand):
                     user=i,
                     vote=vote,
                 )
+                LikeDislike.change_counters(comment, added=vote)
                 print('Создали ', vt)
+        # Топ комментариев в кэше считался по старым счетчикам
+        clear_leaderboards()
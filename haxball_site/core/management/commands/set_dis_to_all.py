@@ -2,6 +2,7 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.management.base import BaseCommand, CommandError
 
+from core.leaderboards import clear_leaderboards
 from core.models import LikeDislike, NewComment
 
 
@@ -20,12 +21,15 @@ class Command(BaseCommand):
             vote = int(options['user_names'][2])
         except User.DoesNotExist:
             raise CommandError('Нет одного из пользователей')
+        if vote not in LikeDislike.COUNTER_FIELDS:
+            raise CommandError('Голос должен быть 1 или -1')
 
         for comment in NewComment.objects.filter(author=user.id):
             from_marik = comment.votes.filter(user=user_from.id)
             # print(len(from_marik))
             if len(from_marik) == 1:
                 ldl = from_marik[0]
+                LikeDislike.change_counters(comment, removed=ldl.vote, added=vote)
                 ldl.vote = vote
                 ldl.save()
             else:
@@ -36,9 +40,12 @@ class Command(BaseCommand):
                     user=user_from,
                     vote=vote,
                 )
+                LikeDislike.change_counters(comment, added=vote)
                 print('Создали ', dis)
             # for i in comment.votes.all():
             #   from_marik = i.
             #   print(i)
             #    print(i.user)
             # print(comment)
+        # Топ комментариев в кэше считался по старым счетчикам
+        clear_leaderboards()
@@ -1,11 +1,11 @@
 from django.contrib.auth.models import User
 from django.core.management.base import BaseCommand, CommandError
 
-from core.models import NewComment, Post, Profile
+from core.karma import refresh_karma
 
 
 class Command(BaseCommand):
-    help = 'The Zen of Python'
+    help = 'Пересчитать карму пользователей по голосам за их комментарии и посты'
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -18,47 +18,15 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         if options['only_for'] == 0:
             print('Обновляем карму всем пользователям')
-            a = Profile.objects.all()
-            for profile in a:
-                s = 0
-                samo = 0
-                for comment in NewComment.objects.filter(author=profile.name):
-                    s += comment.votes.sum_rating()
-                    samo += (
-                        comment.votes.filter(user=profile.name, vote=1).count()
-                        - comment.votes.filter(user=profile.name, vote=-1).count()
-                    )
-                for post in Post.objects.filter(author=profile.name):
-                    s += post.votes.sum_rating()
-                    samo += (
-                        post.votes.filter(user=profile.name, vote=1).count()
-                        - post.votes.filter(user=profile.name, vote=-1).count()
-                    )
-                profile.karma = s - samo
-                profile.save(update_fields=['karma'])
-                print('{} установлена карма {}'.format(profile.name, profile.karma))
+            users = None
         else:
             print('Обновляем карму {}'.format(options['only_for']))
             try:
-                user = User.objects.get(username=options['only_for'])
+                users = [User.objects.get(username=options['only_for'])]
             except User.DoesNotExist:
                 raise CommandError('Не найден пользователь {}'.format(options['only_for']))
 
-            profile = Profile.objects.get(name=user)
-            s = 0
-            samo = 0
-            for comment in NewComment.objects.filter(author=profile.name):
-                s += comment.votes.sum_rating()
-                samo += (
-                    comment.votes.filter(user=profile.name, vote=1).count()
-                    - comment.votes.filter(user=profile.name, vote=-1).count()
-                )
-            for post in Post.objects.filter(author=profile.name):
-                s += post.votes.sum_rating()
-                samo += (
-                    post.votes.filter(user=profile.name, vote=1).count()
-                    - post.votes.filter(user=profile.name, vote=-1).count()
-                )
-            profile.karma = s - samo
-            profile.save(update_fields=['karma'])
+        changed = refresh_karma(users)
+        for profile in changed:
             print('{} установлена карма {}'.format(profile.name, profile.karma))
+        print(f'Karma updated for {len(changed)} profiles')
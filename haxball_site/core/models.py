@@ -1,12 +1,14 @@
 import collections
+from typing import ClassVar
 
 from autoslug import AutoSlugField
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
 from django.db import models
-from django.db.models import Max, Sum
-from django.db.models.signals import post_save, pre_save
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, StrIndex, Substr
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
@@ -51,6 +53,7 @@ class LikeDislike(models.Model):
     DISLIKE = -1
 
     VOTES = ((DISLIKE, 'Не нравится'), (LIKE, 'Нравится'))
+    COUNTER_FIELDS: ClassVar[dict] = {LIKE: 'likes_count', DISLIKE: 'dislikes_count'}
 
     vote = models.SmallIntegerField(verbose_name='Голос', choices=VOTES)
     user = models.ForeignKey(User, verbose_name='Пользователь', on_delete=models.CASCADE)
@@ -62,11 +65,26 @@ class LikeDislike(models.Model):
     objects = LikeDislikeManager()
 
     def delete(self, *args, **kwargs):
-        if self.user != self.content_object.author:
-            self.content_object.author.user_profile.karma -= self.vote
-            self.content_object.author.user_profile.save(update_fields=['karma'])
+        content_object = self.content_object
+        if self.user_id != content_object.author_id:
+            Profile.change_karma(content_object.author_id, -self.vote)
+        self.change_counters(content_object, removed=self.vote)
         super(LikeDislike, self).delete(*args, **kwargs)
 
+    @classmethod
+    def change_counters(cls, obj, removed=None, added=None):
+        # Счетчики голосов есть только у новых комментариев и постов, меняем их атомарно в БД
+        if not isinstance(obj, (NewComment, Post)):
+            return
+        deltas = collections.Counter()
+        if removed is not None:
+            deltas[cls.COUNTER_FIELDS[removed]] -= 1
+        if added is not None:
+            deltas[cls.COUNTER_FIELDS[added]] += 1
+        changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if changes:
+            type(obj).objects.filter(id=obj.id).update(**changes)
+
     def get_query_set(self):
         return MyQuerySet(self.model)
 
@@ -117,6 +135,10 @@ class Category(models.Model):
 
 # Модель для "правильных" комментариев
 class NewComment(models.Model):
+    # Путь в дереве - id всех предков и самого комментария сегментами одной длины, корень - первый сегмент.
+    # Вся ветка комментария выбирается одним запросом по префиксу пути
+    PATH_SEGMENT_LENGTH = 11
+
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey()
@@ -129,6 +151,10 @@ class NewComment(models.Model):
     )
     votes = GenericRelation(LikeDislike, related_query_name='n_comments')
     version = models.PositiveSmallIntegerField('Версия', default=1)
+    path = models.CharField('Путь в дереве', max_length=1100, blank=True, db_index=True, editable=False)
+    descendants_count = models.PositiveIntegerField('Ответов в ветке', default=0, editable=False)
+    likes_count = models.PositiveIntegerField('Лайков', default=0, db_index=True, editable=False)
+    dislikes_count = models.PositiveIntegerField('Дизлайков', default=0, editable=False)
 
     tracker = FieldTracker()
 
@@ -142,6 +168,41 @@ class NewComment(models.Model):
             self.edited = timezone.now()
             self.version = self.tracker.previous('version') + 1
         super(NewComment, self).save(*args, **kwargs)
+        if not self.path:
+            self.set_path()
+
+    @classmethod
+    def path_segment(cls, comment_id):
+        return f'{comment_id:010d}/'
+
+    @classmethod
+    def path_ids(cls, path):
+        return [int(path[i:i + cls.PATH_SEGMENT_LENGTH - 1]) for i in range(0, len(path), cls.PATH_SEGMENT_LENGTH)]
+
+    def parent_path(self):
+        """Путь родителя. Если у предков путь еще не заполнен (бэкфилл не прогоняли), собирается по цепочке parent."""
+        ancestor_ids = []
+        parent_id = self.parent_id
+        while parent_id and parent_id not in ancestor_ids:
+            row = NewComment.objects.filter(id=parent_id).values_list('path', 'parent_id').first()
+            if row is None:
+                break
+            path, next_id = row
+            if path:
+                return path + ''.join(self.path_segment(comment_id) for comment_id in reversed(ancestor_ids))
+            ancestor_ids.append(parent_id)
+            parent_id = next_id
+        return ''.join(self.path_segment(comment_id) for comment_id in reversed(ancestor_ids))
+
+    def set_path(self):
+        # id известен только после вставки, поэтому путь дописывается отдельным update
+        parent_path = self.parent_path()
+        self.path = parent_path + self.path_segment(self.id)
+        NewComment.objects.filter(id=self.id).update(path=self.path)
+        if parent_path:
+            NewComment.objects.filter(id__in=self.path_ids(parent_path)).update(
+                descendants_count=F('descendants_count') + 1
+            )
 
     def __str__(self):
         return 'Комментарий от {} к {}'.format(self.author, self.content_object)
@@ -157,22 +218,54 @@ class NewComment(models.Model):
         return '{}?page={}#r{}'.format(commented_object.get_absolute_url(), page, self.id)
 
     def get_root(self):
-        obj = self
-        while obj.parent is not None:
-            obj = obj.parent
-        return obj
+        if self.parent_id is None:
+            return self
+        if self.path:
+            return NewComment.objects.get(id=self.path_ids(self.path)[0])
+        root = self.parent
+        while root.parent_id is not None:
+            root = root.parent
+        return root
 
     def is_parent(self):
         return self.parent is None
 
     def has_childs(self):
-        return self.childs.count() > 0
+        return self.descendants_count > 0
 
     def all_childs(self):
-        return sorted(list(bfs(self)), key=lambda x: x.created)
+        # Для страницы комментариев ветки подгружаются заранее (core.utils.attach_threads)
+        if not self.descendants_count:
+            return []
+        if not hasattr(self, '_descendants'):
+            self._descendants = list(
+                NewComment.objects.filter(path__startswith=self.path).exclude(id=self.id).order_by('created')
+            )
+        return self._descendants
 
     def childs_count(self):
-        return len(list(bfs(self)))
+        return self.descendants_count
+
+
+@receiver(post_delete, sender=NewComment)
+def detach_comment_replies(sender, instance, **kwargs):
+    # Ответы удаленного комментария становятся корнями своих веток (parent обнуляется через SET_NULL):
+    # из их путей убираем все до сегмента удаленного комментария включительно и пересчитываем счетчики предков
+    if not instance.path:
+        return
+    segment = NewComment.path_segment(instance.id)
+    NewComment.objects.filter(path__contains=segment).update(
+        path=Substr('path', StrIndex('path', Value(segment)) + len(segment))
+    )
+
+    thread_size = (
+        NewComment.objects.filter(path__startswith=OuterRef('path'))
+        .order_by().values('content_type')
+        .annotate(c=Count('*')).values('c')
+    )
+    NewComment.objects.filter(id__in=NewComment.path_ids(instance.path)[:-1]).update(
+        descendants_count=Coalesce(Subquery(thread_size), 1) - 1
+    )
 
 
 class CommentHistoryItem(models.Model):
@@ -224,6 +317,8 @@ class Post(models.Model):
     updated = models.DateTimeField('Изменено', auto_now=True)
     important = models.BooleanField('Закрепленный пост', default=False)
     votes = GenericRelation(LikeDislike, related_query_name='posts')
+    likes_count = models.PositiveIntegerField('Лайков', default=0, db_index=True, editable=False)
+    dislikes_count = models.PositiveIntegerField('Дизлайков', default=0, editable=False)
     views = models.PositiveIntegerField(default=0)
     commentable = models.BooleanField('Комментируемая запись', default=True)
     comments = GenericRelation(NewComment, related_query_name='post_comments')
@@ -353,6 +448,12 @@ class Profile(models.Model):
     def get_absolute_url(self):
         return reverse('core:profile_detail', args=[self.id, self.slug])
 
+    @staticmethod
+    def change_karma(user_id, delta):
+        # Атомарный инкремент в БД, чтобы одновременные голоса не затирали друг друга
+        if delta:
+            Profile.objects.filter(name_id=user_id).update(karma=F('karma') + delta)
+
     def __str__(self):
         return 'Профиль {}'.format(self.name.username)
 
@@ -4,13 +4,15 @@ from django import template
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.paginator import Page
-from django.db.models import Count, Prefetch, Q
+from django.db.models import Prefetch
 from django.utils import timezone
+from haxball_site.fragments import COMMENTS, NAVBAR, POSTS, TRANSFERS, cached_inclusion_tag
 from online_users.models import OnlineUserActivity
 from tournament.models import League, Player, PlayerTransfer, Team
 
 from haxball_site import settings
 
+from ..leaderboards import top_comments
 from ..models import NewComment, Post, Subscription
 
 register = template.Library()
@@ -94,7 +96,7 @@ def forum_last_activity(category):
 
 
 # Сайдбар для пользователей онлайн(по дефолту 15 минут)
-@register.inclusion_tag('core/include/sidebar_for_users.html')
+@cached_inclusion_tag(register, 'core/include/sidebar_for_users.html')
 def show_users_online():
     user_activity_objects = OnlineUserActivity.get_user_activities(
         time_delta=timezone.timedelta(minutes=5)
@@ -107,7 +109,7 @@ def show_users_online():
 
 # Сайд-бар для last activity (выводит последние оставленные комментарии
 # но максимум 1 для каждого поста(если 3 коммента в одном посте были последними - выведет 1)
-@register.inclusion_tag('core/include/sidebar_for_last_activity.html')
+@cached_inclusion_tag(register, 'core/include/sidebar_for_last_activity.html', groups=(COMMENTS,))
 def show_last_activity(count=10):
     # Последняя активность ваще везде-везде
     latest_comments = (
@@ -131,49 +133,23 @@ def show_last_activity(count=10):
 
 
 # Топ лайков за ТЕКУЩИЙ день, неделя, месяц, год
-@register.inclusion_tag('core/include/sidebar_for_top_comments.html')
+@cached_inclusion_tag(register, 'core/include/sidebar_for_top_comments.html', groups=(COMMENTS,))
 def show_top_comments(count=5):
-    my_date = datetime.now()
-    year, week, day_of_week = my_date.isocalendar()
-    day = my_date.day
-    month = my_date.month
-
-    comments = (
-        NewComment.objects.select_related('author')
-        .prefetch_related('votes', 'content_object', 'content_object__comments')
-        .annotate(likes_count=Count('votes', filter=Q(votes__vote__gt=0)))
-        .annotate(dislikes_count=Count('votes', filter=Q(votes__vote__lt=0)))
-    )
-
-    top_com_today = comments.filter(created__year=year, created__month=month, created__day=day).order_by(
-        '-likes_count'
-    )[:count]
-    top_com_month = comments.filter(created__year=year, created__month=month).order_by('-likes_count')[:count]
-    top_com_year = comments.filter(created__year=year).order_by('-likes_count')[:count]
-
-    week_start = my_date - timezone.timedelta(days=day_of_week - 1, hours=my_date.hour, minutes=my_date.minute)
-
-    week_end = my_date + timezone.timedelta(days=7 - day_of_week, hours=23 - my_date.hour, minutes=60 - my_date.minute)
-    top_com_week = comments.filter(created__gt=week_start, created__lt=week_end).order_by('-likes_count')[:count]
+    top = top_comments(count)
 
     return {
-        'top_comments_day': top_com_today,
-        'top_comments_month': top_com_month,
-        'top_comments_year': top_com_year,
-        'top_comments_week': top_com_week,
+        'top_comments_day': top['day'],
+        'top_comments_month': top['month'],
+        'top_comments_year': top['year'],
+        'top_comments_week': top['week'],
     }
 
 
 # Сайд-бар для отображеня топа лайков постов за всё время
 # (Потом надо будет переделать, чтобы в параметр передавать за какое время, для переключения)
-@register.inclusion_tag('core/include/sidebar_for_likes.html')
+@cached_inclusion_tag(register, 'core/include/sidebar_for_likes.html', groups=(POSTS,))
 def show_post_with_top_likes(count=5):
-    posts = (
-        Post.objects.annotate(like_count=Count('votes', filter=Q(votes__vote__gt=0)))
-        .annotate(dislike_count=Count('votes', filter=Q(votes__vote__lt=0)))
-        .filter(created__year=2020)
-        .order_by('-like_count')[:count]
-    )
+    posts = Post.objects.filter(created__year=2020).order_by('-likes_count')[:count]
 
     return {'liked_posts': posts}
 
@@ -254,6 +230,8 @@ def can_view_likes_details(user: User):
 def get_likes(comment: NewComment):
     if hasattr(comment, 'likes'):
         return comment.likes
+    if not likes_count(comment):
+        return []
 
     return comment.votes.likes()
 
@@ -262,27 +240,30 @@ def get_likes(comment: NewComment):
 def get_dislikes(comment: NewComment):
     if hasattr(comment, 'dislikes'):
         return comment.dislikes
+    if not dislikes_count(comment):
+        return []
 
     return comment.votes.dislikes()
 
 
+# Счетчики хранятся у новых комментариев и постов, у старых комментариев считаем голоса
 @register.filter
 def likes_count(comment: NewComment):
-    if hasattr(comment, 'likes'):
-        return len(comment.likes)
+    if hasattr(comment, 'likes_count'):
+        return comment.likes_count
 
     return comment.votes.likes().count()
 
 
 @register.filter
 def dislikes_count(comment: NewComment):
-    if hasattr(comment, 'dislikes'):
-        return len(comment.dislikes)
+    if hasattr(comment, 'dislikes_count'):
+        return comment.dislikes_count
 
     return comment.votes.dislikes().count()
 
 
-@register.inclusion_tag('core/include/teams_in_navbar.html')
+@cached_inclusion_tag(register, 'core/include/teams_in_navbar.html', groups=(NAVBAR,))
 def teams_in_navbar():
     primary_leagues = ['Высшая лига', 'Первая лига', 'Вторая лига']
     leagues = (
@@ -334,7 +315,7 @@ def pages_to_show(page: Page):
         return
 
 
-@register.inclusion_tag('core/include/sidebar_for_transfers.html')
+@cached_inclusion_tag(register, 'core/include/sidebar_for_transfers.html', groups=(TRANSFERS,))
 def show_last_transfers():
     from_date = datetime(2024, 3, 13)
     last_transfers = (
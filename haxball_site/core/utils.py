@@ -1,11 +1,11 @@
 from django.contrib.contenttypes.models import ContentType
 from django.core.paginator import Paginator
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Q
 
 from .models import LikeDislike, NewComment
 
 
-def get_comments_for_object(model, obj_id):
+def with_comment_relations(comments):
     prefetch_likes = Prefetch(
         'votes', queryset=LikeDislike.objects.likes().prefetch_related('user__user_profile'), to_attr='likes'
     )
@@ -13,21 +13,44 @@ def get_comments_for_object(model, obj_id):
         'votes', queryset=LikeDislike.objects.dislikes().prefetch_related('user__user_profile'), to_attr='dislikes'
     )
 
-    return (
-        NewComment.objects.select_related('author__user_profile')
-        .prefetch_related(
-            'author__user_profile__user_icon',
-            'childs__author__user_profile__user_icon',
-            # tweak for prefetching recursive field
-            'childs__childs__childs__childs__childs',
-            prefetch_likes,
-            prefetch_dislikes,
-        )
-        .filter(content_type=ContentType.objects.get_for_model(model), object_id=obj_id, parent=None)
+    return comments.select_related('author__user_profile').prefetch_related(
+        'author__user_profile__user_icon',
+        prefetch_likes,
+        prefetch_dislikes,
+    )
+
+
+def get_comments_for_object(model, obj_id):
+    return with_comment_relations(
+        NewComment.objects.filter(content_type=ContentType.objects.get_for_model(model), object_id=obj_id, parent=None)
     )
 
 
+def attach_threads(roots):
+    """
+    Ответы всех уровней к корневым комментариям одним запросом по префиксам путей,
+    с теми же лайками, дизлайками и иконками авторов - число запросов не зависит от глубины веток.
+    """
+    threads = {}
+    for root in roots:
+        root._descendants = []
+        if root.descendants_count and root.path:
+            threads[root.path] = root._descendants
+    if not threads:
+        return
+
+    query = Q()
+    for path in threads:
+        query |= Q(path__startswith=path)
+    replies = with_comment_relations(NewComment.objects.filter(query).exclude(parent=None)).order_by('created')
+    for reply in replies:
+        threads[reply.path[:NewComment.PATH_SEGMENT_LENGTH]].append(reply)
+
+
 def get_paginated_comments(comments, page, per_page=20):
     paginator = Paginator(comments, per_page)
 
-    return paginator.get_page(page)
\ No newline at end of file
+    comments_page = paginator.get_page(page)
+    comments_page.object_list = list(comments_page.object_list)
+    attach_threads(comments_page.object_list)
+    return comments_page
@@ -16,6 +16,7 @@ from pytils.translit import slugify
 from tournament.models import Achievements, Team
 
 from .forms import EditCommentForm, EditProfileForm, NewCommentForm, PostForm
+from .leaderboards import update_leaderboards
 from .models import Category, LikeDislike, NewComment, Post, Profile, Themes, UserNicknameHistoryItem
 from .templatetags.user_tags import can_edit, exceeds_edit_limit
 from .utils import get_comments_for_object, get_paginated_comments
@@ -432,19 +433,17 @@ class VotesView(View):
 
     def post(self, request, id):
         obj = self.model.objects.get(id=id)
-        author_profile = obj.author.user_profile
         # GenericForeignKey не поддерживает метод get_or_create
         try:
             likedislike = LikeDislike.objects.get(
                 content_type=ContentType.objects.get_for_model(obj), object_id=obj.id, user=request.user
             )
 
-            if likedislike.vote is not self.vote_type:
-                if obj.author != request.user:
-                    author_profile.karma -= likedislike.vote
-                    author_profile.karma += self.vote_type
-                    author_profile.save(update_fields=['karma'])
+            if likedislike.vote != self.vote_type:
+                if obj.author_id != request.user.id:
+                    Profile.change_karma(obj.author_id, self.vote_type - likedislike.vote)
 
+                LikeDislike.change_counters(obj, removed=likedislike.vote, added=self.vote_type)
                 likedislike.vote = self.vote_type
                 likedislike.save(update_fields=['vote'])
                 result = True
@@ -454,11 +453,14 @@ class VotesView(View):
 
         except LikeDislike.DoesNotExist:
             obj.votes.create(user=request.user, vote=self.vote_type)
-            if obj.author != request.user:
-                obj.author.user_profile.karma += self.vote_type
-                obj.author.user_profile.save(update_fields=['karma'])
+            LikeDislike.change_counters(obj, added=self.vote_type)
+            if obj.author_id != request.user.id:
+                Profile.change_karma(obj.author_id, self.vote_type)
             result = True
 
+        obj.refresh_from_db(fields=['likes_count', 'dislikes_count'])
+        if isinstance(obj, NewComment):
+            update_leaderboards(obj)
         if request.htmx:
             return render(request, 'core/include/like_dislike_comment.html', {'comment': obj})
 
@@ -466,9 +468,9 @@ class VotesView(View):
             json.dumps(
                 {
                     'result': result,
-                    'like_count': obj.votes.likes().count(),
-                    'dislike_count': obj.votes.dislikes().count(),
-                    'sum_rating': obj.votes.sum_rating(),
+                    'like_count': obj.likes_count,
+                    'dislike_count': obj.dislikes_count,
+                    'sum_rating': obj.likes_count - obj.dislikes_count,
                 }
             ),
             content_type='application/json',
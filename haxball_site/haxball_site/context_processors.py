@@ -1,15 +1,23 @@
 from django.utils import timezone
 from tournament.models import Match
 
+from .fragments import MATCHES, get_fragment
 
-def running_line_context(request):
-    today = timezone.now().today()
+
+def latest_matches_context(today):
     three_days_ago = today - timezone.timedelta(days=3)
-    latest_matches = Match.objects.filter(is_played=True, match_date__range=[three_days_ago, today]).order_by(
-        'league__priority', 'league__created', '-match_date'
+    latest_matches = list(
+        Match.objects.filter(is_played=True, match_date__range=[three_days_ago, today])
+        .select_related('league', 'numb_tour__league', 'team_home', 'team_guest')
+        .order_by('league__priority', 'league__created', '-match_date')
     )
     base_duration = 15
-    added_duration = 3 * latest_matches.count()
+    added_duration = 3 * len(latest_matches)
     animation_duration = base_duration + added_duration
 
     return {'latest_matches': latest_matches, 'animation_duration': animation_duration}
+
+
+def running_line_context(request):
+    today = timezone.now().today()
+    return get_fragment('running_line', (MATCHES,), latest_matches_context, today.date())
@@ -0,0 +1,157 @@
+import time
+from functools import partial, wraps
+
+from core.models import LikeDislike, NewComment, Post
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from tournament.aggregates import on_commit_once
+from tournament.models import Goal, League, Match, MatchResult, OtherEvents, PlayerTransfer, Season, Team
+
+COMMENTS = 'comments'
+POSTS = 'posts'
+MATCHES = 'matches'
+TRANSFERS = 'transfers'
+NAVBAR = 'navbar'
+
+# Сколько секунд фрагмент свежий. После этого (или после события его группы) фрагмент пересчитывает
+# один воркер, остальные до конца пересчета отдают старую версию
+FRAGMENT_TIMEOUTS = {
+    'show_users_online': 30,
+    'show_last_activity': 300,
+    'show_top_comments': 300,
+    'show_post_with_top_likes': 60 * 60,
+    'teams_in_navbar': 60 * 60,
+    'show_last_transfers': 60 * 60,
+    'running_line': 60 * 60,
+    **getattr(settings, 'FRAGMENT_CACHE_TIMEOUTS', {}),
+}
+# Сколько после потери свежести фрагмент еще хранится, чтобы было что отдавать во время пересчета
+STALE_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_STALE_TIMEOUT', 60 * 60)
+RECOMPUTE_LOCK_TIMEOUT = 30
+
+
+def _revision_key(group):
+    return f'fragments:revision:{group}'
+
+
+def get_revisions(groups):
+    keys = [_revision_key(group) for group in groups]
+    revisions = cache.get_many(keys)
+    return tuple(revisions.get(key) for key in keys)
+
+
+def bump_fragments(*groups):
+    for group in groups:
+        key = _revision_key(group)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счетчик вытеснен или еще не создан - новое значение не должно совпасть ни с одним из старых
+            cache.set(key, time.time_ns() // 1000, timeout=None)
+
+
+def schedule_fragments(*groups):
+    """Сдвигает ревизии групп после коммита транзакции, по одному разу на группу за транзакцию."""
+    for group in groups:
+        on_commit_once(('fragments', group), partial(bump_fragments, group))
+
+
+def get_fragment(name, groups, compute, *args):
+    """
+    Значение фрагмента из кэша с stale-while-revalidate: устаревший по времени или по ревизии групп фрагмент
+    пересчитывает только воркер, взявший блокировку, остальные сразу отдают старое значение.
+    """
+    key = ':'.join(map(str, ('fragments', name, *args)))
+    revisions = get_revisions(groups)
+    cached = cache.get(key)
+    locked = False
+    if cached is not None:
+        value, fresh_until, cached_revisions = cached
+        if time.time() < fresh_until and cached_revisions == revisions:
+            return value
+        locked = cache.add(key + ':lock', 1, RECOMPUTE_LOCK_TIMEOUT)
+        if not locked:
+            return value
+
+    # Ревизии взяты до пересчета: если событие случится во время него, следующее чтение пересчитает еще раз
+    timeout = FRAGMENT_TIMEOUTS[name]
+    try:
+        value = compute(*args)
+        cache.set(key, (value, time.time() + timeout, revisions), timeout + STALE_TIMEOUT)
+    finally:
+        if locked:
+            cache.delete(key + ':lock')
+    return value
+
+
+def cached_inclusion_tag(register, template_name, groups=()):
+    """
+    Как register.inclusion_tag, но в кэше хранится готовый HTML. Шаблон, как и у inclusion_tag,
+    рендерится только со словарем из функции тега, поэтому фрагмент один для всех страниц и пользователей.
+    """
+
+    def decorator(func):
+        def render(*args):
+            return render_to_string(template_name, func(*args))
+
+        @wraps(func)
+        def tag(*args):
+            return mark_safe(get_fragment(func.__name__, groups, render, *args))
+
+        register.simple_tag(tag)
+        return func
+
+    return decorator
+
+
+@receiver(post_save, sender=NewComment)
+@receiver(post_delete, sender=NewComment)
+def bump_comment_fragments(sender, **kwargs):
+    schedule_fragments(COMMENTS)
+
+
+@receiver(post_save, sender=LikeDislike)
+@receiver(post_delete, sender=LikeDislike)
+def bump_vote_fragments(sender, **kwargs):
+    schedule_fragments(COMMENTS, POSTS)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_fragments(sender, **kwargs):
+    schedule_fragments(POSTS, COMMENTS)
+
+
+@receiver(post_save, sender=Match)
+@receiver(post_delete, sender=Match)
+@receiver(post_save, sender=MatchResult)
+@receiver(post_delete, sender=MatchResult)
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+@receiver(post_save, sender=OtherEvents)
+@receiver(post_delete, sender=OtherEvents)
+def bump_match_fragments(sender, **kwargs):
+    schedule_fragments(MATCHES)
+
+
+@receiver(post_save, sender=PlayerTransfer)
+@receiver(post_delete, sender=PlayerTransfer)
+def bump_transfer_fragments(sender, **kwargs):
+    schedule_fragments(TRANSFERS)
+
+
+@receiver(post_save, sender=League)
+@receiver(post_save, sender=Team)
+@receiver(m2m_changed, sender=League.teams.through)
+def bump_navbar_fragments(sender, **kwargs):
+    schedule_fragments(NAVBAR)
+
+
+@receiver(post_save, sender=Season)
+def bump_season_fragments(sender, **kwargs):
+    # Смена текущего сезона меняет и лиги в навбаре, и список трансферов
+    schedule_fragments(NAVBAR, TRANSFERS)
@@ -1,4 +1,12 @@
+import atexit
+import ipaddress
+import logging
+import os
+import threading
+
 from core.models import IPAdress, UserActivity
+from django.db import close_old_connections, transaction
+from django.db.models import Count
 from django.utils import timezone
 from django.utils.crypto import get_random_string
 
@@ -6,6 +14,141 @@ from haxball_site import settings
 
 ID_TOKEN_COOKIE_NAME = 'idtoken'
 
+USER_AGENT_MAX_LENGTH = UserActivity._meta.get_field('user_agent').max_length
+ID_TOKEN_MAX_LENGTH = UserActivity._meta.get_field('id_token').max_length
+
+logger = logging.getLogger(__name__)
+
+
+class UserActivityBuffer:
+    """
+    Копит заходы пользователей в памяти процесса и пишет их в базу пачками из фонового потока:
+    раз в flush_interval секунд или раньше, если накопилось max_size разных записей.
+    Повторные заходы с теми же (пользователь, ip, user-agent, токен) схлопываются в одну запись.
+    """
+
+    def __init__(self, flush_interval, max_size):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._ips = {}  # (user_id, ip) -> время последнего захода
+        self._activities = {}  # (user_id, ip, user_agent, id_token) -> время последнего захода
+
+    def add(self, user_id, ip, user_agent, id_token):
+        # Записи пишутся одной транзакцией, поэтому один кривой X-Forwarded-For не должен попасть в пачку
+        try:
+            ip = str(ipaddress.ip_address(ip))
+        except ValueError:
+            logger.warning('Skipping user activity with invalid ip %r', ip)
+            return
+        now = timezone.now()
+        with self._lock:
+            self._ensure_worker()
+            self._ips[(user_id, ip)] = now
+            self._activities[(user_id, ip, user_agent, id_token)] = now
+            is_full = len(self._activities) >= self.max_size
+        if is_full:
+            self._wakeup.set()
+
+    # Поток не переживает fork, поэтому запускаем его лениво в каждом воркере
+    def _ensure_worker(self):
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._ips.clear()
+        self._activities.clear()
+        threading.Thread(target=self._run, name='user-activity-flush', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush user activity')
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        with self._lock:
+            ips, self._ips = self._ips, {}
+            activities, self._activities = self._activities, {}
+        if not ips and not activities:
+            return
+
+        with transaction.atomic():
+            self._flush_ips(ips)
+            self._flush_activities(activities)
+
+    @staticmethod
+    def _flush_ips(ips):
+        addresses = {ip for _, ip in ips}
+        existing = {
+            (ip.name_id, ip.ip): ip
+            for ip in IPAdress.objects.filter(ip__in=addresses, name_id__in={user_id for user_id, _ in ips})
+        }
+        to_update, to_create = [], []
+        for (user_id, address), seen in ips.items():
+            ip = existing.get((user_id, address))
+            if ip:
+                ip.update = seen
+                to_update.append(ip)
+            else:
+                to_create.append(IPAdress(name_id=user_id, ip=address, update=seen))
+        IPAdress.objects.bulk_update(to_update, ['update'])
+        IPAdress.objects.bulk_create(to_create)
+
+        # IP, с которых заходили разные пользователи
+        shared = (
+            IPAdress.objects.filter(ip__in=addresses)
+            .values('ip')
+            .annotate(users_count=Count('id'))
+            .filter(users_count__gt=1)
+            .values('ip')
+        )
+        IPAdress.objects.filter(ip__in=shared, suspicious=False).update(suspicious=True)
+
+    @staticmethod
+    def _flush_activities(activities):
+        tokens = {id_token for *_, id_token in activities}
+        existing = {
+            (a.user_id, a.ip, a.user_agent, a.id_token): a
+            for a in UserActivity.objects.filter(
+                id_token__in=tokens, user_id__in={user_id for user_id, *_ in activities}
+            )
+        }
+        to_update, to_create = [], []
+        for key, seen in activities.items():
+            activity = existing.get(key)
+            if activity:
+                activity.last_seen = seen
+                to_update.append(activity)
+            else:
+                user_id, ip, user_agent, id_token = key
+                to_create.append(UserActivity(user_id=user_id, ip=ip, user_agent=user_agent, id_token=id_token))
+        UserActivity.objects.bulk_update(to_update, ['last_seen'])
+        UserActivity.objects.bulk_create(to_create)
+
+        duplicated = (
+            UserActivity.objects.filter(id_token__in=tokens)
+            .values('id_token')
+            .annotate(activities_count=Count('id'))
+            .filter(activities_count__gt=1)
+            .values('id_token')
+        )
+        UserActivity.objects.filter(id_token__in=duplicated, has_duplicates=False).update(has_duplicates=True)
+
+
+activity_buffer = UserActivityBuffer(
+    flush_interval=getattr(settings, 'USER_TRACKING_FLUSH_INTERVAL', 30),
+    max_size=getattr(settings, 'USER_TRACKING_BUFFER_SIZE', 500),
+)
+
 
 class UserTrackingMiddleware:
     def __init__(self, get_response):
@@ -24,21 +167,8 @@ class UserTrackingMiddleware:
             else:
                 user_ip = request.META.get('REMOTE_ADDR')
 
-        try:
-            ip = IPAdress.objects.get(name=request.user, ip=user_ip)
-            ip.update = timezone.now()
-            ip.save(update_fields=['update'])
-        except:
-            IPAdress.objects.create(ip=user_ip, name=request.user)
-
-        ips = IPAdress.objects.filter(ip=user_ip)
-        if ips.count() > 1:
-            for i in ips:
-                i.suspicious = True
-                i.save(update_fields=['suspicious'])
-
-        user_agent = request.headers['User-Agent']
-        user_token = request.COOKIES.get(ID_TOKEN_COOKIE_NAME)
+        user_agent = request.headers.get('User-Agent', '')[:USER_AGENT_MAX_LENGTH]
+        user_token = request.COOKIES.get(ID_TOKEN_COOKIE_NAME, '')[:ID_TOKEN_MAX_LENGTH]
         is_new_user_token = False
         if not user_token:
             is_new_user_token = True
@@ -53,19 +183,7 @@ class UserTrackingMiddleware:
                 ID_TOKEN_COOKIE_NAME, user_token, samesite='Lax', expires=timezone.now() + timezone.timedelta(days=365)
             )
 
-        try:
-            user_activity = UserActivity.objects.get(
-                user=request.user, ip=user_ip, user_agent=user_agent, id_token=user_token
-            )
-            user_activity.last_seen = timezone.now()
-            user_activity.save(update_fields=['last_seen'])
-        except:
-            UserActivity.objects.create(user=request.user, ip=user_ip, user_agent=user_agent, id_token=user_token)
-
-        user_activities = UserActivity.objects.filter(id_token=user_token)
-        if user_activities.count() > 1:
-            for ua in user_activities:
-                ua.has_duplicates = True
-                ua.save(update_fields=['has_duplicates'])
+        if user_ip:
+            activity_buffer.add(request.user.id, user_ip.strip(), user_agent, user_token)
 
         return response
@@ -178,7 +178,25 @@ else:
     ACCOUNT_EMAIL_CONFIRMATION_EXPIRE_DAYS = 1
     ACCOUNT_EMAIL_VERIFICATION = True
 
-if DEBUG:
+# shm - общий для воркеров кэш в разделяемой памяти, file - файловый, locmem - в памяти процесса
+CACHE_BACKEND = config('CACHE_BACKEND', default='file' if DEBUG else 'shm')
+if CACHE_BACKEND == 'shm':
+    CACHES = {
+        'default': {
+            'BACKEND': 'haxball_site.shm_cache.SharedMemoryCache',
+            'LOCATION': config('CACHE_LOCATION', default='/dev/shm/haxball_cache'),
+            'OPTIONS': {
+                'MAX_SIZE': config('CACHE_MAX_SIZE', cast=int, default=64 * 1024 * 1024),
+            },
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+elif DEBUG:
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
@@ -0,0 +1,321 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.locmem import LocMemCache
+
+MAGIC = b'HXSHMC01'
+# magic, общий размер, число классов, ways
+FILE_HEADER = struct.Struct('<8sQII')
+# размер класса (вместимость значения в байтах), число слотов, смещение класса в файле
+CLASS_HEADER = struct.Struct('<IIQ')
+# хэш ключа, время протухания (0 - никогда), время последнего обращения, длина значения
+SLOT_HEADER = struct.Struct('<16sddI')
+
+EMPTY_DIGEST = bytes(16)
+
+DEFAULT_SIZE_CLASSES = (512, 2048, 8192, 32768, 131072, 524288)
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024
+DEFAULT_WAYS = 8
+
+
+class SharedMemoryTable:
+    """
+    Хэш-таблица в mmap-файле, общая для всех воркеров на хосте.
+
+    Значения раскладываются по классам размеров (как слабы в memcached), каждый класс - множественно-
+    ассоциативная таблица: ключ попадает в корзину из `ways` слотов, при нехватке места вытесняется
+    слот с самым старым временем обращения (LRU внутри корзины). Запись под эксклюзивной блокировкой
+    файла, чтение - под разделяемой.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, size_classes=DEFAULT_SIZE_CLASSES, ways=DEFAULT_WAYS):
+        self.path = path
+        self.max_size = max_size
+        self.size_classes = tuple(sorted(size_classes))
+        self.ways = ways
+        self.max_value_size = self.size_classes[-1]
+        self._pid = None
+        self._fd = None
+        self._mm = None
+        self._classes = []
+        # flock не разделяет потоки одного процесса, поэтому дополнительно держим обычный мьютекс
+        self._thread_lock = threading.RLock()
+
+    # Файл открываем лениво и заново после fork, чтобы у каждого воркера был свой дескриптор
+    def _ensure_open(self):
+        if self._pid == os.getpid():
+            return
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                layout = self._layout()
+                if not self._is_initialized(fd, layout):
+                    self._initialize(fd, layout)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._mm = mmap.mmap(fd, self.max_size)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._classes = layout
+        self._pid = os.getpid()
+
+    def _layout(self):
+        header_size = FILE_HEADER.size + CLASS_HEADER.size * len(self.size_classes)
+        share = (self.max_size - header_size) // len(self.size_classes)
+        layout = []
+        offset = header_size
+        for capacity in self.size_classes:
+            slot_size = SLOT_HEADER.size + capacity
+            slots = share // slot_size
+            ways = min(self.ways, slots)
+            if ways == 0:
+                raise ValueError(f'Cache size {self.max_size} is too small for size class {capacity}')
+            slots -= slots % ways
+            layout.append((capacity, slots, offset, ways))
+            offset += share
+        return layout
+
+    def _header_bytes(self, layout):
+        header = FILE_HEADER.pack(MAGIC, self.max_size, len(layout), self.ways)
+        for capacity, slots, offset, _ in layout:
+            header += CLASS_HEADER.pack(capacity, slots, offset)
+        return header
+
+    def _is_initialized(self, fd, layout):
+        expected = self._header_bytes(layout)
+        if os.fstat(fd).st_size != self.max_size:
+            return False
+        return os.pread(fd, len(expected), 0) == expected
+
+    def _initialize(self, fd, layout):
+        # Другая конфигурация или новый файл - размечаем заново, старые записи теряются
+        os.ftruncate(fd, 0)
+        os.ftruncate(fd, self.max_size)
+        os.pwrite(fd, self._header_bytes(layout), 0)
+
+    @contextmanager
+    def _locked(self, exclusive):
+        with self._thread_lock:
+            self._ensure_open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def digest(key):
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def _bucket(self, digest, cls):
+        capacity, slots, offset, ways = cls
+        slot_size = SLOT_HEADER.size + capacity
+        first = int.from_bytes(digest[:8], 'little') % (slots // ways) * ways
+        return [offset + (first + i) * slot_size for i in range(ways)]
+
+    def _find(self, digest):
+        for cls in self._classes:
+            for position in self._bucket(digest, cls):
+                slot = SLOT_HEADER.unpack_from(self._mm, position)
+                if slot[0] == digest:
+                    return position, slot
+        return None, None
+
+    def _find_alive(self, digest, now):
+        position, slot = self._find(digest)
+        if position is not None and slot[1] and slot[1] <= now:
+            self._clear_slot(position)
+            return None, None
+        return position, slot
+
+    def _clear_slot(self, position):
+        SLOT_HEADER.pack_into(self._mm, position, EMPTY_DIGEST, 0.0, 0.0, 0)
+
+    def _write(self, digest, data, expires, now):
+        position, _ = self._find(digest)
+        if position is not None:
+            self._clear_slot(position)
+
+        cls = next(c for c in self._classes if len(data) <= c[0])
+        victim, victim_atime = None, None
+        for position in self._bucket(digest, cls):
+            key, slot_expires, atime, _ = SLOT_HEADER.unpack_from(self._mm, position)
+            if key == EMPTY_DIGEST or slot_expires and slot_expires <= now:
+                victim = position
+                break
+            if victim is None or atime < victim_atime:
+                victim, victim_atime = position, atime
+
+        data_position = victim + SLOT_HEADER.size
+        self._mm[data_position : data_position + len(data)] = data
+        SLOT_HEADER.pack_into(self._mm, victim, digest, expires, now, len(data))
+
+    def get(self, digest):
+        now = time.time()
+        with self._locked(exclusive=False):
+            position, slot = self._find(digest)
+            if position is None or slot[1] and slot[1] <= now:
+                return None
+            data_position = position + SLOT_HEADER.size
+            data = self._mm[data_position : data_position + slot[3]]
+            # Под разделяемой блокировкой обновляем только время обращения: гонка между читателями
+            # влияет лишь на точность LRU, но не на содержимое
+            struct.pack_into('<d', self._mm, position + 24, now)
+        return data
+
+    def set(self, digest, data, expires):
+        now = time.time()
+        with self._locked(exclusive=True):
+            self._write(digest, data, expires, now)
+
+    def add(self, digest, data, expires):
+        now = time.time()
+        with self._locked(exclusive=True):
+            position, _ = self._find_alive(digest, now)
+            if position is not None:
+                return False
+            self._write(digest, data, expires, now)
+            return True
+
+    def update(self, digest, func):
+        """Атомарно заменяет значение на func(старое значение) и возвращает новое."""
+        now = time.time()
+        with self._locked(exclusive=True):
+            position, slot = self._find_alive(digest, now)
+            if position is None:
+                raise KeyError(digest)
+            data_position = position + SLOT_HEADER.size
+            data = func(self._mm[data_position : data_position + slot[3]])
+            self._write(digest, data, slot[1], now)
+            return data
+
+    def touch(self, digest, expires):
+        now = time.time()
+        with self._locked(exclusive=True):
+            position, _ = self._find_alive(digest, now)
+            if position is None:
+                return False
+            struct.pack_into('<d', self._mm, position + 16, expires)
+            return True
+
+    def delete(self, digest):
+        with self._locked(exclusive=True):
+            position, _ = self._find(digest)
+            if position is None:
+                return False
+            self._clear_slot(position)
+            return True
+
+    def clear(self):
+        with self._locked(exclusive=True):
+            for capacity, slots, offset, _ in self._classes:
+                slot_size = SLOT_HEADER.size + capacity
+                for i in range(slots):
+                    self._clear_slot(offset + i * slot_size)
+
+
+class SharedMemoryCache(BaseCache):
+    """
+    Кэш в разделяемой памяти для нескольких воркеров gunicorn на одном хосте.
+
+    LOCATION - путь к файлу, лучше на tmpfs (/dev/shm). OPTIONS: MAX_SIZE - размер файла в байтах,
+    SIZE_CLASSES - вместимости слотов, WAYS - размер корзины. Значения больше самого крупного класса
+    и случаи, когда файл не удалось открыть, уходят в локальный кэш процесса (LocMemCache).
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._table = SharedMemoryTable(
+            location,
+            max_size=options.get('MAX_SIZE', DEFAULT_MAX_SIZE),
+            size_classes=options.get('SIZE_CLASSES', DEFAULT_SIZE_CLASSES),
+            ways=options.get('WAYS', DEFAULT_WAYS),
+        )
+        self._fallback = LocMemCache(f'shm-fallback-{location}', params)
+        self._shared = True
+
+    def _table_call(self, method, key, version, *args):
+        if not self._shared:
+            return None
+        digest = self._table.digest(self.make_and_validate_key(key, version=version))
+        try:
+            return getattr(self._table, method)(digest, *args)
+        except OSError:
+            self._shared = False  # файл недоступен - дальше работаем только с локальным кэшем
+            return None
+
+    def _fits(self, data):
+        return self._shared and len(data) <= self._table.max_value_size
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return 0.0 if expires is None else expires
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        data = pickle.dumps(value, self.pickle_protocol)
+        if self._fits(data):
+            added = self._table_call('add', key, version, data, self._expires(timeout))
+            if added is not None:
+                return added
+        return self._fallback.add(key, value, timeout, version)
+
+    def get(self, key, default=None, version=None):
+        data = self._table_call('get', key, version)
+        if data is None:
+            return self._fallback.get(key, default, version)
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        data = pickle.dumps(value, self.pickle_protocol)
+        if self._fits(data):
+            self._table_call('set', key, version, data, self._expires(timeout))
+            if self._shared:
+                self._fallback.delete(key, version)
+                return
+        self._table_call('delete', key, version)
+        self._fallback.set(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        touched = self._table_call('touch', key, version, self._expires(timeout))
+        return bool(touched) or self._fallback.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        def increment(data):
+            return pickle.dumps(pickle.loads(data) + delta, self.pickle_protocol)
+
+        try:
+            data = self._table_call('update', key, version, increment)
+        except KeyError:
+            data = None
+        if data is None:
+            return self._fallback.incr(key, delta, version)
+        return pickle.loads(data)
+
+    def has_key(self, key, version=None):
+        return self._table_call('get', key, version) is not None or self._fallback.has_key(key, version)
+
+    def delete(self, key, version=None):
+        deleted = bool(self._table_call('delete', key, version))
+        return self._fallback.delete(key, version) or deleted
+
+    def clear(self):
+        if self._shared:
+            try:
+                self._table.clear()
+            except OSError:
+                self._shared = False
+        self._fallback.clear()
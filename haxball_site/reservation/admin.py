@@ -1,10 +1,42 @@
 from django.contrib import admin
 
-from .models import Replay, ReservationEntry, ReservationHost
+from .models import Replay, ReplayCheck, ReplayIndex, ReservationEntry, ReservationHost
+from .replays import index_replays
 
 # Register your models here.
 
-admin.site.register(Replay)
+
+@admin.register(Replay)
+class ReplayAdmin(admin.ModelAdmin):
+    list_display = ('name', 'match', 'author', 'created')
+    raw_id_fields = ('match',)
+    actions = ('reindex',)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        index_replays(Replay.objects.filter(id=obj.id), workers=0)
+
+    @admin.action(description='Разобрать реплеи заново')
+    def reindex(self, request, queryset):
+        indexes = index_replays(queryset, force=True)
+        failed = sum(1 for index in indexes if index.error)
+        self.message_user(request, f'Разобрано реплеев: {len(indexes)}, с ошибками: {failed}')
+
+
+@admin.register(ReplayIndex)
+class ReplayIndexAdmin(admin.ModelAdmin):
+    list_display = ('replay', 'match', 'duration', 'score_home', 'score_guest', 'error', 'parsed')
+    raw_id_fields = ('replay', 'match')
+
+
+@admin.register(ReplayCheck)
+class ReplayCheckAdmin(admin.ModelAdmin):
+    list_display = ('match', 'is_ok', 'checked')
+    raw_id_fields = ('match',)
+
+    @admin.display(boolean=True, description='Без расхождений')
+    def is_ok(self, obj):
+        return obj.is_ok
 
 
 @admin.register(ReservationHost)
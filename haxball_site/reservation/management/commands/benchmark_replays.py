@@ -0,0 +1,50 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import Replay
+from ...replays import parse_job
+
+
+class Command(BaseCommand):
+    help = 'Замерить скорость разбора реплеев (без записи в базу) при разном числе процессов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', help='файлы .hbr2 или папки с ними (по умолчанию - все загруженные)')
+        parser.add_argument('--workers', default='1,2,4', help='список чисел процессов через запятую')
+        parser.add_argument('--repeat', type=int, default=1, help='сколько раз прогнать весь набор')
+
+    def handle(self, *args, **options):
+        paths = []
+        for path in options['paths']:
+            if os.path.isdir(path):
+                paths.extend(
+                    os.path.join(root, name)
+                    for root, _, names in os.walk(path) for name in names if name.endswith('.hbr2')
+                )
+            else:
+                paths.append(path)
+        if not options['paths']:
+            paths = [replay.file.path for replay in Replay.objects.exclude(file='')]
+        if not paths:
+            raise CommandError('Нет реплеев для замера')
+
+        jobs = [(i, path, ()) for i, path in enumerate(paths)] * options['repeat']
+        total_mb = sum(os.path.getsize(path) for _, path, _ in jobs) / 2**20
+        print(f'Replays: {len(jobs)}, {total_mb:.1f} MB')
+
+        for workers in map(int, options['workers'].split(',')):
+            started = time.perf_counter()
+            if workers <= 1:
+                results = list(map(parse_job, jobs))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(parse_job, jobs, chunksize=4))
+            elapsed = time.perf_counter() - started
+            failed = sum(1 for _, data in results if data['error'])
+            print(
+                f'workers={workers}: {elapsed:.2f}s, {len(jobs) / elapsed:.1f} replays/s, '
+                f'{total_mb / elapsed:.1f} MB/s, failed: {failed}'
+            )
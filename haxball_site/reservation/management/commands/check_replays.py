@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from tournament.models import Match
+
+from ...models import ReplayCheck
+from ...replay_checks import check_matches
+from ...replays import BLUE, RED
+
+SIDES = {RED: 'красные', BLUE: 'синие', None: '?'}
+KINDS = {
+    'missing': 'есть в реплее, нет в протоколе',
+    'extra': 'есть в протоколе, нет в реплее',
+    'side': 'в реплее засчитан другой команде',
+}
+
+
+class Command(BaseCommand):
+    help = 'Сверить голы из разобранных реплеев с протоколами матчей (перепроверяются только изменившиеся матчи)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--season', type=int, help='номер сезона')
+        parser.add_argument('--league', type=int, help='id турнира')
+        parser.add_argument('--force', action='store_true', help='перепроверить все матчи')
+        parser.add_argument('--all', action='store_true', help='показать все расхождения, а не только новые')
+
+    def handle(self, *args, **options):
+        matches = Match.objects.all()
+        if options['season']:
+            matches = matches.filter(league__championship__number=options['season'])
+        if options['league']:
+            matches = matches.filter(league=options['league'])
+
+        checks = check_matches(matches, force=options['force'])
+        print(f'Matches rechecked: {len(checks)}')
+        if options['all']:
+            checks = ReplayCheck.objects.filter(match__in=matches).exclude(mismatches=[])
+
+        reported = {check.match_id: check for check in checks if check.mismatches}
+        report_matches = Match.objects.filter(id__in=reported).select_related('team_home', 'team_guest', 'numb_tour')
+        for match in report_matches:
+            print(f'{match} (id={match.id}):')
+            for row in reported[match.id].mismatches:
+                print(f'    {row["time"]} {SIDES[row["side"]]}: {KINDS[row["kind"]]}')
+        print(f'Matches with mismatches: {len(reported)}')
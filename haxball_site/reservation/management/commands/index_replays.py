@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from ...models import Replay
+from ...replays import index_replays
+
+
+class Command(BaseCommand):
+    help = 'Разобрать файлы реплеев и сохранить индексы (по умолчанию только новые и изменившиеся)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--match', type=int, help='id матча (по умолчанию - все реплеи)')
+        parser.add_argument('--workers', type=int, help='число процессов разбора (по умолчанию - по числу ядер)')
+        parser.add_argument('--force', action='store_true', help='разобрать заново все реплеи')
+
+    def handle(self, *args, **options):
+        replays = Replay.objects.all()
+        if options['match']:
+            replays = replays.filter(match=options['match'])
+
+        indexes = index_replays(replays, workers=options['workers'], force=options['force'])
+        for index in indexes:
+            if index.error:
+                print(f'Replay {index.replay_id}: {index.error}')
+        print(f'Replays indexed: {len(indexes)}, failed: {sum(1 for index in indexes if index.error)}')
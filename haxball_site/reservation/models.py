@@ -1,7 +1,15 @@
 from django.contrib.auth.models import User
+from django.core.validators import FileExtensionValidator
 from django.db import models
 from tournament.models import Match
 
+# Физика Haxball считает 60 кадров в секунду
+TICKS_PER_SECOND = 60
+
+
+def frame_time(frame):
+    return '{:02d}:{:02d}'.format(*divmod(frame // TICKS_PER_SECOND, 60))
+
 
 # Create your models here.
 class ReservationHost(models.Model):
@@ -44,6 +52,10 @@ class Replay(models.Model):
     description = models.TextField(verbose_name='Описание', blank=True, null=True)
     file = models.FileField(
         upload_to='hbr',
+        validators=[FileExtensionValidator(['hbr2'])],
+    )
+    match = models.ForeignKey(
+        Match, verbose_name='Матч', on_delete=models.SET_NULL, null=True, blank=True, related_name='replays'
     )
     author = models.ForeignKey(
         User, verbose_name='Выложил', on_delete=models.SET_NULL, null=True, related_name='uploaded_replays'
@@ -57,3 +69,60 @@ class Replay(models.Model):
         verbose_name = 'Реплей'
         verbose_name_plural = 'Реплеи'
         ordering = ['-created']
+
+
+class ReplayIndex(models.Model):
+    """Разобранные из файла реплея данные, чтобы не парсить его заново (см. reservation/replays.py)."""
+
+    replay = models.OneToOneField(
+        Replay, verbose_name='Реплей', primary_key=True, on_delete=models.CASCADE, related_name='index'
+    )
+    match = models.ForeignKey(
+        Match, verbose_name='Матч', on_delete=models.CASCADE, null=True, blank=True, related_name='replay_indexes'
+    )
+    file_size = models.PositiveIntegerField('Размер файла', default=0)
+    frames = models.PositiveIntegerField('Кадров', default=0)
+    score_home = models.PositiveSmallIntegerField('Голов красных', default=0)
+    score_guest = models.PositiveSmallIntegerField('Голов синих', default=0)
+    # [[кадр, 1 - красные/хозяева или 2 - синие/гости], ...]
+    goals = models.JSONField('Голы', default=list, blank=True)
+    players = models.JSONField('Игроки', default=list, blank=True)
+    error = models.CharField('Ошибка разбора', max_length=256, blank=True)
+    parsed = models.DateTimeField('Разобран', auto_now=True)
+
+    @property
+    def duration(self):
+        return frame_time(self.frames)
+
+    def goal_times(self):
+        return [(frame_time(frame), side) for frame, side in self.goals]
+
+    def __str__(self):
+        return f'Индекс реплея {self.replay_id}'
+
+    class Meta:
+        verbose_name = 'Индекс реплея'
+        verbose_name_plural = 'Индексы реплеев'
+
+
+class ReplayCheck(models.Model):
+    """Результат сверки голов из реплеев матча с голами/автоголами протокола (см. reservation/replay_checks.py)."""
+
+    match = models.OneToOneField(
+        Match, verbose_name='Матч', primary_key=True, on_delete=models.CASCADE, related_name='replay_check'
+    )
+    digest = models.CharField('Отпечаток данных', max_length=32)
+    # [{'kind': 'missing'|'extra'|'side', 'time': 'MM:SS', 'side': 1|2, 'row': 'goal'|'own_goal'|None, 'id': ...}]
+    mismatches = models.JSONField('Расхождения', default=list, blank=True)
+    checked = models.DateTimeField('Проверено', auto_now=True)
+
+    @property
+    def is_ok(self):
+        return not self.mismatches
+
+    def __str__(self):
+        return f'Сверка реплеев матча {self.match_id}'
+
+    class Meta:
+        verbose_name = 'Сверка реплеев'
+        verbose_name_plural = 'Сверки реплеев'
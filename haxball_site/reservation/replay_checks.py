@@ -0,0 +1,109 @@
+import hashlib
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from tournament.models import Goal, OtherEvents
+
+from .models import TICKS_PER_SECOND, ReplayCheck, ReplayIndex
+from .replays import BLUE, RED
+
+# Насколько время гола в протоколе может отличаться от реплея, в секундах
+GOAL_TIME_TOLERANCE = getattr(settings, 'REPLAY_GOAL_TIME_TOLERANCE', 2)
+
+
+def format_seconds(seconds):
+    return '{:02d}:{:02d}'.format(*divmod(seconds, 60))
+
+
+def protocol_goals(match_ids):
+    """Голы протокола по матчам: [(секунда матча, сторона, которой засчитан гол, тип строки, id)]."""
+    goals = defaultdict(list)
+    rows = Goal.objects.filter(match__in=match_ids).values_list(
+        'match', 'id', 'team', 'time_min', 'time_sec', 'match__team_home', 'match__team_guest'
+    )
+    for match_id, goal_id, team_id, time_min, time_sec, home_id, guest_id in rows:
+        side = RED if team_id == home_id else BLUE if team_id == guest_id else None
+        goals[match_id].append((time_min * 60 + time_sec, side, 'goal', goal_id))
+
+    own_goals = OtherEvents.objects.filter(match__in=match_ids, event=OtherEvents.OWN_GOAL).values_list(
+        'match', 'id', 'team', 'time_min', 'time_sec', 'match__team_home', 'match__team_guest'
+    )
+    for match_id, event_id, team_id, time_min, time_sec, home_id, guest_id in own_goals:
+        # Автогол засчитывается сопернику
+        side = BLUE if team_id == home_id else RED if team_id == guest_id else None
+        goals[match_id].append((time_min * 60 + time_sec, side, 'own_goal', event_id))
+    return goals
+
+
+def replay_goals(match_ids):
+    """
+    Голы из индексов реплеев: [(секунда матча, сторона)]. Если реплеев у матча несколько (по таймам),
+    время следующего отсчитывается от конца предыдущего. Красные считаются хозяевами.
+    """
+    goals = defaultdict(list)
+    offsets = defaultdict(int)
+    indexes = (
+        ReplayIndex.objects.filter(match__in=match_ids, error='')
+        .order_by('match', 'replay__created', 'replay')
+        .values_list('match', 'frames', 'goals')
+    )
+    for match_id, frames, markers in indexes:
+        offset = offsets[match_id]
+        goals[match_id].extend((offset + frame // TICKS_PER_SECOND, side) for frame, side in markers)
+        offsets[match_id] = offset + frames // TICKS_PER_SECOND
+    return goals
+
+
+def mismatch(kind, seconds, side, row=None, row_id=None):
+    return {'kind': kind, 'time': format_seconds(seconds), 'side': side, 'row': row, 'id': row_id}
+
+
+def compare_goals(protocol, replay, tolerance=GOAL_TIME_TOLERANCE):
+    """
+    Сопоставляет голы протокола с голами реплея той же стороны в пределах tolerance секунд.
+    side - гол есть в обоих, но засчитан другой стороне, extra - есть только в протоколе, missing - только в реплее.
+    """
+    unmatched = sorted(replay)
+    mismatches = []
+    for seconds, side, row, row_id in sorted(protocol):
+        near = [goal for goal in unmatched if abs(goal[0] - seconds) <= tolerance]
+        same_side = [goal for goal in near if goal[1] == side]
+        if same_side:
+            unmatched.remove(min(same_side, key=lambda goal: abs(goal[0] - seconds)))
+        elif near:
+            unmatched.remove(near[0])
+            mismatches.append(mismatch('side', seconds, side, row, row_id))
+        else:
+            mismatches.append(mismatch('extra', seconds, side, row, row_id))
+    mismatches.extend(mismatch('missing', seconds, side) for seconds, side in unmatched)
+    return sorted(mismatches, key=lambda row: row['time'])
+
+
+def check_matches(matches, force=False):
+    """
+    Сверяет голы реплеев с протоколом для матчей с разобранными реплеями.
+    Перепроверяются только матчи, у которых изменились голы протокола или реплеи (по отпечатку данных).
+    Возвращает сохраненные сверки изменившихся матчей.
+    """
+    match_ids = list(
+        matches.filter(replay_indexes__error='').order_by().values_list('id', flat=True).distinct()
+    )
+    protocol, replay = protocol_goals(match_ids), replay_goals(match_ids)
+    stored = dict(ReplayCheck.objects.filter(match__in=match_ids).values_list('match', 'digest'))
+
+    checks = []
+    for match_id in match_ids:
+        digest = hashlib.md5(repr((sorted(protocol[match_id]), replay[match_id])).encode()).hexdigest()
+        if not force and stored.get(match_id) == digest:
+            continue
+        checks.append(ReplayCheck(
+            match_id=match_id, digest=digest, mismatches=compare_goals(protocol[match_id], replay[match_id])
+        ))
+
+    with transaction.atomic():
+        ReplayCheck.objects.bulk_create(
+            checks, update_conflicts=True, unique_fields=['match'], update_fields=['digest', 'mismatches', 'checked']
+        )
+    return checks
+
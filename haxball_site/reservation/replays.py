@@ -0,0 +1,193 @@
+import os
+import struct
+import zlib
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.db import transaction
+from tournament.models import Match, Player, Substitution
+
+from .models import ReplayIndex
+
+HBR2_MAGIC = b'HBR2'
+HBR2_VERSION = 3
+CHUNK_SIZE = 64 * 1024
+RED, BLUE = 1, 2
+
+# Заголовок: магия, версия, число кадров. Дальше - raw deflate, в начале которого разметка голов
+# (метки на таймлайне плеера): число меток и для каждой кадр гола и забившая команда
+HEADER = struct.Struct('>4sII')
+GOAL_MARKERS_COUNT = struct.Struct('>H')
+GOAL_MARKER = struct.Struct('>IB')
+
+INDEX_FIELDS = ('match', 'file_size', 'frames', 'score_home', 'score_guest', 'goals', 'players', 'error')
+
+
+class ReplayFormatError(Exception):
+    pass
+
+
+def iter_payload(f):
+    """Распакованные данные реплея кусками не больше CHUNK_SIZE - файл целиком в память не читается."""
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+    for chunk in iter(partial(f.read, CHUNK_SIZE), b''):
+        while chunk and not decompressor.eof:
+            data = decompressor.decompress(chunk, CHUNK_SIZE)
+            if data:
+                yield data
+            chunk = decompressor.unconsumed_tail
+        if decompressor.eof:
+            return
+    tail = decompressor.flush()
+    if tail:
+        yield tail
+
+
+class PayloadReader:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.buffer = b''
+
+    def read(self, size):
+        while len(self.buffer) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                raise ReplayFormatError('Unexpected end of replay data')
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def rest(self):
+        if self.buffer:
+            yield self.buffer
+        yield from self.chunks
+
+
+def encode_string(value):
+    """Строка так, как ее пишет реплей: длина в байтах варинтом (LEB128), затем UTF-8."""
+    data = value.encode('utf-8')
+    length, prefix = len(data), bytearray()
+    while True:
+        byte = length & 0x7F
+        length >>= 7
+        if not length:
+            prefix.append(byte)
+            return bytes(prefix) + data
+        prefix.append(byte | 0x80)
+
+
+def find_names(chunks, names):
+    """
+    Какие из никнеймов встречаются в потоке. Ищем строку вместе с префиксом длины, иначе "Ace" нашелся бы внутри
+    "Aceman". Хвост предыдущего куска сохраняется, чтобы не терять имена на стыке.
+    """
+    patterns = {name: encode_string(name) for name in names if name}
+    overlap = max(map(len, patterns.values()), default=1) - 1
+    found = set()
+    tail = b''
+    for chunk in chunks:
+        window = tail + chunk
+        found.update(name for name, pattern in patterns.items() if name not in found and pattern in window)
+        if len(found) == len(patterns):
+            break
+        tail = window[-overlap:] if overlap else b''
+    return found
+
+
+def parse_replay(path, names=()):
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ReplayFormatError('File is too short')
+        magic, version, frames = HEADER.unpack(header)
+        if magic != HBR2_MAGIC or version != HBR2_VERSION:
+            raise ReplayFormatError(f'Not an HBR2 v{HBR2_VERSION} replay')
+
+        reader = PayloadReader(iter_payload(f))
+        (count,) = GOAL_MARKERS_COUNT.unpack(reader.read(GOAL_MARKERS_COUNT.size))
+        goals = [list(GOAL_MARKER.unpack(reader.read(GOAL_MARKER.size))) for _ in range(count)]
+        players = find_names(reader.rest(), names)
+
+    return {
+        'file_size': os.path.getsize(path),
+        'frames': frames,
+        'score_home': sum(1 for _, side in goals if side == RED),
+        'score_guest': sum(1 for _, side in goals if side == BLUE),
+        'goals': goals,
+        'players': sorted(players),
+        'error': '',
+    }
+
+
+def parse_job(job):
+    replay_id, path, names = job
+    try:
+        return replay_id, parse_replay(path, names)
+    except (OSError, ReplayFormatError, zlib.error, struct.error) as e:
+        # Размер сохраняем и для битого файла, иначе stale_replays будет разбирать его при каждом запуске
+        try:
+            file_size = os.path.getsize(path)
+        except OSError:
+            file_size = 0
+        return replay_id, {'file_size': file_size, 'error': str(e)[:256]}
+
+
+def match_nicknames(match_ids):
+    """Никнеймы, которые ищем в реплеях матчей: составы, вышедшие на замену и текущие игроки команд."""
+    names = defaultdict(set)
+    played = (
+        Match.team_home_start.through.objects.filter(match__in=match_ids).values_list('match', 'player__nickname'),
+        Match.team_guest_start.through.objects.filter(match__in=match_ids).values_list('match', 'player__nickname'),
+        Substitution.objects.filter(match__in=match_ids).values_list('match', 'player_in__nickname'),
+    )
+    for rows in played:
+        for match_id, nickname in rows:
+            names[match_id].add(nickname)
+
+    teams = defaultdict(set)
+    for match_id, *team_ids in Match.objects.filter(id__in=match_ids).values_list('id', 'team_home', 'team_guest'):
+        for team_id in team_ids:
+            teams[team_id].add(match_id)
+    for team_id, nickname in Player.objects.filter(team__in=teams).values_list('team', 'nickname'):
+        for match_id in teams[team_id]:
+            names[match_id].add(nickname)
+    return names
+
+
+def stale_replays(replays):
+    """Реплеи без индекса или с изменившимся с прошлого разбора файлом/матчем."""
+    for replay in replays:
+        index = getattr(replay, 'index', None)
+        try:
+            size = replay.file.size
+        except OSError:
+            size = None
+        if index is None or index.file_size != size or index.match_id != replay.match_id:
+            yield replay
+
+
+def index_replays(replays, workers=None, force=False):
+    """
+    Разбирает реплеи в пуле процессов и сохраняет индексы одним запросом.
+    По умолчанию разбираются только новые и изменившиеся файлы, с force - все.
+    """
+    replays = [replay for replay in replays.select_related('index') if replay.file]
+    if not force:
+        replays = list(stale_replays(replays))
+    names = match_nicknames({replay.match_id for replay in replays if replay.match_id})
+    jobs = [(replay.id, replay.file.path, sorted(names.get(replay.match_id, ()))) for replay in replays]
+
+    if workers == 0 or len(jobs) <= 1:
+        results = list(map(parse_job, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_job, jobs, chunksize=4))
+
+    match_ids = {replay.id: replay.match_id for replay in replays}
+    indexes = [ReplayIndex(replay_id=replay_id, match_id=match_ids[replay_id], **data) for replay_id, data in results]
+    with transaction.atomic():
+        ReplayIndex.objects.bulk_create(
+            indexes, update_conflicts=True, unique_fields=['replay'], update_fields=[*INDEX_FIELDS, 'parsed']
+        )
+    return indexes
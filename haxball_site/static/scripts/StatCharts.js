@@ -0,0 +1,174 @@
+// Строит графики дашборда игрока/команды по описаниям из tournament/charts.py.
+// Данные секций приходят отдельными JSON-запросами и кэшируются браузером по ETag.
+
+document.addEventListener('htmx:load', (event) => {
+    const content = event.target;
+    if (content.matches('.stat-charts')) {
+        renderStatCharts(content);
+    }
+    content.querySelectorAll('.stat-charts').forEach(renderStatCharts);
+});
+
+
+function renderStatCharts(root) {
+    const sections = JSON.parse(document.getElementById(root.dataset.specsId).textContent);
+    sections.forEach((section) => {
+        fetch(section.url, {credentials: 'same-origin'})
+            .then((response) => response.json())
+            .then((data) => renderChartSection(root, section, data));
+    });
+}
+
+function renderChartSection(root, section, data) {
+    root.querySelectorAll(`[data-chart-section="${section.key}"]`).forEach((element) => {
+        const spec = section.specs[element.dataset.chartKind][Number(element.dataset.chartIndex)];
+        const figure = buildFigure(spec, data);
+        if (!figure) {
+            element.remove();
+            return;
+        }
+        Plotly.newPlot(element, figure.data, figure.layout, {responsive: true, displaylogo: false});
+    });
+}
+
+function buildFigure(spec, data) {
+    if (spec.type === 'recap') {
+        return recapFigure(spec, data.totals);
+    }
+
+    const source = data[spec.source];
+    if (spec.type === 'pie') {
+        return pieFigure(spec, source);
+    }
+    // Топ игроков без данных не показываем совсем
+    if (spec.top_n && !source[spec.x].length) {
+        return null;
+    }
+    return barFigure(spec, source);
+}
+
+function barFigure(spec, source) {
+    const horizontal = spec.orientation === 'h';
+    const categories = source[spec.x];
+    const valueFormat = spec.value_format ? `:${spec.value_format}` : '';
+    const categoryAxis = horizontal ? 'y' : 'x';
+    const valueAxis = horizontal ? 'x' : 'y';
+
+    const traces = spec.y.map((column, idx) => {
+        const trace = {
+            type: spec.type,
+            name: spec.names ? spec.names[idx] : column,
+            orientation: spec.orientation,
+            [categoryAxis]: categories,
+            [valueAxis]: source[column],
+            texttemplate: `%{value${valueFormat}}`,
+            textposition: 'outside',
+            textangle: 0,
+            textfont: {size: 12},
+            cliponaxis: false,
+            hovertemplate: `${spec.labels.category}=%{${categoryAxis}}<br>`
+                + `${spec.labels.value}=%{${valueAxis}${valueFormat}}<extra></extra>`,
+        };
+        if (spec.type === 'histogram') {
+            trace.histfunc = 'sum';
+        }
+        if (spec.colors) {
+            trace.marker = {color: spec.colors[idx]};
+        }
+        return mergeDeep(trace, spec.traces);
+    });
+
+    const title = spec.title.replace('{n}', Math.max(spec.top_n || 0, categories.length));
+    const layout = baseLayout(title, {
+        showlegend: spec.y.length > 1,
+        legend: {title: {text: spec.labels.variable || ''}},
+        [`${categoryAxis}axis`]: {title: {text: spec.labels.category}},
+        [`${valueAxis}axis`]: {title: {text: spec.labels.value}, rangemode: 'nonnegative'},
+    });
+    if (spec.stack_totals) {
+        layout.annotations = stackTotals(categories, spec.y.map((column) => source[column]));
+    }
+
+    return {data: traces, layout: mergeDeep(layout, spec.layout)};
+}
+
+// Подписи с суммой над столбцом из нескольких частей, если частей больше одной
+function stackTotals(categories, columns) {
+    return categories.map((category, idx) => {
+        const values = columns.map((column) => column[idx]);
+        const total = values.reduce((sum, value) => sum + value, 0);
+        return {
+            x: category,
+            y: total,
+            text: total > Math.max(...values) ? String(total) : '',
+            xanchor: 'auto',
+            yanchor: 'bottom',
+            showarrow: false,
+        };
+    });
+}
+
+function pieFigure(spec, source) {
+    const values = source[spec.values];
+    const layout = baseLayout(spec.title, {});
+    if (values.every((value) => value === 0)) {
+        layout.annotations = [
+            {x: 0.5, y: 0.5, xanchor: 'center', yanchor: 'middle', text: 'Нет данных', font: {size: 24}, showarrow: false},
+        ];
+    }
+
+    return {
+        data: [{
+            type: 'pie',
+            labels: source[spec.names],
+            values: values,
+            texttemplate: '%{percent} (%{value})',
+            hovertemplate: `${spec.labels.names}=%{label}<br>${spec.labels.values}=%{value}<extra></extra>`,
+        }],
+        layout: mergeDeep(layout, spec.layout),
+    };
+}
+
+function recapFigure(spec, totals) {
+    const value = totals[spec.value];
+    const text = spec.percentage ? `${value.toFixed(1)}%` : String(value);
+
+    return {
+        data: [{
+            type: 'pie',
+            labels: ['name'],
+            values: [1],
+            hole: 0.95,
+            textinfo: 'none',
+            hoverinfo: 'none',
+            sort: false,
+            marker: spec.color ? {colors: [spec.color]} : {},
+        }],
+        layout: baseLayout(spec.title, {
+            height: 250,
+            margin: {t: 50, b: 20},
+            hovermode: false,
+            showlegend: false,
+            annotations: [{text: text, x: 0.5, y: 0.5, xanchor: 'center', font: {size: 25}, showarrow: false}],
+        }),
+    };
+}
+
+function baseLayout(title, layout) {
+    return mergeDeep({
+        title: {text: title, x: 0.5, y: 0.9, xanchor: 'center', yanchor: 'top'},
+        modebar: {remove: ['lasso', 'select']},
+    }, layout);
+}
+
+function mergeDeep(target, source) {
+    Object.entries(source || {}).forEach(([key, value]) => {
+        if (value && typeof value === 'object' && !Array.isArray(value)
+                && target[key] && typeof target[key] === 'object') {
+            mergeDeep(target[key], value);
+        } else {
+            target[key] = value;
+        }
+    });
+    return target;
+}
@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.db.models import Q
 from django.urls import resolve
 
+from .counters import recompute_matches
 from .models import (
     AchievementCategory,
     Achievements,
@@ -10,6 +11,7 @@ from .models import (
     FreeAgent,
     Goal,
     League,
+    LeagueStanding,
     Match,
     MatchResult,
     Nation,
@@ -229,8 +231,8 @@ class PostponementAdmin(admin.ModelAdmin):
 
 @admin.register(League)
 class LeagueAdmin(admin.ModelAdmin):
-    list_display = ('title', 'slug', 'is_cup', 'priority', 'championship', 'created')
-    list_filter = ('championship',)
+    list_display = ('title', 'slug', 'tournament_type', 'is_cup', 'priority', 'championship', 'created')
+    list_filter = ('championship', 'tournament_type')
     search_fields = ('title',)
     filter_horizontal = ('teams',)
     inlines = [PostponementSlotsInline]
@@ -382,6 +384,15 @@ class MatchAdmin(admin.ModelAdmin):
     )
     inlines = [MatchResultInline, GoalInline, SubstitutionInline, EventInline, DisqualificationInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Счет в форме можно вписать руками (ТП, старые матчи без голов), поэтому пересобираем его из событий,
+        # только если в этом сохранении меняли голы или события, иначе пересчитываем одни счетчики
+        events_changed = any(
+            formset.model in (Goal, OtherEvents) and formset.has_changed() for formset in formsets
+        )
+        recompute_matches([form.instance.id], with_scores=events_changed)
+
 
 @admin.register(Goal)
 class GoalAdmin(admin.ModelAdmin):
@@ -429,3 +440,9 @@ class RatingVersionAdmin(admin.ModelAdmin):
 class TeamRatingAdmin(admin.ModelAdmin):
     list_display = ('version', 'rank', 'team', 'total_points')
     list_filter = ('version', 'team')
+
+
+@admin.register(LeagueStanding)
+class LeagueStandingAdmin(admin.ModelAdmin):
+    list_display = ('league', 'position', 'team', 'played', 'wins', 'draws', 'losses', 'scored', 'conceded', 'points')
+    list_filter = ('league',)
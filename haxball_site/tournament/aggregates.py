@@ -0,0 +1,470 @@
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import PLAYER, bump_revisions
+from .models import (
+    Goal,
+    Match,
+    MatchResult,
+    OtherEvents,
+    PlayerSeasonStats,
+    Substitution,
+    Team,
+    TeamRecords,
+    TeamSeasonStats,
+)
+
+# Порядок важен - в нем статистика выводится на странице игрока
+PLAYER_STAT_FIELDS = (
+    'matches',
+    'goals',
+    'assists',
+    'goals_assists',
+    'cs',
+    'subs_out',
+    'subs_in',
+    'ogs',
+    'yellow_cards',
+    'red_cards',
+)
+
+# Порядок важен - в нем статистика выводится на странице команды
+TEAM_STAT_FIELDS = (
+    'matches',
+    'wins',
+    'draws',
+    'losses',
+    'winrate',
+    'goals',
+    'conceded_goals',
+    'assists',
+    'cs',
+    'subs',
+    'ogs',
+    'yellow_cards',
+    'red_cards',
+)
+
+TEAM_EVENT_FIELDS = {
+    OtherEvents.CLEAN_SHEET: 'cs',
+    OtherEvents.OWN_GOAL: 'ogs',
+    OtherEvents.YELLOW_CARD: 'yellow_cards',
+    OtherEvents.RED_CARD: 'red_cards',
+}
+
+TEAM_RECORD_MATCHES = (
+    'first_match',
+    'biggest_home_win',
+    'biggest_guest_win',
+    'biggest_home_loss',
+    'biggest_guest_loss',
+    'most_effective_draw',
+)
+TEAM_RECORD_PLAYERS = (
+    'greatest_goalscorer',
+    'greatest_assistant',
+    'greatest_goalkeeper',
+    'greatest_player',
+    'greatest_sub_in',
+)
+
+HomeStart = Match.team_home_start.through
+GuestStart = Match.team_guest_start.through
+
+
+def _match_rows(queryset, player_field, team_field, match_filter, player_ids):
+    queryset = queryset.filter(match__is_played=True, **{'match__' + k: v for k, v in match_filter.items()})
+    if player_ids is not None:
+        queryset = queryset.filter(**{player_field + '__in': player_ids})
+    return queryset.values_list(
+        player_field, 'match_id', team_field, 'match__league_id', 'match__league__championship_id'
+    ).order_by()
+
+
+def compute_player_stats(match_filter=None, player_ids=None):
+    """
+    Считает строки PlayerSeasonStats (игрок, сезон, команда, турнир) по сыгранным матчам.
+    События в матчах, где игрока нет в составе, попадают в строку с matches=0 за команду из события -
+    они учитываются в общей статистике, но не в разбивке по сезонам.
+    """
+    match_filter = match_filter or {}
+
+    # (игрок, матч) -> (команда, турнир, сезон)
+    appearances = {}
+    starts = (
+        _match_rows(HomeStart.objects, 'player_id', 'match__team_home_id', match_filter, player_ids),
+        _match_rows(GuestStart.objects, 'player_id', 'match__team_guest_id', match_filter, player_ids),
+        _match_rows(Substitution.objects, 'player_in_id', 'team_id', match_filter, player_ids),
+    )
+    for rows in starts:
+        for player_id, match_id, team_id, league_id, season_id in rows:
+            appearances.setdefault((player_id, match_id), (team_id, league_id, season_id))
+
+    event_sources = (
+        ('goals', Goal.objects, 'author_id'),
+        ('assists', Goal.objects, 'assistent_id'),
+        ('cs', OtherEvents.objects.cs(), 'author_id'),
+        ('subs_out', Substitution.objects, 'player_out_id'),
+        ('subs_in', Substitution.objects, 'player_in_id'),
+        ('ogs', OtherEvents.objects.ogs(), 'author_id'),
+        ('yellow_cards', OtherEvents.objects.yellow_cards(), 'author_id'),
+        ('red_cards', OtherEvents.objects.red_cards(), 'author_id'),
+    )
+    events = [
+        (field, _match_rows(queryset, player_field, 'team_id', match_filter, player_ids))
+        for field, queryset, player_field in event_sources
+    ]
+
+    stats = defaultdict(lambda: defaultdict(int))
+    for (player_id, _), (team_id, league_id, season_id) in appearances.items():
+        stats[(player_id, season_id, team_id, league_id)]['matches'] += 1
+    for field, rows in events:
+        for player_id, match_id, team_id, league_id, season_id in rows:
+            if player_id is None:
+                continue
+            team_id, league_id, season_id = appearances.get((player_id, match_id), (team_id, league_id, season_id))
+            stats[(player_id, season_id, team_id, league_id)][field] += 1
+
+    return [
+        PlayerSeasonStats(player_id=player_id, season_id=season_id, team_id=team_id, league_id=league_id, **counters)
+        for (player_id, season_id, team_id, league_id), counters in stats.items()
+    ]
+
+
+def refresh_player_stats(league_id, player_ids):
+    player_ids = {player_id for player_id in player_ids if player_id is not None}
+    if not player_ids:
+        return
+    rows = compute_player_stats({'league_id': league_id}, player_ids)
+    with transaction.atomic():
+        PlayerSeasonStats.objects.filter(league_id=league_id, player_id__in=player_ids).delete()
+        PlayerSeasonStats.objects.bulk_create(rows)
+    bump_revisions(PLAYER, player_ids)
+
+
+def rebuild_player_stats():
+    rows = compute_player_stats()
+    with transaction.atomic():
+        PlayerSeasonStats.objects.all().delete()
+        PlayerSeasonStats.objects.bulk_create(rows, batch_size=1000)
+    return rows
+
+
+def match_player_ids(match_id):
+    player_ids = set(HomeStart.objects.filter(match_id=match_id).values_list('player_id', flat=True))
+    player_ids.update(GuestStart.objects.filter(match_id=match_id).values_list('player_id', flat=True))
+    for author_id, assistent_id in Goal.objects.filter(match_id=match_id).values_list('author_id', 'assistent_id'):
+        player_ids.update((author_id, assistent_id))
+    player_ids.update(OtherEvents.objects.filter(match_id=match_id).values_list('author_id', flat=True))
+    for player_out_id, player_in_id in Substitution.objects.filter(match_id=match_id).values_list(
+        'player_out_id', 'player_in_id'
+    ):
+        player_ids.update((player_out_id, player_in_id))
+    return player_ids
+
+
+def compute_team_stats(team_ids=None):
+    matches = Match.objects.filter(is_played=True)
+    if team_ids is not None:
+        matches = matches.filter(Q(team_home_id__in=team_ids) | Q(team_guest_id__in=team_ids))
+
+    def tracked(*teams):
+        return [team_id for team_id in teams if team_ids is None or team_id in team_ids]
+
+    stats = defaultdict(lambda: defaultdict(int))  # (команда, сезон, турнир) -> показатели
+    match_teams = {}  # матч -> (сезон, турнир, хозяева, гости)
+    match_rows = matches.values_list(
+        'id',
+        'league_id',
+        'league__championship_id',
+        'team_home_id',
+        'team_guest_id',
+        'result__winner_id',
+        'result__value',
+    )
+    for match_id, league_id, season_id, home_id, guest_id, winner_id, result in match_rows:
+        match_teams[match_id] = (season_id, league_id, home_id, guest_id)
+        for team_id in tracked(home_id, guest_id):
+            team_stats = stats[(team_id, season_id, league_id)]
+            team_stats['matches'] += 1
+            if winner_id == team_id:
+                team_stats['wins'] += 1
+            elif result == MatchResult.DRAW:
+                team_stats['draws'] += 1
+            else:
+                team_stats['losses'] += 1
+
+    match_ids = matches.values('id')
+    for match_id, goal_team_id, assistent_id in Goal.objects.filter(match__in=match_ids).values_list(
+        'match_id', 'team_id', 'assistent_id'
+    ):
+        season_id, league_id, home_id, guest_id = match_teams[match_id]
+        for team_id in tracked(home_id, guest_id):
+            team_stats = stats[(team_id, season_id, league_id)]
+            if goal_team_id == team_id:
+                team_stats['goals'] += 1
+                if assistent_id is not None:
+                    team_stats['assists'] += 1
+            else:
+                team_stats['conceded_goals'] += 1
+
+    events = [
+        (match_id, team_id, TEAM_EVENT_FIELDS[event])
+        for match_id, team_id, event in OtherEvents.objects.filter(match__in=match_ids).values_list(
+            'match_id', 'team_id', 'event'
+        )
+    ]
+    events.extend(
+        (match_id, team_id, 'subs')
+        for match_id, team_id in Substitution.objects.filter(match__in=match_ids).values_list('match_id', 'team_id')
+    )
+    for match_id, event_team_id, field in events:
+        season_id, league_id, home_id, guest_id = match_teams[match_id]
+        if event_team_id in tracked(home_id, guest_id):
+            stats[(event_team_id, season_id, league_id)][field] += 1
+
+    return [
+        TeamSeasonStats(team_id=team_id, season_id=season_id, league_id=league_id, **counters)
+        for (team_id, season_id, league_id), counters in stats.items()
+    ]
+
+
+def compute_team_records(team: Team):
+    records = TeamRecords(team=team)
+    all_matches = team.home_matches.all() | team.guest_matches.all()
+
+    records.first_match = all_matches.filter(is_played=True, match_date__isnull=False).order_by('match_date').first()
+    records.biggest_home_win = (
+        team.home_matches.filter(score_home__gt=F('score_guest'))
+        .annotate(goal_diff=F('score_home') - F('score_guest'))
+        .order_by('-goal_diff')
+        .first()
+    )
+    records.biggest_guest_win = (
+        team.guest_matches.filter(score_guest__gt=F('score_home'))
+        .annotate(goal_diff=F('score_guest') - F('score_home'))
+        .order_by('-goal_diff')
+        .first()
+    )
+    records.biggest_home_loss = (
+        team.home_matches.filter(score_home__lt=F('score_guest'))
+        .annotate(goal_diff=F('score_home') - F('score_guest'))
+        .order_by('goal_diff')
+        .first()
+    )
+    records.biggest_guest_loss = (
+        team.guest_matches.filter(score_guest__lt=F('score_home'))
+        .annotate(goal_diff=F('score_guest') - F('score_home'))
+        .order_by('goal_diff')
+        .first()
+    )
+    records.most_effective_draw = (
+        all_matches.filter(score_guest=F('score_home'))
+        .annotate(scored_total=F('score_home') + F('score_guest'))
+        .order_by('-scored_total')
+        .first()
+    )
+
+    cards_filter = Q(match_event__event=OtherEvents.YELLOW_CARD) | Q(match_event__event=OtherEvents.RED_CARD)
+    most_cards_match = (
+        all_matches.annotate(cards_count=Count('match_event', filter=cards_filter)).order_by('-cards_count').first()
+    )
+    if most_cards_match:
+        records.most_cards_match = most_cards_match
+        records.most_cards_count = most_cards_match.cards_count
+
+    records.fastest_goal = Goal.objects.filter(team=team).order_by('time_min', 'time_sec').first()
+    records.latest_goal = Goal.objects.filter(team=team).order_by('-time_min', '-time_sec').first()
+
+    top_contributors = (
+        ('greatest_goalscorer', team.goals.values(player=F('author')).annotate(count=Count('author'))),
+        ('greatest_assistant', team.goals.values(player=F('assistent')).annotate(count=Count('assistent'))),
+        (
+            'greatest_goalkeeper',
+            team.team_events.filter(event=OtherEvents.CLEAN_SHEET)
+            .values(player=F('author'))
+            .annotate(count=Count('author')),
+        ),
+        # матчи игрока уже посчитаны без повторов (старт + выход на замену) в статистике игроков
+        (
+            'greatest_player',
+            PlayerSeasonStats.objects.filter(team=team)
+            .values('player')
+            .annotate(count=Sum('matches'))
+            .filter(count__gt=0),
+        ),
+        (
+            'greatest_sub_in',
+            Substitution.objects.filter(team=team)
+            .values(player=F('player_in'))
+            .annotate(count=Count('match', distinct=True)),
+        ),
+    )
+    for field, queryset in top_contributors:
+        top = queryset.order_by('-count').first()
+        if top and top['player'] is not None and top['count']:
+            setattr(records, field + '_id', top['player'])
+            setattr(records, field + '_count', top['count'])
+
+    return records
+
+
+def get_team_records(team: Team):
+    match_paths = ('team_home', 'team_guest', 'league__championship')
+    related = [f'{field}__{path}' for field in TEAM_RECORD_MATCHES + ('most_cards_match',) for path in match_paths]
+    related += [f'{field}__match__{path}' for field in ('fastest_goal', 'latest_goal') for path in match_paths]
+    related += [f'{field}__name__user_profile' for field in TEAM_RECORD_PLAYERS]
+    return TeamRecords.objects.filter(team=team).select_related(*related).first()
+
+
+def refresh_team_stats(team: Team):
+    rows = compute_team_stats({team.id})
+    records = compute_team_records(team)
+    with transaction.atomic():
+        TeamSeasonStats.objects.filter(team=team).delete()
+        TeamSeasonStats.objects.bulk_create(rows)
+        records.save()
+
+
+def rebuild_team_stats():
+    rows = compute_team_stats()
+    with transaction.atomic():
+        TeamSeasonStats.objects.all().delete()
+        TeamSeasonStats.objects.bulk_create(rows, batch_size=1000)
+        for team in Team.objects.all():
+            compute_team_records(team).save()
+    return rows
+
+
+# Пересчитываем после коммита и по одному разу на ключ, даже если в транзакции матч сохранялся много раз
+# (например, при сохранении матча в админке вместе с голами и событиями)
+_pending = threading.local()
+
+
+def on_commit_once(key, func):
+    if not hasattr(_pending, 'keys'):
+        _pending.keys = set()
+    _pending.keys.add(key)
+    transaction.on_commit(partial(_run_pending, key, func))
+
+
+def _run_pending(key, func):
+    if key not in getattr(_pending, 'keys', ()):
+        return
+    _pending.keys.discard(key)
+    func()
+
+
+def schedule_team_refresh(team_ids):
+    for team_id in team_ids:
+        if team_id is not None:
+            on_commit_once(('team_stats', team_id), partial(_refresh_team, team_id))
+
+
+def _refresh_team(team_id):
+    team = Team.objects.filter(id=team_id).first()
+    if team:
+        refresh_team_stats(team)
+
+
+def schedule_player_refresh(league_id, player_ids=(), match_ids=()):
+    """
+    Копит игроков и матчи лиги до коммита и пересчитывает статистику лиги один раз: игроков матчей
+    собираем уже после коммита, когда все голы, события и составы транзакции на месте.
+    """
+    if league_id is None:
+        return
+    if not hasattr(_pending, 'player_stats'):
+        _pending.player_stats = defaultdict(lambda: (set(), set()))
+    pending_players, pending_matches = _pending.player_stats[league_id]
+    pending_players.update(player_ids)
+    pending_matches.update(match_id for match_id in match_ids if match_id is not None)
+    on_commit_once(('player_stats', league_id), partial(_refresh_players, league_id))
+
+
+def _refresh_players(league_id):
+    player_ids, match_ids = _pending.player_stats.pop(league_id, (set(), set()))
+    for match_id in match_ids:
+        player_ids |= match_player_ids(match_id)
+    refresh_player_stats(league_id, player_ids)
+
+
+# Поля событий с игроками - до сохранения запоминаем старые значения, чтобы пересчитать и прежних игроков
+EVENT_PLAYER_FIELDS = {
+    Goal: ('author_id', 'assistent_id'),
+    OtherEvents: ('author_id',),
+    Substitution: ('player_out_id', 'player_in_id'),
+}
+
+
+@receiver(pre_save, sender=Goal)
+@receiver(pre_save, sender=OtherEvents)
+@receiver(pre_save, sender=Substitution)
+def remember_event_players(sender, instance, **kwargs):
+    instance._previous_player_ids = ()
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list(*EVENT_PLAYER_FIELDS[sender]).first()
+        instance._previous_player_ids = previous or ()
+
+
+@receiver(post_save, sender=Goal)
+@receiver(post_save, sender=OtherEvents)
+@receiver(post_save, sender=Substitution)
+@receiver(post_delete, sender=Goal)
+@receiver(post_delete, sender=OtherEvents)
+@receiver(post_delete, sender=Substitution)
+def update_on_event_change(sender, instance, **kwargs):
+    player_ids = [getattr(instance, field) for field in EVENT_PLAYER_FIELDS[sender]]
+    player_ids.extend(getattr(instance, '_previous_player_ids', ()))
+    # Событие могли перенести в другой матч - пересчитываем и прежний
+    match_ids = {instance.match_id, instance.tracker.previous('match')} - {None}
+    for match_id, league_id, *team_ids in Match.objects.filter(id__in=match_ids).values_list(
+        'id', 'league', 'team_home', 'team_guest'
+    ):
+        schedule_player_refresh(league_id, player_ids, [match_id])
+        schedule_team_refresh(team_ids)
+
+
+@receiver(post_save, sender=Match)
+def update_on_match_save(sender, instance, **kwargs):
+    schedule_player_refresh(instance.league_id, match_ids=[instance.id])
+    # Матч перенесли в другую лигу - его игроков нужно убрать из статистики прежней
+    previous_league_id = instance.tracker.previous('league')
+    if previous_league_id is not None and previous_league_id != instance.league_id:
+        schedule_player_refresh(previous_league_id, match_ids=[instance.id])
+    schedule_team_refresh([instance.team_home_id, instance.team_guest_id])
+
+
+@receiver(pre_delete, sender=Match)
+def update_on_match_delete(sender, instance, **kwargs):
+    # После удаления события матча уже не найти, поэтому запоминаем игроков заранее
+    instance._previous_player_ids = match_player_ids(instance.id)
+
+
+@receiver(post_delete, sender=Match)
+def update_after_match_delete(sender, instance, **kwargs):
+    schedule_player_refresh(instance.league_id, getattr(instance, '_previous_player_ids', ()))
+    schedule_team_refresh([instance.team_home_id, instance.team_guest_id])
+
+
+@receiver(m2m_changed, sender=HomeStart)
+@receiver(m2m_changed, sender=GuestStart)
+def update_on_squad_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._previous_player_ids = match_player_ids(instance.id)
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        for match in Match.objects.filter(id__in=pk_set or ()):
+            schedule_player_refresh(match.league_id, {instance.id})
+            schedule_team_refresh([match.team_home_id, match.team_guest_id])
+    else:
+        player_ids = set(pk_set or ()) | getattr(instance, '_previous_player_ids', set())
+        schedule_player_refresh(instance.league_id, player_ids, [instance.id])
+        schedule_team_refresh([instance.team_home_id, instance.team_guest_id])
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class TournamentConfig(AppConfig):
     name = 'tournament'
     verbose_name = '2. Чемпионат'
+
+    def ready(self):
+        from . import aggregates, cache, halloffame, team_rating  # noqa: F401 подключаем сигналы пересчета и кэша
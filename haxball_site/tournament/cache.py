@@ -0,0 +1,163 @@
+import time
+from functools import partial, wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Goal, League, Match, OtherEvents, Player, PlayerTransfer, Substitution, TeamAchievement
+
+LEAGUE = 'league'
+TEAM = 'team'
+PLAYER = 'player'
+RATING = 'rating'
+
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _revision_key(scope, obj_id):
+    return f'tournament:revision:{scope}:{obj_id}'
+
+
+def _initial_revision():
+    # Если счетчик вытеснен из кэша, новая ревизия не должна совпасть с одной из старых
+    return time.time_ns() // 1000
+
+
+def get_revision(scope, obj_id):
+    key = _revision_key(scope, obj_id)
+    revision = cache.get(key)
+    if revision is None:
+        cache.add(key, _initial_revision(), timeout=None)
+        revision = cache.get(key)
+    return revision
+
+
+def bump_revisions(scope, ids):
+    for obj_id in set(ids):
+        if obj_id is None:
+            continue
+        key = _revision_key(scope, obj_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_revision(), timeout=None)
+
+
+def schedule_revisions(scope, ids):
+    """
+    Сдвигает ревизии после коммита транзакции: иначе между сдвигом и коммитом кто-нибудь успеет
+    закэшировать под новой ревизией еще старые данные. ids вычисляются сразу, пока связи не удалены.
+    """
+    transaction.on_commit(partial(bump_revisions, scope, list(ids)))
+
+
+def cached_by_revision(scope, get_id, timeout=CACHE_TIMEOUT, get_key_id=None):
+    """
+    Кэширует результат фильтра до следующего изменения ревизии лиги/команды.
+    get_id достает id лиги/команды из первого аргумента фильтра. get_key_id - если значение зависит
+    не от всей лиги/команды, а от самого аргумента (тур лиги), его id тоже попадает в ключ.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(obj, *args):
+            obj_id = get_id(obj)
+            key_id = obj_id if get_key_id is None else get_key_id(obj)
+            key = ':'.join(map(str, ('tournament', func.__name__, key_id, get_revision(scope, obj_id), *args)))
+            result = cache.get(key)
+            if result is None:
+                result = func(obj, *args)
+                if isinstance(result, QuerySet):
+                    result = list(result)
+                cache.set(key, result, timeout)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@receiver(post_save, sender=Match)
+@receiver(post_delete, sender=Match)
+def bump_match_revisions(sender, instance, **kwargs):
+    schedule_revisions(LEAGUE, [instance.league_id])
+    schedule_revisions(TEAM, [instance.team_home_id, instance.team_guest_id])
+
+
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+@receiver(post_save, sender=OtherEvents)
+@receiver(post_delete, sender=OtherEvents)
+@receiver(post_save, sender=Substitution)
+@receiver(post_delete, sender=Substitution)
+def bump_match_event_revisions(sender, instance, **kwargs):
+    if instance.match_id is None:
+        return
+    bump_match_revisions(Match, instance.match)
+
+
+@receiver(m2m_changed, sender=Match.team_home_start.through)
+@receiver(m2m_changed, sender=Match.team_guest_start.through)
+def bump_squad_revisions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    matches = Match.objects.filter(id__in=pk_set or ()) if reverse else [instance]
+    for match in matches:
+        bump_match_revisions(Match, match)
+
+
+@receiver(post_save, sender=PlayerTransfer)
+@receiver(post_delete, sender=PlayerTransfer)
+def bump_transfer_revisions(sender, instance, **kwargs):
+    teams = [instance.from_team_id, instance.to_team_id]
+    schedule_revisions(TEAM, teams)
+    schedule_revisions(
+        LEAGUE, League.objects.filter(teams__in=teams, championship__is_active=True).values_list('id', flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=League.teams.through)
+def bump_league_teams_revisions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        schedule_revisions(TEAM, [instance.id])
+        schedule_revisions(LEAGUE, pk_set or ())
+    else:
+        schedule_revisions(LEAGUE, [instance.id])
+        schedule_revisions(TEAM, pk_set or ())
+
+
+@receiver(post_save, sender=TeamAchievement)
+@receiver(pre_delete, sender=TeamAchievement)
+def bump_achievement_teams_revisions(sender, instance, **kwargs):
+    # Удаление ловим до удаления: связи с командами уходят вместе с медалькой без m2m_changed
+    schedule_revisions(TEAM, instance.team.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=TeamAchievement.team.through)
+def bump_achievement_revisions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        schedule_revisions(TEAM, [instance.id])
+    elif pk_set:
+        schedule_revisions(TEAM, pk_set)
+
+
+@receiver(post_save, sender=Player)
+@receiver(post_delete, sender=Player)
+def bump_player_revisions(sender, instance, **kwargs):
+    # Ник и команда игрока показываются в его статистике, статистике команд и топах бомбардиров лиг
+    schedule_revisions(PLAYER, [instance.id])
+    schedule_revisions(TEAM, [instance.team_id, instance.tracker.previous('team')])
+    goal_leagues = Goal.objects.filter(Q(author=instance) | Q(assistent=instance)).values_list(
+        'match__league', flat=True
+    )
+    clean_sheet_leagues = OtherEvents.objects.filter(author=instance, event=OtherEvents.CLEAN_SHEET).values_list(
+        'match__league', flat=True
+    )
+    schedule_revisions(LEAGUE, goal_leagues.union(clean_sheet_leagues))
@@ -1,8 +1,20 @@
-import plotly.express as px
+import pandas as pd
 
+from .cache import PLAYER, TEAM, cached_by_revision, get_revision
 from .models import OtherEvents
 from .stats import PlayerStatsSource, TeamStatsSource
 
+CHART_SECTIONS = ('matches', 'goals_assists', 'cs', 'cards')
+SECTION_TITLES = {
+    'matches': 'Матчи',
+    'goals_assists': 'Результативные действия',
+    'cs': 'Сухари',
+    'cards': 'Карточки',
+}
+
+# Меняем, когда меняется формат данных графиков, чтобы браузеры не держали старые ответы по ETag
+CHARTS_DATA_VERSION = 1
+
 
 class StatCharts:
     @staticmethod
@@ -15,1045 +27,755 @@ class StatCharts:
 
 
 class PlayerStatCharts:
+    """Данные секций графиков игрока. Сами графики строит браузер по описаниям из PLAYER_CHARTS."""
+
     def __init__(self, player):
         self.pcs = PlayerStatsSource(player)
 
     def matches(self):
-        matches_by_season = self.pcs.get_matches_by_season()
-        (
-            seasons,
-            matches,
-            wins,
-            draws,
-            losses
-        ) = column_values_list(matches_by_season, 'season_title', 'matches', 'wins', 'draws', 'losses')
-
-        matches_chart = Charts.matches_by_season(seasons, matches)
-        wdl_chart = Charts.wdl(seasons, wins, draws, losses)
-        wdl_percentage_chart = Charts.wdl_percentage(seasons, wins, draws, losses)
-
-        total_season_chart = Charts.recap_chart('Сезоны', len(set(seasons)))
-        total_matches = sum(matches)
-        total_matches_chart = Charts.recap_chart('Матчи', total_matches)
-        total_winrate = sum(wins) / max(1, total_matches) * 100
-        total_winrate_chart = Charts.recap_chart('Процент побед', total_winrate, percentage=True)
-
-        matches_by_team = self.pcs.get_matches_by_team()
-        teams, matches = column_values_list(matches_by_team, 'team', 'matches')
-        matches_by_team_chart = Charts.matches_by_team(teams, matches)
-
-        total_teams_chart = Charts.recap_chart('Команды', len(set(teams)))
-
-        matches_by_tournament = self.pcs.get_matches_by_tournament()
-        tournaments, matches = column_values_list(matches_by_tournament, 'tournament', 'matches')
-        matches_by_tournament_chart = Charts.matches_by_tournament(tournaments, matches)
+        by_season = series(
+            self.pcs.get_matches_by_season(),
+            seasons='season_title', matches='matches', wins='wins', draws='draws', losses='losses',
+        )
+        by_team = series(self.pcs.get_matches_by_team(), teams='team', matches='matches')
+        total_matches = sum(by_season['matches'])
 
         return {
-            'recap_charts': [total_season_chart, total_matches_chart, total_teams_chart, total_winrate_chart],
-            'bar_charts': [matches_chart, wdl_chart, wdl_percentage_chart],
-            'pie_charts': [matches_by_team_chart, matches_by_tournament_chart],
+            'totals': {
+                'seasons': len(set(by_season['seasons'])),
+                'matches': total_matches,
+                'teams': len(set(by_team['teams'])),
+                'winrate': sum(by_season['wins']) / max(1, total_matches) * 100,
+            },
+            'by_season': by_season,
+            'by_team': by_team,
+            'by_tournament': series(self.pcs.get_matches_by_tournament(), tournaments='tournament', matches='matches'),
         }
 
     def goals_assists(self):
-        goals_by_season = self.pcs.get_goals_by_season()
-        goals_by_team = self.pcs.get_goals_by_team()
-        goals_by_tournament = self.pcs.get_goals_by_tournament()
-
-        (
-            seasons,
-            goals,
-            assists,
-            goals_per_match,
-            assists_per_match,
-            goals_assists_per_match,
-        ) = column_values_list(
-            goals_by_season,
-            'season_title', 'goals', 'assists', 'goals_per_match', 'assists_per_match',
-            'goals_assists_per_match'
-        )
-
-        teams, goals_for_team, assists_for_team, goals_assists_for_team = column_values_list(
-            goals_by_team,
-            'team_title', 'goals', 'assists', 'goals_assists'
-        )
-
-        tournaments, goals_in_tournament, assists_in_tournament, goals_assists_in_tournament = column_values_list(
-            goals_by_tournament,
-            'tournament', 'goals', 'assists', 'goals_assists'
+        by_season = series(
+            self.pcs.get_goals_by_season(),
+            seasons='season_title', goals='goals', assists='assists', goals_per_match='goals_per_match',
+            assists_per_match='assists_per_match', goals_assists_per_match='goals_assists_per_match',
         )
 
-        total_goals_chart = Charts.recap_chart('Голы', sum(goals))
-        total_assists_chart = Charts.recap_chart('Голевые передачи', sum(assists))
-
-        goals_chart = Charts.goals_by_season(seasons, goals)
-        goals_per_match_chart = Charts.goals_per_match_by_season(seasons, goals_per_match)
-        goals_by_team_chart = Charts.goals_by_team(teams, goals_for_team)
-        goals_by_tournament_chart = Charts.goals_by_tournament(tournaments, goals_in_tournament)
-
-        assists_chart = Charts.assists_by_season(seasons, assists)
-        assists_per_match_chart = Charts.assists_per_match_by_season(seasons, assists_per_match)
-        assists_by_team_chart = Charts.assists_by_team(teams, assists_for_team)
-        assists_by_tournament_chart = Charts.assists_by_tournament(tournaments, assists_in_tournament)
-
-        goals_assists_chart = Charts.goals_assists_by_season(seasons, goals, assists)
-        goals_assists_per_match_chart = Charts.goals_assists_per_match_by_season(seasons,
-                                                                                 goals_assists_per_match)
-        goals_assists_by_team_chart = Charts.goals_assists_by_team(teams, goals_assists_for_team)
-        goals_assists_by_tournament_chart = Charts.goals_assists_by_tournament(tournaments,
-                                                                               goals_assists_in_tournament)
-
         return {
-            'recap_charts': [total_goals_chart, total_assists_chart],
-            'bar_charts': [
-                goals_chart, goals_per_match_chart,
-                assists_chart, assists_per_match_chart,
-                goals_assists_chart, goals_assists_per_match_chart,
-            ],
-            'pie_charts': [
-                goals_by_team_chart, goals_by_tournament_chart,
-                assists_by_team_chart, assists_by_tournament_chart,
-                goals_assists_by_team_chart, goals_assists_by_tournament_chart,
-            ]
+            'totals': {
+                'goals': sum(by_season['goals']),
+                'assists': sum(by_season['assists']),
+            },
+            'by_season': by_season,
+            'by_team': series(
+                self.pcs.get_goals_by_team(),
+                teams='team_title', goals='goals', assists='assists', goals_assists='goals_assists',
+            ),
+            'by_tournament': series(
+                self.pcs.get_goals_by_tournament(),
+                tournaments='tournament', goals='goals', assists='assists', goals_assists='goals_assists',
+            ),
         }
 
     def cs(self):
-        cs_by_season = self.pcs.get_cs_by_season()
-        cs_by_team = self.pcs.get_cs_by_team()
-        cs_by_tournament = self.pcs.get_cs_by_tournament()
-
-        seasons, cs, cs_per_match = column_values_list(cs_by_season, 'season_title', 'cs', 'cs_per_match')
-
-        cs_by_season_chart = Charts.cs_by_season(seasons, cs)
-        cs_per_match_by_season_chart = Charts.cs_per_match_by_season(seasons, cs_per_match)
-
-        total_cs_chart = Charts.recap_chart('Сухие таймы', sum(cs))
-
-        teams, cs = column_values_list(cs_by_team, 'team_title', 'cs')
-        cs_by_team_chart = Charts.cs_by_team(teams, cs)
-
-        tournaments, cs = column_values_list(cs_by_tournament, 'tournament', 'cs')
-        cs_by_tournament_chart = Charts.cs_by_tournament(tournaments, cs)
+        by_season = series(self.pcs.get_cs_by_season(), seasons='season_title', cs='cs', cs_per_match='cs_per_match')
 
         return {
-            'recap_charts': [total_cs_chart],
-            'bar_charts': [cs_by_season_chart, cs_per_match_by_season_chart],
-            'pie_charts': [cs_by_team_chart, cs_by_tournament_chart],
+            'totals': {
+                'cs': sum(by_season['cs']),
+            },
+            'by_season': by_season,
+            'by_team': series(self.pcs.get_cs_by_team(), teams='team_title', cs='cs'),
+            'by_tournament': series(self.pcs.get_cs_by_tournament(), tournaments='tournament', cs='cs'),
         }
 
     def cards(self):
-        cards_by_season = self.pcs.get_cards_by_season()
-        cards_by_team = self.pcs.get_cards_by_team()
-        cards_by_tournament = self.pcs.get_cards_by_tournament()
-
-        (
-            seasons,
-            yellow_cards,
-            red_cards,
-            yellow_cards_per_match,
-            red_cards_per_match
-        ) = column_values_list(
-            cards_by_season,
-            'season_title', 'yellow_cards', 'red_cards', 'yellow_cards_per_match', 'red_cards_per_match'
-        )
-
-        cards_by_season_chart = Charts.cards_by_season(seasons, yellow_cards, red_cards)
-        cards_per_match_by_season_chart = Charts.cards_per_match_by_season(
-            seasons, yellow_cards_per_match, red_cards_per_match
-        )
-
-        teams, yellow_cards, red_cards = column_values_list(
-            cards_by_team,
-            'team_title', 'yellow_cards', 'red_cards'
+        by_season = series(
+            self.pcs.get_cards_by_season(),
+            seasons='season_title', yellow_cards='yellow_cards', red_cards='red_cards',
+            yellow_cards_per_match='yellow_cards_per_match', red_cards_per_match='red_cards_per_match',
         )
-        yellow_cards_by_team_chart = Charts.yellow_cards_by_team(teams, yellow_cards)
-        red_cards_by_team_chart = Charts.red_cards_by_team(teams, red_cards)
-
-        total_yellow_cards_chart = Charts.recap_chart('Желтые карточки', sum(yellow_cards), color='yellow')
-        total_red_cards_chart = Charts.recap_chart('Красные карточки', sum(red_cards), color='red')
-
-        tournaments, yellow_cards, red_cards = column_values_list(
-            cards_by_tournament,
-            'tournament', 'yellow_cards', 'red_cards'
-        )
-        yellow_cards_by_tournament_chart = Charts.yellow_cards_by_tournament(tournaments, yellow_cards)
-        red_cards_by_tournament_chart = Charts.red_cards_by_tournament(tournaments, red_cards)
 
         return {
-            'recap_charts': [total_yellow_cards_chart, total_red_cards_chart],
-            'bar_charts': [cards_by_season_chart, cards_per_match_by_season_chart],
-            'pie_charts': [yellow_cards_by_team_chart, yellow_cards_by_tournament_chart,
-                           red_cards_by_team_chart, red_cards_by_tournament_chart],
+            'totals': {
+                'yellow_cards': sum(by_season['yellow_cards']),
+                'red_cards': sum(by_season['red_cards']),
+            },
+            'by_season': by_season,
+            'by_team': series(
+                self.pcs.get_cards_by_team(),
+                teams='team_title', yellow_cards='yellow_cards', red_cards='red_cards',
+            ),
+            'by_tournament': series(
+                self.pcs.get_cards_by_tournament(),
+                tournaments='tournament', yellow_cards='yellow_cards', red_cards='red_cards',
+            ),
         }
 
 
 class TeamStatCharts:
+    """Данные секций графиков команды. Сами графики строит браузер по описаниям из TEAM_CHARTS."""
+
     def __init__(self, team):
         self.tcs = TeamStatsSource(team)
 
     def matches(self):
-        matches_by_season = self.tcs.get_matches_by_season()
-        (
-            seasons,
-            matches,
-            wins,
-            draws,
-            losses
-        ) = column_values_list(matches_by_season, 'season_title', 'matches', 'wins', 'draws', 'losses')
-
-        matches_chart = Charts.matches_by_season(seasons, matches)
-        wdl_chart = Charts.wdl(seasons, wins, draws, losses)
-        wdl_percentage_chart = Charts.wdl_percentage(seasons, wins, draws, losses)
-
-        total_season_chart = Charts.recap_chart('Сезоны', len(set(seasons)))
-        total_matches = sum(matches)
-        total_matches_chart = Charts.recap_chart('Матчи', total_matches)
-        total_winrate = sum(wins) / max(1, total_matches) * 100
-        total_winrate_chart = Charts.recap_chart('Процент побед', total_winrate, percentage=True)
-
-        matches_in_league_by_season = self.tcs.get_matches_in_league_by_season()
-        (
-            seasons,
-            matches,
-            wins,
-            draws,
-            losses,
-            points_per_match
-        ) = column_values_list(
-            matches_in_league_by_season,
-            'season_title', 'matches', 'wins', 'draws', 'losses', 'points_per_match'
+        by_season = series(
+            self.tcs.get_matches_by_season(),
+            seasons='season_title', matches='matches', wins='wins', draws='draws', losses='losses',
         )
-        points_per_match_chart = Charts.points_per_match_by_season(seasons, points_per_match)
-
-        matches_by_tournament = self.tcs.get_matches_by_tournament()
-        tournaments, matches = column_values_list(matches_by_tournament, 'tournament', 'matches')
-        matches_by_tournament_chart = Charts.matches_by_tournament(tournaments, matches)
-
-        top_players_by_matches = self.tcs.get_top_players_by_matches()
-        players, matches_by_player = column_values_list(top_players_by_matches, 'player', 'matches')
-        top_players_by_matches_chart = Charts.top_players_by_matches(players, matches_by_player)
+        total_matches = sum(by_season['matches'])
 
         return {
-            'recap_charts': [total_season_chart, total_matches_chart, total_winrate_chart],
-            'bar_charts': [matches_chart, wdl_chart, wdl_percentage_chart,
-                           points_per_match_chart, top_players_by_matches_chart],
-            'pie_charts': [matches_by_tournament_chart],
+            'totals': {
+                'seasons': len(set(by_season['seasons'])),
+                'matches': total_matches,
+                'winrate': sum(by_season['wins']) / max(1, total_matches) * 100,
+            },
+            'by_season': by_season,
+            'league_by_season': series(
+                self.tcs.get_matches_in_league_by_season(),
+                seasons='season_title', points_per_match='points_per_match',
+            ),
+            'by_tournament': series(self.tcs.get_matches_by_tournament(), tournaments='tournament', matches='matches'),
+            'top_matches': series(self.tcs.get_top_players_by_matches(), players='player', matches='matches'),
         }
 
     def goals_assists(self):
-        goals_by_season = self.tcs.get_goals_by_season()
-        goals_by_tournament = self.tcs.get_goals_by_tournament()
-
-        (
-            seasons,
-            goals,
-            conceded_goals,
-            goals_per_match,
-            conceded_goals_per_match,
-            assists,
-            assists_per_match,
-            goals_assists_per_match,
-        ) = column_values_list(
-            goals_by_season,
-            'season_title', 'goals', 'conceded_goals',
-            'goals_per_match', 'conceded_goals_per_match',
-            'assists', 'assists_per_match', 'goals_assists_per_match'
+        by_season = series(
+            self.tcs.get_goals_by_season(),
+            seasons='season_title', goals='goals', conceded_goals='conceded_goals',
+            goals_per_match='goals_per_match', conceded_goals_per_match='conceded_goals_per_match',
+            assists='assists', assists_per_match='assists_per_match',
         )
 
-        tournaments, goals_in_tournament, assists_in_tournament, goals_assists_in_tournament = column_values_list(
-            goals_by_tournament,
-            'tournament', 'goals', 'assists', 'goals_assists'
-        )
-
-        total_goals_chart = Charts.recap_chart('Голы', sum(goals))
-        total_assists_chart = Charts.recap_chart('Голевые передачи', sum(assists))
-
-        goals_chart = Charts.goals_by_season(seasons, goals, conceded_goals)
-        goals_per_match_chart = Charts.goals_per_match_by_season(seasons, goals_per_match, conceded_goals_per_match)
-        goals_by_tournament_chart = Charts.goals_by_tournament(tournaments, goals_in_tournament)
-
-        goals_by_player = self.tcs.get_top_players_by_goals()
-        players, goals = column_values_list(goals_by_player, 'player', 'goals')
-        top_players_by_goals_chart = Charts.top_players_by_goals(players, goals)
-
-        goals_per_match_by_player = self.tcs.get_top_players_by_goals_per_match()
-        players, goals_per_match = column_values_list(goals_per_match_by_player, 'player', 'goals_per_match')
-        top_players_by_goals_per_match_chart = Charts.top_players_by_goals_per_match(players, goals_per_match)
-
-        assists_chart = Charts.assists_by_season(seasons, assists)
-        assists_per_match_chart = Charts.assists_per_match_by_season(seasons, assists_per_match)
-        assists_by_tournament_chart = Charts.assists_by_tournament(tournaments, assists_in_tournament)
-
-        assists_by_player = self.tcs.get_top_players_by_assists()
-        players, assists = column_values_list(assists_by_player, 'player', 'assists')
-        top_players_by_assists_chart = Charts.top_players_by_assists(players, assists)
-
-        assists_per_match_by_player = self.tcs.get_top_players_by_assists_per_match()
-        players, assists_per_match = column_values_list(assists_per_match_by_player, 'player', 'assists_per_match')
-        top_players_by_assists_per_match_chart = Charts.top_players_by_assists_per_match(players, assists_per_match)
-
         return {
-            'recap_charts': [total_goals_chart, total_assists_chart],
-            'bar_charts': [
-                goals_chart, goals_per_match_chart,
-                assists_chart, assists_per_match_chart,
-                top_players_by_goals_chart, top_players_by_goals_per_match_chart,
-                top_players_by_assists_chart, top_players_by_assists_per_match_chart,
-            ],
-            'pie_charts': [
-                goals_by_tournament_chart,
-                assists_by_tournament_chart,
-            ]
+            'totals': {
+                'goals': sum(by_season['goals']),
+                'assists': sum(by_season['assists']),
+            },
+            'by_season': by_season,
+            'by_tournament': series(
+                self.tcs.get_goals_by_tournament(),
+                tournaments='tournament', goals='goals', assists='assists',
+            ),
+            'top_goals': series(self.tcs.get_top_players_by_goals(), players='player', goals='goals'),
+            'top_goals_per_match': series(
+                self.tcs.get_top_players_by_goals_per_match(),
+                players='player', goals_per_match='goals_per_match',
+            ),
+            'top_assists': series(self.tcs.get_top_players_by_assists(), players='player', assists='assists'),
+            'top_assists_per_match': series(
+                self.tcs.get_top_players_by_assists_per_match(),
+                players='player', assists_per_match='assists_per_match',
+            ),
         }
 
     def cs(self):
-        cs_by_season = self.tcs.get_cs_by_season()
-        cs_by_tournament = self.tcs.get_cs_by_tournament()
-
-        seasons, cs, cs_per_match = column_values_list(cs_by_season, 'season_title', 'cs', 'cs_per_match')
-
-        cs_by_season_chart = Charts.cs_by_season(seasons, cs)
-        cs_per_match_by_season_chart = Charts.cs_per_match_by_season(seasons, cs_per_match)
-
-        total_cs_chart = Charts.recap_chart('Сухие таймы', sum(cs))
-
-        tournaments, cs = column_values_list(cs_by_tournament, 'tournament', 'cs')
-        cs_by_tournament_chart = Charts.cs_by_tournament(tournaments, cs)
-
-        cs_by_player = self.tcs.get_top_players_by_cs()
-        players, cs = column_values_list(cs_by_player, 'player', 'cs')
-        top_players_by_cs_chart = Charts.top_players_by_cs(players, cs)
-
-        cs_per_match_by_player = self.tcs.get_top_players_by_cs_per_match()
-        players, cs_per_match = column_values_list(cs_per_match_by_player, 'player', 'cs_per_match')
-        top_players_by_cs_per_match_chart = Charts.top_players_by_cs_per_match(players, cs_per_match)
+        by_season = series(self.tcs.get_cs_by_season(), seasons='season_title', cs='cs', cs_per_match='cs_per_match')
 
         return {
-            'recap_charts': [total_cs_chart],
-            'bar_charts': [cs_by_season_chart, cs_per_match_by_season_chart,
-                           top_players_by_cs_chart, top_players_by_cs_per_match_chart],
-            'pie_charts': [cs_by_tournament_chart],
+            'totals': {
+                'cs': sum(by_season['cs']),
+            },
+            'by_season': by_season,
+            'by_tournament': series(self.tcs.get_cs_by_tournament(), tournaments='tournament', cs='cs'),
+            'top_cs': series(self.tcs.get_top_players_by_cs(), players='player', cs='cs'),
+            'top_cs_per_match': series(
+                self.tcs.get_top_players_by_cs_per_match(),
+                players='player', cs_per_match='cs_per_match',
+            ),
         }
 
     def cards(self):
-        cards_by_season = self.tcs.get_cards_by_season()
-        cards_by_tournament = self.tcs.get_cards_by_tournament()
-
-        (
-            seasons,
-            yellow_cards,
-            red_cards,
-            yellow_cards_per_match,
-            red_cards_per_match
-        ) = column_values_list(
-            cards_by_season,
-            'season_title', 'yellow_cards', 'red_cards', 'yellow_cards_per_match', 'red_cards_per_match'
-        )
-
-        cards_by_season_chart = Charts.cards_by_season(seasons, yellow_cards, red_cards)
-        cards_per_match_by_season_chart = Charts.cards_per_match_by_season(
-            seasons, yellow_cards_per_match, red_cards_per_match
-        )
-
-        total_yellow_cards_chart = Charts.recap_chart('Желтые карточки', sum(yellow_cards), color='yellow')
-        total_red_cards_chart = Charts.recap_chart('Красные карточки', sum(red_cards), color='red')
-
-        tournaments, yellow_cards, red_cards = column_values_list(
-            cards_by_tournament,
-            'tournament', 'yellow_cards', 'red_cards'
+        by_season = series(
+            self.tcs.get_cards_by_season(),
+            seasons='season_title', yellow_cards='yellow_cards', red_cards='red_cards',
+            yellow_cards_per_match='yellow_cards_per_match', red_cards_per_match='red_cards_per_match',
         )
-        yellow_cards_by_tournament_chart = Charts.yellow_cards_by_tournament(tournaments, yellow_cards)
-        red_cards_by_tournament_chart = Charts.red_cards_by_tournament(tournaments, red_cards)
-
-        yellow_cards_by_player = self.tcs.get_top_players_by_cards(OtherEvents.YELLOW_CARD)
-        players, yellow_cards = column_values_list(yellow_cards_by_player, 'player', 'cards')
-        top_players_by_yellow_cards_chart = Charts.top_players_by_yellow_cards(players, yellow_cards)
-
-        red_cards_by_player = self.tcs.get_top_players_by_cards(OtherEvents.RED_CARD)
-        players, red_cards = column_values_list(red_cards_by_player, 'player', 'cards')
-        top_players_by_red_cards_chart = Charts.top_players_by_red_cards(players, red_cards)
 
         return {
-            'recap_charts': [total_yellow_cards_chart, total_red_cards_chart],
-            'bar_charts': [cards_by_season_chart, cards_per_match_by_season_chart,
-                           top_players_by_yellow_cards_chart, top_players_by_red_cards_chart],
-            'pie_charts': [yellow_cards_by_tournament_chart, red_cards_by_tournament_chart],
+            'totals': {
+                'yellow_cards': sum(by_season['yellow_cards']),
+                'red_cards': sum(by_season['red_cards']),
+            },
+            'by_season': by_season,
+            'by_tournament': series(
+                self.tcs.get_cards_by_tournament(),
+                tournaments='tournament', yellow_cards='yellow_cards', red_cards='red_cards',
+            ),
+            'top_yellow_cards': series(
+                self.tcs.get_top_players_by_cards(OtherEvents.YELLOW_CARD),
+                players='player', cards='cards',
+            ),
+            'top_red_cards': series(
+                self.tcs.get_top_players_by_cards(OtherEvents.RED_CARD),
+                players='player', cards='cards',
+            ),
         }
 
 
 class Charts:
+    """
+    Описания графиков для static/scripts/StatCharts.js. Описание ссылается на ряды данных секции
+    (source - ключ ряда, x/y/names/values - ключи колонок), а layout и traces - это атрибуты plotly.js,
+    которые накладываются поверх построенной фигуры.
+    """
+
     #region Common
     @staticmethod
-    def histogram(data=None, x=None, y=None, values_names=None, orientation='v',
-                  title=None, labels=None, color_discrete_map=None):
-        fig = px.histogram(
-            data,
-            x=x,
-            y=y,
-            orientation=orientation,
-            title=title,
-            text_auto=True,
-            labels=labels,
-            color_discrete_map=color_discrete_map,
-        )
-        fig.update_traces(textfont_size=12, textangle=0, textposition='outside', cliponaxis=False)
-        if values_names:
-            for idx, name in enumerate(values_names):
-                fig.data[idx].name = name
-
-        return fig
+    def bar(source, x, y, title, labels, names=None, colors=None, orientation='v', chart_type='bar',
+            value_format=None, top_n=None, stack_totals=False, layout=None, traces=None):
+        spec = {
+            'type': chart_type,
+            'source': source,
+            'x': x,
+            'y': y,
+            'title': title,
+            'labels': labels,
+            'orientation': orientation,
+            'layout': layout or {},
+            'traces': traces or {},
+        }
+        optional = {
+            'names': names,
+            'colors': colors,
+            'value_format': value_format,
+            'top_n': top_n,
+            'stack_totals': stack_totals,
+        }
+        spec.update((key, value) for key, value in optional.items() if value)
+        return spec
 
     @staticmethod
-    def bar(data=None, x=None, y=None, values_names=None, orientation='v', title=None, labels=None,
-            color=None, color_discrete_map=None, color_discrete_sequence=None):
-        fig = px.bar(
-            data,
-            x=x,
-            y=y,
-            orientation=orientation,
-            title=title,
-            text_auto=True,
-            labels=labels,
-            color=color,
-            color_discrete_map=color_discrete_map,
-            color_discrete_sequence=color_discrete_sequence,
-        )
-        fig.update_layout(yaxis_rangemode='nonnegative')
-        fig.update_traces(textfont_size=12, textangle=0, textposition='outside', cliponaxis=False)
-        if values_names:
-            for idx, name in enumerate(values_names):
-                fig.data[idx].name = name
-
-        return fig
+    def histogram(source, x, y, title, labels, **kwargs):
+        # Значения с одинаковой категорией суммируются, как в px.histogram
+        return Charts.bar(source, x, y, title, labels, chart_type='histogram', **kwargs)
 
     @staticmethod
-    def pie(data=None, names=None, values=None, title=None, labels=None):
-        fig = px.pie(
-            data,
-            names=names,
-            values=values,
-            title=title,
-            labels=labels,
-        )
-        fig.update_traces(texttemplate='%{percent} (%{value})')
-        if is_empty_data(values):
-            Charts.add_no_data_annotation(fig)
-
-        return fig
+    def pie(source, names, values, title, labels, layout=None):
+        return {
+            'type': 'pie',
+            'source': source,
+            'names': names,
+            'values': values,
+            'title': title,
+            'labels': labels,
+            'layout': layout or {},
+        }
 
     @staticmethod
     def recap_chart(title, value, percentage=False, color=None):
-        color_discrete_sequence = None
-        if color:
-            color_discrete_sequence = [color]
-
-        fig = px.pie(
-            names=['name'],
-            values=[1],
-            title=title,
-            color_discrete_sequence=color_discrete_sequence,
-        )
-        fig.update_layout(height=250, margin_t=50, margin_b=20, hovermode=False, showlegend=False)
-        annotation_text = f'{value:.1f}%' if percentage else str(value)
-        fig.update_layout(
-            annotations=[
-                dict(text=annotation_text, x=0.5, y=0.5, xanchor='center', font_size=25, showarrow=False)
-            ])
-        fig.update_traces(textinfo='none', hole=0.95)
-
-        return Charts.render_to_html(fig)
+        return {
+            'type': 'recap',
+            'title': title,
+            'value': value,
+            'percentage': percentage,
+            'color': color,
+        }
     #endregion
 
     #region Matches
     @staticmethod
-    def matches_by_season(seasons, matches):
-        fig = Charts.histogram(
-            x=seasons,
-            y=matches,
+    def matches_by_season():
+        return Charts.histogram(
+            'by_season', 'seasons', ['matches'],
             title='Количество матчей за сезон',
-            labels={'x': 'Сезон', 'y': 'Матчи'},
+            labels={'category': 'Сезон', 'value': 'Матчи'},
         )
-        fig.update_layout(yaxis_title='Матчи')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def matches_by_team(teams, matches):
-        fig = Charts.pie(
-            names=teams,
-            values=matches,
+    def matches_by_team():
+        return Charts.pie(
+            'by_team', 'teams', 'matches',
             title='Распределение матчей по командам',
             labels={'values': 'Матчи', 'names': 'Команда'},
+            layout={'legend': {'orientation': 'h'}},
         )
-        fig.update_layout(legend={'orientation': 'h'})
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def matches_by_tournament(tournaments, matches):
-        fig = Charts.pie(
-            names=tournaments,
-            values=matches,
+    def matches_by_tournament():
+        return Charts.pie(
+            'by_tournament', 'tournaments', 'matches',
             title='Распределение матчей по турнирам',
             labels={'values': 'Матчи', 'names': 'Турнир'},
+            layout={'legend': {'orientation': 'h'}},
         )
-        fig.update_layout(legend={'orientation': 'h'})
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def wdl(seasons, wins, draws, losses):
-        fig = Charts.histogram(
-            data={
-                'seasons': seasons,
-                'wins': wins,
-                'draws': draws,
-                'losses': losses,
-            },
-            y='seasons',
-            x=['wins', 'draws', 'losses'],
-            values_names=['Победы', 'Ничьи', 'Поражения'],
+    def wdl():
+        return Charts.histogram(
+            'by_season', 'seasons', ['wins', 'draws', 'losses'],
+            names=['Победы', 'Ничьи', 'Поражения'],
+            colors=['green', 'gray', 'red'],
             orientation='h',
             title='Результаты во всех турнирах',
-            labels={'seasons': 'Сезон', 'value': 'Количество матчей', 'variable': 'Тип', },
-            color_discrete_map={'wins': 'green', 'draws': 'gray', 'losses': 'red'}
+            labels={'category': 'Сезон', 'value': 'Количество матчей', 'variable': 'Тип'},
+            layout={'barmode': 'relative', 'yaxis': {'autorange': 'reversed'}},
+            traces={'textfont': {'color': 'white'}, 'textposition': 'inside', 'insidetextanchor': 'middle'},
         )
-        fig.update_layout(legend={'title': ''})
-        fig.update_layout(xaxis_title='Количество матчей', yaxis_autorange='reversed')
-        fig.update_traces(textfont_color='white', textposition='inside', insidetextanchor='middle')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def wdl_percentage(seasons, wins, draws, losses):
-        fig = Charts.histogram(
-            data={
-                'seasons': seasons,
-                'wins': wins,
-                'draws': draws,
-                'losses': losses,
-            },
-            y='seasons',
-            x=['wins', 'draws', 'losses'],
-            values_names=['Победы', 'Ничьи', 'Поражения'],
+    def wdl_percentage():
+        return Charts.histogram(
+            'by_season', 'seasons', ['wins', 'draws', 'losses'],
+            names=['Победы', 'Ничьи', 'Поражения'],
+            colors=['green', 'gray', 'red'],
             orientation='h',
             title='Результаты во всех турнирах',
-            labels={'seasons': 'Сезон', 'value': 'Доля матчей', 'variable': 'Тип', },
-            color_discrete_map={'wins': 'green', 'draws': 'gray', 'losses': 'red'}
+            labels={'category': 'Сезон', 'value': 'Доля матчей', 'variable': 'Тип'},
+            layout={
+                'barmode': 'relative',
+                'barnorm': 'fraction',
+                'xaxis': {'tickformat': '.0%', 'dtick': 0.25},
+                'yaxis': {'autorange': 'reversed'},
+            },
+            traces={'textfont': {'color': 'white'}, 'textposition': 'inside', 'insidetextanchor': 'middle'},
         )
-        fig.update_layout(xaxis_title='Доля матчей', legend={'title': ''})
-        fig.update_layout(barnorm='fraction', xaxis_tickformat='.0%', xaxis_dtick='0.25', yaxis_autorange='reversed')
-        fig.update_traces(textfont_size=12, textfont_color='white', textposition='inside', insidetextanchor='middle')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def points_per_match_by_season(seasons, point_per_match):
-        fig = Charts.histogram(
-            x=seasons,
-            y=point_per_match,
+    def points_per_match_by_season():
+        return Charts.histogram(
+            'league_by_season', 'seasons', ['points_per_match'],
             title='Среднее количество очков за сезон (в лиге)',
-            labels={'x': 'Сезон', 'y': 'Очки'},
+            labels={'category': 'Сезон', 'value': 'Очки'},
+            value_format='.2f',
         )
-        fig.update_layout(yaxis_title='Очки')
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def top_players_by_matches(players, matches, nmin=10):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=matches,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству матчей',
-            labels={'x': 'Игрок', 'y': 'Матчи'},
+    def top_players_by_matches(nmin=10):
+        return Charts.bar(
+            'top_matches', 'players', ['matches'],
+            title='Топ-{n} игроков по количеству матчей',
+            labels={'category': 'Игрок', 'value': 'Матчи'},
+            top_n=nmin,
         )
-
-        return Charts.render_to_html(fig)
     #endregion
 
     #region Goal/Assists
     @staticmethod
-    def goals_by_season(seasons, goals, conceded_goals=None):
-        if conceded_goals is not None:
-            y=[goals, conceded_goals]
-            values_names = ['Забитые', 'Пропущенные']
-            color_discrete_sequence = ['orangered', 'orange']
-            labels = {'x': 'Сезон', 'value': 'Голы', 'variable': 'Тип'}
-        else:
-            y=goals
-            values_names = None
-            color_discrete_sequence = ['orangered']
-            labels = {'x': 'Сезон', 'y': 'Голы'}
-
-        fig = Charts.bar(
-            x=seasons,
-            y=y,
-            values_names=values_names,
+    def goals_by_season(with_conceded=False):
+        if with_conceded:
+            return Charts.bar(
+                'by_season', 'seasons', ['goals', 'conceded_goals'],
+                names=['Забитые', 'Пропущенные'],
+                colors=['orangered', 'orange'],
+                title='Количество голов за сезон',
+                labels={'category': 'Сезон', 'value': 'Голы', 'variable': 'Тип'},
+                layout={'legend': {'title': {'text': 'Голы'}}, 'barmode': 'group'},
+            )
+        return Charts.bar(
+            'by_season', 'seasons', ['goals'],
+            colors=['orangered'],
             title='Количество голов за сезон',
-            labels=labels,
-            color_discrete_sequence=color_discrete_sequence,
-        )
-        if conceded_goals is not None:
-            fig.update_layout(legend={'title': 'Голы'}, barmode='group')
-            fig.update_traces(hovertemplate='Сезон=%{x}<br>Голы=%{y}')
-
-        return Charts.render_to_html(fig)
-
-    @staticmethod
-    def goals_per_match_by_season(seasons, goals, conceded_goals=None):
-        if conceded_goals is not None:
-            y=[goals, conceded_goals]
-            values_names = ['Забитые', 'Пропущенные']
-            color_discrete_sequence = ['orangered', 'orange']
-            labels = {'x': 'Сезон', 'value': 'Голы', 'variable': 'Тип'}
-        else:
-            y=goals
-            values_names = None
-            color_discrete_sequence = ['orangered']
-            labels = {'x': 'Сезон', 'y': 'Голы'}
-        fig = Charts.bar(
-            x=seasons,
-            y=y,
-            values_names=values_names,
+            labels={'category': 'Сезон', 'value': 'Голы'},
+        )
+
+    @staticmethod
+    def goals_per_match_by_season(with_conceded=False):
+        if with_conceded:
+            return Charts.bar(
+                'by_season', 'seasons', ['goals_per_match', 'conceded_goals_per_match'],
+                names=['Забитые', 'Пропущенные'],
+                colors=['orangered', 'orange'],
+                title='Среднее количество голов за матч',
+                labels={'category': 'Сезон', 'value': 'Голы', 'variable': 'Тип'},
+                value_format='.2f',
+                layout={'legend': {'title': {'text': 'Голы'}}, 'barmode': 'group'},
+            )
+        return Charts.bar(
+            'by_season', 'seasons', ['goals_per_match'],
+            colors=['orangered'],
             title='Среднее количество голов за матч',
-            labels=labels,
-            color_discrete_sequence=color_discrete_sequence,
+            labels={'category': 'Сезон', 'value': 'Голы'},
+            value_format='.2f',
         )
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-        if conceded_goals is not None:
-            fig.update_layout(legend={'title': 'Голы'}, barmode='group')
-            fig.update_traces(hovertemplate='Сезон=%{x}<br>Голы=%{y}')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def goals_by_team(teams, goals):
-        fig = Charts.pie(
-            names=teams,
-            values=goals,
+    def goals_by_team():
+        return Charts.pie(
+            'by_team', 'teams', 'goals',
             title='Распределение голов по командам',
             labels={'values': 'Голы', 'names': 'Команда'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def goals_by_tournament(tournaments, goals):
-        fig = Charts.pie(
-            names=tournaments,
-            values=goals,
+    def goals_by_tournament():
+        return Charts.pie(
+            'by_tournament', 'tournaments', 'goals',
             title='Распределение голов по турнирам',
             labels={'values': 'Голы', 'names': 'Турнир'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_goals(players, goals, nmin=10):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=goals,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству голов',
-            labels={'x': 'Игрок', 'y': 'Голы'},
-            color_discrete_sequence=['orangered'],
+    def top_players_by_goals(nmin=10):
+        return Charts.bar(
+            'top_goals', 'players', ['goals'],
+            title='Топ-{n} игроков по количеству голов',
+            labels={'category': 'Игрок', 'value': 'Голы'},
+            colors=['orangered'],
+            top_n=nmin,
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_goals_per_match(players, goals, nmin=10):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=goals,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству голов за матч (10+ матчей)',
-            labels={'x': 'Игрок', 'y': 'Голы'},
-            color_discrete_sequence=['orangered'],
+    def top_players_by_goals_per_match(nmin=10):
+        return Charts.bar(
+            'top_goals_per_match', 'players', ['goals_per_match'],
+            title='Топ-{n} игроков по количеству голов за матч (10+ матчей)',
+            labels={'category': 'Игрок', 'value': 'Голы'},
+            colors=['orangered'],
+            value_format='.2f',
+            top_n=nmin,
         )
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def assists_by_season(seasons, assists):
-        fig = Charts.bar(
-            x=seasons,
-            y=assists,
+    def assists_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['assists'],
             title='Количество голевых передач за сезон',
-            labels={'x': 'Сезон', 'y': 'Передачи'},
-            color_discrete_sequence=['deepskyblue'],
+            labels={'category': 'Сезон', 'value': 'Передачи'},
+            colors=['deepskyblue'],
         )
-        fig.update_traces(textfont_size=12, textangle=0, textposition='outside', cliponaxis=False)
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def assists_per_match_by_season(seasons, assists_per_match):
-        fig = Charts.bar(
-            x=seasons,
-            y=assists_per_match,
+    def assists_per_match_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['assists_per_match'],
             title='Среднее количество голевых передач за матч',
-            labels={'x': 'Сезон', 'y': 'Передачи'},
-            color_discrete_sequence=['deepskyblue'],
+            labels={'category': 'Сезон', 'value': 'Передачи'},
+            colors=['deepskyblue'],
+            value_format='.2f',
         )
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def assists_by_team(teams, assists):
-        fig = Charts.pie(
-            names=teams,
-            values=assists,
+    def assists_by_team():
+        return Charts.pie(
+            'by_team', 'teams', 'assists',
             title='Распределение голевых передач по командам',
             labels={'values': 'Передачи', 'names': 'Команда'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def assists_by_tournament(tournaments, assists):
-        fig = Charts.pie(
-            names=tournaments,
-            values=assists,
+    def assists_by_tournament():
+        return Charts.pie(
+            'by_tournament', 'tournaments', 'assists',
             title='Распределение голевых передач по турнирам',
             labels={'values': 'Передачи', 'names': 'Турнир'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_assists(players, assists, nmin=10):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=assists,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству голевых передач',
-            labels={'x': 'Игрок', 'y': 'Передачи'},
-            color_discrete_sequence=['deepskyblue'],
+    def top_players_by_assists(nmin=10):
+        return Charts.bar(
+            'top_assists', 'players', ['assists'],
+            title='Топ-{n} игроков по количеству голевых передач',
+            labels={'category': 'Игрок', 'value': 'Передачи'},
+            colors=['deepskyblue'],
+            top_n=nmin,
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_assists_per_match(players, assists, nmin=10):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=assists,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству голевых передач за матч (10+ матчей)',
-            labels={'x': 'Игрок', 'y': 'Передачи'},
-            color_discrete_sequence=['deepskyblue'],
+    def top_players_by_assists_per_match(nmin=10):
+        return Charts.bar(
+            'top_assists_per_match', 'players', ['assists_per_match'],
+            title='Топ-{n} игроков по количеству голевых передач за матч (10+ матчей)',
+            labels={'category': 'Игрок', 'value': 'Передачи'},
+            colors=['deepskyblue'],
+            value_format='.2f',
+            top_n=nmin,
         )
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def goals_assists_by_season(seasons, goals, assists):
-        fig = Charts.bar(
-            data={
-                'seasons': seasons,
-                'goals': goals,
-                'assists': assists,
-            },
-            x='seasons',
-            y=['goals', 'assists'],
-            values_names=['Голы', 'Передачи'],
+    def goals_assists_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['goals', 'assists'],
+            names=['Голы', 'Передачи'],
+            colors=['orangered', 'deepskyblue'],
             title='Количество результативных действий за сезон',
-            labels={'seasons': 'Сезон', 'value': 'Результативные действия', 'variable': 'Тип'},
-            color_discrete_map={'goals': 'orangered', 'assists': 'deepskyblue'},
-        )
-        fig.update_layout(
-            legend={'title': '', 'traceorder': 'reversed', 'itemclick': False, 'itemdoubleclick': False}
-        )
-        fig.update_layout(
-            annotations=[
-                dict(
-                    x=xi,
-                    y=yi1 + yi2,
-                    text=str(yi1 + yi2) if yi1 + yi2 > max(yi1, yi2) else '',
-                    xanchor='auto',
-                    yanchor='bottom',
-                    showarrow=False,
-                ) for xi, yi1, yi2 in zip(seasons, goals, assists)
-            ]
+            labels={'category': 'Сезон', 'value': 'Количество', 'variable': 'Тип'},
+            stack_totals=True,
+            layout={
+                'barmode': 'relative',
+                'yaxis': {'title': {'text': 'Результативные действия'}},
+                'legend': {'title': {'text': ''}, 'traceorder': 'reversed', 'itemclick': False,
+                           'itemdoubleclick': False},
+            },
+            traces={'textposition': 'inside', 'insidetextanchor': 'middle'},
         )
-        fig.update_traces(textfont_size=12, textangle=0, textposition='inside', insidetextanchor='middle')
-        fig.update_traces(hovertemplate='Сезон=%{x}<br>Количество=%{y}')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def goals_assists_per_match_by_season(seasons, goals_assists_per_match):
-        fig = Charts.bar(
-            x=seasons,
-            y=goals_assists_per_match,
+    def goals_assists_per_match_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['goals_assists_per_match'],
             title='Среднее количество результативных действий за матч',
-            labels={'x': 'Сезон', 'y': 'Результативные действия'}
+            labels={'category': 'Сезон', 'value': 'Результативные действия'},
+            value_format='.2f',
         )
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def goals_assists_by_team(teams, goals_assists):
-        fig = Charts.pie(
-            names=teams,
-            values=goals_assists,
+    def goals_assists_by_team():
+        return Charts.pie(
+            'by_team', 'teams', 'goals_assists',
             title='Распределение результативных действий по командам',
             labels={'values': 'Результативные действия', 'names': 'Команда'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def goals_assists_by_tournament(tournaments, goals_assists):
-        fig = Charts.pie(
-            names=tournaments,
-            values=goals_assists,
+    def goals_assists_by_tournament():
+        return Charts.pie(
+            'by_tournament', 'tournaments', 'goals_assists',
             title='Распределение результативных действий по турнирам',
             labels={'values': 'Результативные действия', 'names': 'Турнир'},
         )
-
-        return Charts.render_to_html(fig)
     #endregion
 
     #region CS
     @staticmethod
-    def cs_by_season(seasons, cs):
-        fig = Charts.bar(
-            x=seasons,
-            y=cs,
+    def cs_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['cs'],
             title='Количество сухих таймов за сезон',
-            labels={'x': 'Сезон', 'y': 'Голы'},
+            labels={'category': 'Сезон', 'value': 'Сухие таймы'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def cs_per_match_by_season(seasons, cs):
-        fig = Charts.bar(
-            x=seasons,
-            y=cs,
+    def cs_per_match_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['cs_per_match'],
             title='Среднее количество сухих таймов за матч',
-            labels={'x': 'Сезон', 'y': 'Сухие таймы'}
+            labels={'category': 'Сезон', 'value': 'Сухие таймы'},
+            value_format='.2f',
         )
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def cs_by_team(teams, cs):
-        fig = Charts.pie(
-            names=teams,
-            values=cs,
+    def cs_by_team():
+        return Charts.pie(
+            'by_team', 'teams', 'cs',
             title='Распределение сухих таймов по командам',
             labels={'values': 'Сухие таймы', 'names': 'Команда'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def cs_by_tournament(tournaments, cs):
-        fig = Charts.pie(
-            names=tournaments,
-            values=cs,
+    def cs_by_tournament():
+        return Charts.pie(
+            'by_tournament', 'tournaments', 'cs',
             title='Распределение сухих таймов по турнирам',
             labels={'values': 'Сухие таймы', 'names': 'Турнир'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_cs(players, cs, nmin=5):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=cs,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству сухих таймов',
-            labels={'x': 'Игрок', 'y': 'Сухие таймы'},
+    def top_players_by_cs(nmin=5):
+        return Charts.bar(
+            'top_cs', 'players', ['cs'],
+            title='Топ-{n} игроков по количеству сухих таймов',
+            labels={'category': 'Игрок', 'value': 'Сухие таймы'},
+            top_n=nmin,
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_cs_per_match(players, cs, nmin=5):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=cs,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству сухих таймов за матч (10+ матчей)',
-            labels={'x': 'Игрок', 'y': 'Сухие таймы'},
+    def top_players_by_cs_per_match(nmin=5):
+        return Charts.bar(
+            'top_cs_per_match', 'players', ['cs_per_match'],
+            title='Топ-{n} игроков по количеству сухих таймов за матч (10+ матчей)',
+            labels={'category': 'Игрок', 'value': 'Сухие таймы'},
+            value_format='.2f',
+            top_n=nmin,
         )
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
     #endregion
 
     #region Cards
     @staticmethod
-    def cards_by_season(seasons, yellow_cards, red_cards):
-        fig = Charts.bar(
-            data={
-                'seasons': seasons,
-                'yellow': yellow_cards,
-                'red': red_cards,
-            },
-            x='seasons',
-            y=['yellow', 'red'],
-            values_names=['ЖК', 'КК'],
+    def cards_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['yellow_cards', 'red_cards'],
+            names=['ЖК', 'КК'],
+            colors=['yellow', 'red'],
             title='Количество карточек за сезон',
-            labels={'seasons': 'Сезон', 'value': 'Карточки', 'variable': 'Тип'},
-            color_discrete_map={'yellow': 'yellow', 'red': 'red'},
+            labels={'category': 'Сезон', 'value': 'Карточки', 'variable': 'Тип'},
+            layout={'legend': {'title': {'text': ''}}, 'barmode': 'group'},
         )
-        fig.update_layout(legend={'title': ''}, barmode='group')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def cards_per_match_by_season(seasons, yellow_cards_per_match, red_cards_per_match):
-        fig = Charts.bar(
-            data={
-                'seasons': seasons,
-                'yellow': yellow_cards_per_match,
-                'red': red_cards_per_match,
-            },
-            x='seasons',
-            y=['yellow', 'red'],
-            values_names=['ЖК', 'КК'],
+    def cards_per_match_by_season():
+        return Charts.bar(
+            'by_season', 'seasons', ['yellow_cards_per_match', 'red_cards_per_match'],
+            names=['ЖК', 'КК'],
+            colors=['yellow', 'red'],
             title='Среднее количество карточек за матч',
-            labels={'seasons': 'Сезон', 'value': 'Карточки', 'variable': 'Тип'},
-            color_discrete_map={'yellow': 'yellow', 'red': 'red'},
+            labels={'category': 'Сезон', 'value': 'Карточки', 'variable': 'Тип'},
+            value_format='.2f',
+            layout={'legend': {'title': {'text': ''}}, 'barmode': 'group'},
         )
-        fig.update_layout(legend={'title': ''}, barmode='group')
-        fig.update_traces(texttemplate='%{y:.2f}', yhoverformat='.2f')
-
-        return Charts.render_to_html(fig)
 
     @staticmethod
-    def yellow_cards_by_team(teams, yellow_cards):
-        fig = Charts.pie(
-            names=teams,
-            values=yellow_cards,
+    def yellow_cards_by_team():
+        return Charts.pie(
+            'by_team', 'teams', 'yellow_cards',
             title='Распределение желтых карточек по командам',
             labels={'values': 'Карточки', 'names': 'Команда'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def yellow_cards_by_tournament(tournaments, yellow_cards):
-        fig = Charts.pie(
-            names=tournaments,
-            values=yellow_cards,
+    def yellow_cards_by_tournament():
+        return Charts.pie(
+            'by_tournament', 'tournaments', 'yellow_cards',
             title='Распределение желтых карточек по турнирам',
             labels={'values': 'Карточки', 'names': 'Турнир'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_yellow_cards(players, cards, nmin=5):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=cards,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству желтых карточек',
-            labels={'x': 'Игрок', 'y': 'Карточки'},
-            color_discrete_sequence=['yellow'],
+    def top_players_by_yellow_cards(nmin=5):
+        return Charts.bar(
+            'top_yellow_cards', 'players', ['cards'],
+            title='Топ-{n} игроков по количеству желтых карточек',
+            labels={'category': 'Игрок', 'value': 'Карточки'},
+            colors=['yellow'],
+            top_n=nmin,
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def red_cards_by_team(teams, red_cards):
-        fig = Charts.pie(
-            names=teams,
-            values=red_cards,
+    def red_cards_by_team():
+        return Charts.pie(
+            'by_team', 'teams', 'red_cards',
             title='Распределение красных карточек по командам',
             labels={'values': 'Карточки', 'names': 'Команда'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def red_cards_by_tournament(tournaments, red_cards):
-        fig = Charts.pie(
-            names=tournaments,
-            values=red_cards,
+    def red_cards_by_tournament():
+        return Charts.pie(
+            'by_tournament', 'tournaments', 'red_cards',
             title='Распределение красных карточек по турнирам',
             labels={'values': 'Карточки', 'names': 'Турнир'},
         )
 
-        return Charts.render_to_html(fig)
-
     @staticmethod
-    def top_players_by_red_cards(players, cards, nmin=5):
-        if not players:
-            return None
-
-        fig = Charts.bar(
-            x=players,
-            y=cards,
-            title=f'Топ-{max(nmin, len(players))} игроков по количеству красных карточек',
-            labels={'x': 'Игрок', 'y': 'Карточки'},
-            color_discrete_sequence=['red'],
+    def top_players_by_red_cards(nmin=5):
+        return Charts.bar(
+            'top_red_cards', 'players', ['cards'],
+            title='Топ-{n} игроков по количеству красных карточек',
+            labels={'category': 'Игрок', 'value': 'Карточки'},
+            colors=['red'],
+            top_n=nmin,
         )
-
-        return Charts.render_to_html(fig)
     #endregion
 
-    @staticmethod
-    def add_no_data_annotation(fig, message='Нет данных', font_size=24):
-        fig.update_layout(
-            annotations=[
-                dict(
-                    x=0.5,
-                    y=0.5,
-                    xanchor='center',
-                    yanchor='middle',
-                    text=message,
-                    font_size=font_size,
-                    showarrow=False,
-                )
-            ]
-        )
-
-    @staticmethod
-    def render_to_html(fig, modebar_remove=None):
-        if modebar_remove is None:
-            modebar_remove = ['lasso', 'select']
-        fig.update_layout(title={'x': 0.5, 'y': 0.9, 'xanchor': 'center', 'yanchor': 'top'})
-        fig.update_layout(modebar={'remove': modebar_remove})
 
-        return fig.to_html(full_html=False, include_plotlyjs=False)
-
-
-def column_values_list(queryset, *columns):
-    if not queryset.exists():
+PLAYER_CHARTS = {
+    'matches': {
+        'recap_charts': [
+            Charts.recap_chart('Сезоны', 'seasons'),
+            Charts.recap_chart('Матчи', 'matches'),
+            Charts.recap_chart('Команды', 'teams'),
+            Charts.recap_chart('Процент побед', 'winrate', percentage=True),
+        ],
+        'bar_charts': [Charts.matches_by_season(), Charts.wdl(), Charts.wdl_percentage()],
+        'pie_charts': [Charts.matches_by_team(), Charts.matches_by_tournament()],
+    },
+    'goals_assists': {
+        'recap_charts': [
+            Charts.recap_chart('Голы', 'goals'),
+            Charts.recap_chart('Голевые передачи', 'assists'),
+        ],
+        'bar_charts': [
+            Charts.goals_by_season(), Charts.goals_per_match_by_season(),
+            Charts.assists_by_season(), Charts.assists_per_match_by_season(),
+            Charts.goals_assists_by_season(), Charts.goals_assists_per_match_by_season(),
+        ],
+        'pie_charts': [
+            Charts.goals_by_team(), Charts.goals_by_tournament(),
+            Charts.assists_by_team(), Charts.assists_by_tournament(),
+            Charts.goals_assists_by_team(), Charts.goals_assists_by_tournament(),
+        ],
+    },
+    'cs': {
+        'recap_charts': [Charts.recap_chart('Сухие таймы', 'cs')],
+        'bar_charts': [Charts.cs_by_season(), Charts.cs_per_match_by_season()],
+        'pie_charts': [Charts.cs_by_team(), Charts.cs_by_tournament()],
+    },
+    'cards': {
+        'recap_charts': [
+            Charts.recap_chart('Желтые карточки', 'yellow_cards', color='yellow'),
+            Charts.recap_chart('Красные карточки', 'red_cards', color='red'),
+        ],
+        'bar_charts': [Charts.cards_by_season(), Charts.cards_per_match_by_season()],
+        'pie_charts': [
+            Charts.yellow_cards_by_team(), Charts.yellow_cards_by_tournament(),
+            Charts.red_cards_by_team(), Charts.red_cards_by_tournament(),
+        ],
+    },
+}
+
+TEAM_CHARTS = {
+    'matches': {
+        'recap_charts': [
+            Charts.recap_chart('Сезоны', 'seasons'),
+            Charts.recap_chart('Матчи', 'matches'),
+            Charts.recap_chart('Процент побед', 'winrate', percentage=True),
+        ],
+        'bar_charts': [
+            Charts.matches_by_season(), Charts.wdl(), Charts.wdl_percentage(),
+            Charts.points_per_match_by_season(), Charts.top_players_by_matches(),
+        ],
+        'pie_charts': [Charts.matches_by_tournament()],
+    },
+    'goals_assists': {
+        'recap_charts': [
+            Charts.recap_chart('Голы', 'goals'),
+            Charts.recap_chart('Голевые передачи', 'assists'),
+        ],
+        'bar_charts': [
+            Charts.goals_by_season(with_conceded=True), Charts.goals_per_match_by_season(with_conceded=True),
+            Charts.assists_by_season(), Charts.assists_per_match_by_season(),
+            Charts.top_players_by_goals(), Charts.top_players_by_goals_per_match(),
+            Charts.top_players_by_assists(), Charts.top_players_by_assists_per_match(),
+        ],
+        'pie_charts': [Charts.goals_by_tournament(), Charts.assists_by_tournament()],
+    },
+    'cs': {
+        'recap_charts': [Charts.recap_chart('Сухие таймы', 'cs')],
+        'bar_charts': [
+            Charts.cs_by_season(), Charts.cs_per_match_by_season(),
+            Charts.top_players_by_cs(), Charts.top_players_by_cs_per_match(),
+        ],
+        'pie_charts': [Charts.cs_by_tournament()],
+    },
+    'cards': {
+        'recap_charts': [
+            Charts.recap_chart('Желтые карточки', 'yellow_cards', color='yellow'),
+            Charts.recap_chart('Красные карточки', 'red_cards', color='red'),
+        ],
+        'bar_charts': [
+            Charts.cards_by_season(), Charts.cards_per_match_by_season(),
+            Charts.top_players_by_yellow_cards(), Charts.top_players_by_red_cards(),
+        ],
+        'pie_charts': [Charts.yellow_cards_by_tournament(), Charts.red_cards_by_tournament()],
+    },
+}
+
+
+@cached_by_revision(PLAYER, lambda player: player.id)
+def player_chart_data(player, section):
+    return getattr(StatCharts.for_player(player), section)()
+
+
+@cached_by_revision(TEAM, lambda team: team.id)
+def team_chart_data(team, section):
+    return getattr(StatCharts.for_team(team), section)()
+
+
+def chart_data_etag(scope, obj_id, section):
+    return f'{CHARTS_DATA_VERSION}-{scope}-{obj_id}-{section}-{get_revision(scope, obj_id)}'
+
+
+def series(rows, **columns):
+    return {name: list(values) for name, values in zip(columns, column_values_list(rows, *columns.values()))}
+
+
+def column_values_list(rows, *columns):
+    if isinstance(rows, pd.DataFrame):
+        # NaN не сериализуется в JSON, поэтому пропуски отдаем как None
+        rows = rows.astype(object).where(rows.notna(), None)
+        return [rows[column].tolist() for column in columns]
+
+    if not rows.exists():
         return [[] for _ in columns]
 
-    return list(zip(*queryset.values_list(*columns)))
-
-
-def is_empty_data(data):
-    return not data or all((x == 0 for x in data))
+    return list(zip(*rows.values_list(*columns)))
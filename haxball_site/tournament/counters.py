@@ -0,0 +1,110 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Goal, Match, MatchResult, OtherEvents, Substitution
+
+MATCH_COUNTER_FIELDS = (
+    'goals_count', 'assists_count', 'own_goals_count', 'yellow_cards_count', 'red_cards_count',
+    'clean_sheets_count', 'substitutions_count',
+)
+SCORE_FIELDS = ('score_home', 'score_guest')
+
+
+def count_match_events(matches):
+    """
+    Живые значения счетчиков и счета матчей: {id матча: {поле: значение}}.
+    Три сгруппированных запроса на все матчи.
+    """
+    counters = defaultdict(lambda: dict.fromkeys(MATCH_COUNTER_FIELDS + SCORE_FIELDS, 0))
+    by_side = {
+        'home': Count('id', filter=Q(team=F('match__team_home'))),
+        'guest': Count('id', filter=Q(team=F('match__team_guest'))),
+    }
+
+    goals = (
+        Goal.objects.filter(match__in=matches)
+        .order_by().values('match')
+        .annotate(goals=Count('id'), assists=Count('assistent'), **by_side)
+    )
+    for row in goals:
+        counters[row['match']].update(
+            goals_count=row['goals'], assists_count=row['assists'], score_home=row['home'], score_guest=row['guest']
+        )
+
+    events = (
+        OtherEvents.objects.filter(match__in=matches, event__in=OtherEvents.COUNTER_FIELDS)
+        .order_by().values('match', 'event')
+        .annotate(c=Count('id'), **by_side)
+    )
+    for row in events:
+        match_counters = counters[row['match']]
+        match_counters[OtherEvents.COUNTER_FIELDS[row['event']]] = row['c']
+        if row['event'] == OtherEvents.OWN_GOAL:
+            match_counters['score_home'] += row['guest']
+            match_counters['score_guest'] += row['home']
+
+    substitutions = (
+        Substitution.objects.filter(match__in=matches)
+        .order_by().values('match')
+        .annotate(c=Count('id'))
+    )
+    for row in substitutions:
+        counters[row['match']]['substitutions_count'] = row['c']
+
+    return counters
+
+
+def _stale_matches(matches, with_scores):
+    live = count_match_events(matches.values('id'))
+    # Счет матчей с вручную указанным результатом (ТП) может не совпадать с голами, его не трогаем
+    matches = matches.annotate(manual_result=F('result__set_manually')).order_by('id')
+    for match in matches:
+        counters = live[match.id]
+        fields = MATCH_COUNTER_FIELDS
+        if with_scores and not match.manual_result:
+            fields += SCORE_FIELDS
+        changed = [
+            (field, getattr(match, field), counters[field])
+            for field in fields if getattr(match, field) != counters[field]
+        ]
+        if changed:
+            yield match, {field: counters[field] for field in fields}, changed
+
+
+def match_counter_mismatches(matches, with_scores=False):
+    return [
+        (match.id, field, stored, live)
+        for match, _, changed in _stale_matches(matches, with_scores)
+        for field, stored, live in changed
+    ]
+
+
+def refresh_match_counters(matches, with_scores=False, update_results=True):
+    """update_results=False - результат матчей не обновляется, вызывающий сам сохранит матч."""
+    updated = []
+    with transaction.atomic():
+        for match, counters, changed in _stale_matches(matches, with_scores):
+            for field, value in counters.items():
+                setattr(match, field, value)
+            updated.append((match, changed))
+        fields = MATCH_COUNTER_FIELDS + SCORE_FIELDS if with_scores else MATCH_COUNTER_FIELDS
+        Match.objects.bulk_update([match for match, _ in updated], fields, batch_size=500)
+
+        for match, changed in updated:
+            if update_results and any(field in SCORE_FIELDS for field, _, _ in changed):
+                MatchResult.update_for_match(match)
+    return [match for match, _ in updated]
+
+
+def recompute_matches(match_ids, update_results=True, with_scores=True):
+    """
+    Пересчет счета и счетчиков матчей по их событиям - после массовых операций и сохранения матча в админке.
+    with_scores=False - пересчитываются только счетчики, счет матча остается как есть.
+    """
+    if match_ids:
+        return refresh_match_counters(
+            Match.objects.filter(id__in=match_ids), with_scores=with_scores, update_results=update_results
+        )
+    return []
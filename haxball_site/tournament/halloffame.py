@@ -0,0 +1,257 @@
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .aggregates import on_commit_once
+from .models import Goal, HallOfFameCategory, HallOfFameEntry, Match, OtherEvents, Player, Substitution, Team
+
+HALL_OF_FAME_SIZE = 200
+
+
+def _player_matches():
+    home_matches_subquery = (
+        Match.objects.filter(team_home_start=OuterRef('id'), is_played=True)
+        .order_by().values('team_home_start')
+        .annotate(c=Count('*')).values('c')
+    )
+    guest_matches_subquery = (
+        Match.objects.filter(team_guest_start=OuterRef('id'), is_played=True)
+        .order_by().values('team_guest_start')
+        .annotate(c=Count('*')).values('c')
+    )
+    sub_matches_subquery = (
+        Match.objects.filter(~(Q(team_guest_start=OuterRef('id')) | Q(team_home_start=OuterRef('id'))),
+                             match_substitutions__player_in=OuterRef('id'), is_played=True)
+        .order_by().values('match_substitutions__player_in')
+        .annotate(c=Count('*')).values('c')
+    )
+    return (
+        Player.objects
+        .annotate(home_matches_count=Coalesce(Subquery(home_matches_subquery), 0),
+                  guest_matches_count=Coalesce(Subquery(guest_matches_subquery), 0),
+                  sub_matches_count=Coalesce(Subquery(sub_matches_subquery), 0),
+                  matches_count=F('home_matches_count') + F('guest_matches_count') + F('sub_matches_count'))
+        .filter(matches_count__gt=0)
+        .order_by('-matches_count')
+    )
+
+
+def _team_matches():
+    home_matches_subquery = (
+        Match.objects.filter(team_home=OuterRef('id'), is_played=True)
+        .order_by().values('team_home')
+        .annotate(c=Count('*')).values('c')
+    )
+    guest_matches_subquery = (
+        Match.objects.filter(team_guest=OuterRef('id'), is_played=True)
+        .order_by().values('team_guest')
+        .annotate(c=Count('*')).values('c')
+    )
+    return (
+        Team.objects
+        .annotate(home_matches_count=Coalesce(Subquery(home_matches_subquery), 0),
+                  guest_matches_count=Coalesce(Subquery(guest_matches_subquery), 0),
+                  matches_count=F('home_matches_count') + F('guest_matches_count'))
+        .filter(matches_count__gt=0)
+        .annotate(wins_count=Count('won_matches'),
+                  winrate=Cast(F('wins_count'), FloatField()) / F('matches_count') * 100)
+        .order_by()
+    )
+
+
+def _player_events(event, annotation):
+    return (
+        Player.objects.filter(event__event=event)
+        .annotate(**{annotation: Count('event__match__league')})
+        .filter(**{annotation + '__gt': 0})
+        .order_by('-' + annotation)
+    )
+
+
+def _team_events(event, annotation):
+    return (
+        Team.objects.filter(team_events__event=event)
+        .annotate(**{annotation: Count('team_events__match__league')})
+        .filter(**{annotation + '__gt': 0})
+        .order_by('-' + annotation)
+    )
+
+
+# категория -> (атрибут со значением, который ждет шаблон, запрос)
+PLAYER_CATEGORIES = {
+    'goals': (
+        'goals_count',
+        lambda: Player.objects.annotate(goals_count=Count('goals__match__league'))
+        .filter(goals_count__gt=0)
+        .order_by('-goals_count'),
+    ),
+    'assists': (
+        'assists_count',
+        lambda: Player.objects.annotate(assists_count=Count('assists__match__league'))
+        .filter(assists_count__gt=0)
+        .order_by('-assists_count'),
+    ),
+    'clean_sheets': ('cs_count', partial(_player_events, OtherEvents.CLEAN_SHEET, 'cs_count')),
+    'yellow_cards': ('yellow_cards_count', partial(_player_events, OtherEvents.YELLOW_CARD, 'yellow_cards_count')),
+    'red_cards': ('red_cards_count', partial(_player_events, OtherEvents.RED_CARD, 'red_cards_count')),
+    'ogs': ('og_count', partial(_player_events, OtherEvents.OWN_GOAL, 'og_count')),
+    'player_matches': ('matches_count', _player_matches),
+    'subs_in': (
+        'subs_in_count',
+        lambda: Player.objects.annotate(subs_in_count=Count('join_game__player_in'))
+        .filter(subs_in_count__gt=0)
+        .order_by('-subs_in_count'),
+    ),
+    'subs_out': (
+        'subs_out_count',
+        lambda: Player.objects.annotate(subs_out_count=Count('replaced__player_out'))
+        .filter(subs_out_count__gt=0)
+        .order_by('-subs_out_count'),
+    ),
+}
+
+TEAM_CATEGORIES = {
+    'goals': (
+        'goals_count',
+        lambda: Team.objects.annotate(goals_count=Count('goals__match__league'))
+        .filter(goals_count__gt=0)
+        .order_by('-goals_count'),
+    ),
+    'assists': (
+        'assists_count',
+        lambda: Team.objects.annotate(
+            assists_count=Count('goals__match__league', filter=Q(goals__assistent__isnull=False))
+        )
+        .filter(assists_count__gt=0)
+        .order_by('-assists_count'),
+    ),
+    'clean_sheets': ('cs_count', partial(_team_events, OtherEvents.CLEAN_SHEET, 'cs_count')),
+    'yellow_cards': ('yellow_cards_count', partial(_team_events, OtherEvents.YELLOW_CARD, 'yellow_cards_count')),
+    'red_cards': ('red_cards_count', partial(_team_events, OtherEvents.RED_CARD, 'red_cards_count')),
+    'ogs': ('og_count', partial(_team_events, OtherEvents.OWN_GOAL, 'og_count')),
+    'team_matches': ('matches_count', lambda: _team_matches().order_by('-matches_count')),
+    'wins': ('wins_count', lambda: _team_matches().order_by('-wins_count')),
+    'winrates': ('winrate', lambda: _team_matches().filter(matches_count__gt=10).order_by('-winrate')),
+    'subs': (
+        'subs_count',
+        lambda: Team.objects.annotate(subs_count=Count('substitutions'))
+        .filter(subs_count__gt=0)
+        .order_by('-subs_count'),
+    ),
+}
+
+BOARDS = {
+    HallOfFameEntry.PLAYERS: (PLAYER_CATEGORIES, 'player'),
+    HallOfFameEntry.TEAMS: (TEAM_CATEGORIES, 'team'),
+}
+
+
+def refresh_category(board, category):
+    categories, entity_field = BOARDS[board]
+    attr, queryset = categories[category]
+    entries = [
+        HallOfFameEntry(
+            board=board, category=category, position=position, value=getattr(entity, attr), **{entity_field: entity}
+        )
+        for position, entity in enumerate(queryset()[:HALL_OF_FAME_SIZE], start=1)
+    ]
+    with transaction.atomic():
+        HallOfFameEntry.objects.filter(board=board, category=category).delete()
+        HallOfFameEntry.objects.bulk_create(entries)
+
+
+def refresh_hall_of_fame():
+    for board, (categories, _) in BOARDS.items():
+        for category in categories:
+            _refresh_marked(board, category)
+
+
+def refresh_dirty_categories():
+    """Пересобирает только категории, отмеченные изменившимися. Возвращает [(таблица, категория)]."""
+    dirty = list(HallOfFameCategory.objects.filter(is_dirty=True).values_list('board', 'category'))
+    for board, category in dirty:
+        if category in BOARDS.get(board, ({}, None))[0]:
+            _refresh_marked(board, category)
+    return dirty
+
+
+def _refresh_marked(board, category):
+    # Отметку снимаем до пересборки: изменения, пришедшие во время нее, снова отметят категорию
+    HallOfFameCategory.objects.filter(board=board, category=category).update(is_dirty=False)
+    refresh_category(board, category)
+
+
+def get_hall_of_fame(board):
+    categories, entity_field = BOARDS[board]
+    entries = HallOfFameEntry.objects.filter(board=board)
+    if board == HallOfFameEntry.PLAYERS:
+        entries = entries.select_related('player__team', 'player__name__user_profile')
+    else:
+        entries = entries.select_related('team')
+
+    leaderboards = defaultdict(list)
+    for entry in entries:
+        attr, _ = categories[entry.category]
+        entity = getattr(entry, entity_field)
+        # Значения хранятся во FloatField ради процента побед, остальные категории - целые счетчики
+        setattr(entity, attr, entry.value if attr == 'winrate' else int(entry.value))
+        leaderboards[entry.category].append(entity)
+    return {category: leaderboards[category] for category in categories}
+
+
+def mark_dirty(board, *categories):
+    """
+    Отмечает категории для пересборки командой refresh_hall_of_fame --dirty (по расписанию): агрегаты
+    по всей истории слишком дороги, чтобы считать их при каждом сохранении матча или гола.
+    Отметка ставится после коммита, по одному запросу на категорию за транзакцию.
+    """
+    for category in categories:
+        on_commit_once(('hall_of_fame', board, category), partial(_mark_dirty, board, category))
+
+
+def _mark_dirty(board, category):
+    HallOfFameCategory.objects.update_or_create(board=board, category=category, defaults={'is_dirty': True})
+
+
+EVENT_CATEGORIES = ('clean_sheets', 'yellow_cards', 'red_cards', 'ogs')
+MATCH_TEAM_CATEGORIES = ('team_matches', 'wins', 'winrates')
+
+
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def update_on_goal_change(sender, instance, **kwargs):
+    mark_dirty(HallOfFameEntry.PLAYERS, 'goals', 'assists')
+    mark_dirty(HallOfFameEntry.TEAMS, 'goals', 'assists')
+
+
+@receiver(post_save, sender=OtherEvents)
+@receiver(post_delete, sender=OtherEvents)
+def update_on_event_change(sender, instance, **kwargs):
+    mark_dirty(HallOfFameEntry.PLAYERS, *EVENT_CATEGORIES)
+    mark_dirty(HallOfFameEntry.TEAMS, *EVENT_CATEGORIES)
+
+
+@receiver(post_save, sender=Substitution)
+@receiver(post_delete, sender=Substitution)
+def update_on_substitution_change(sender, instance, **kwargs):
+    mark_dirty(HallOfFameEntry.PLAYERS, 'subs_in', 'subs_out', 'player_matches')
+    mark_dirty(HallOfFameEntry.TEAMS, 'subs')
+
+
+@receiver(post_save, sender=Match)
+@receiver(post_delete, sender=Match)
+def update_on_match_change(sender, instance, **kwargs):
+    mark_dirty(HallOfFameEntry.PLAYERS, 'player_matches')
+    mark_dirty(HallOfFameEntry.TEAMS, *MATCH_TEAM_CATEGORIES)
+
+
+@receiver(m2m_changed, sender=Match.team_home_start.through)
+@receiver(m2m_changed, sender=Match.team_guest_start.through)
+def update_on_squad_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        mark_dirty(HallOfFameEntry.PLAYERS, 'player_matches')
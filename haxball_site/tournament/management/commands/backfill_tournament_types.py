@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from ...models import League
+
+
+class Command(BaseCommand):
+    help = 'Проставить тип турнира по названию для турниров, у которых он не указан'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='пересчитать тип для всех турниров')
+
+    def handle(self, *args, **options):
+        leagues = League.objects.only('id', 'title', 'tournament_type')
+        if not options['force']:
+            leagues = leagues.filter(tournament_type='')
+
+        updated = []
+        for league in leagues:
+            tournament_type = League.tournament_type_from_title(league.title)
+            if league.tournament_type != tournament_type:
+                league.tournament_type = tournament_type
+                updated.append(league)
+            if tournament_type == League.OTHER:
+                print(f'Unknown tournament type: {league.title} (id={league.id})')
+
+        League.objects.bulk_update(updated, ['tournament_type'], batch_size=500)
+        print(f'Tournament types updated for {len(updated)} leagues')
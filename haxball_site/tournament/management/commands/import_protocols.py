@@ -0,0 +1,46 @@
+import json
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from ...protocols import ProtocolError, import_match_protocol
+
+
+class Command(BaseCommand):
+    help = 'Загрузить протоколы матчей из JSON (один протокол или список), формат описан в tournament/protocols.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='путь к JSON-файлу, "-" - читать из stdin')
+        parser.add_argument('--inspector', help='логин инспектора, который будет указан в матчах')
+
+    def handle(self, *args, **options):
+        try:
+            if options['path'] == '-':
+                protocols = json.load(sys.stdin)
+            else:
+                with open(options['path'], encoding='utf-8') as f:
+                    protocols = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Не удалось прочитать протоколы: {e}')
+        if isinstance(protocols, dict):
+            protocols = [protocols]
+
+        inspector = None
+        if options['inspector']:
+            inspector = User.objects.filter(username=options['inspector'], is_staff=True).first()
+            if inspector is None:
+                raise CommandError('Инспектор {} не найден'.format(options['inspector']))
+
+        # Каждый протокол - отдельная транзакция: ошибка в одном не откатывает уже загруженные
+        failed = 0
+        for protocol in protocols:
+            try:
+                match = import_match_protocol(protocol, inspector=inspector)
+            except ProtocolError as e:
+                failed += 1
+                print(f'Match {protocol.get("match")}: {e}')
+                continue
+            print(f'{match}: {match.score_home}:{match.score_guest}')
+
+        print(f'Protocols imported: {len(protocols) - failed}, failed: {failed}')
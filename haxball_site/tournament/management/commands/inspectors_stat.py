@@ -3,6 +3,13 @@ from django.core.management.base import BaseCommand, CommandError
 from ...models import Match, Season
 
 
+def other_events_count(match):
+    return (
+        match.substitutions_count + match.own_goals_count + match.yellow_cards_count + match.red_cards_count
+        + match.clean_sheets_count
+    )
+
+
 class Command(BaseCommand):
     help = 'Считаем активность инспекторов'
 
@@ -30,9 +37,9 @@ class Command(BaseCommand):
         inspectors = {}
         all_goals = 0
         all_events = 0
-        for m in all_matches:
-            all_goals += m.match_goal.count()
-            all_events += m.match_substitutions.count() + m.match_event.count()
+        for m in all_matches.select_related('inspector'):
+            all_goals += m.goals_count
+            all_events += other_events_count(m)
             if m.inspector in inspectors:
                 inspectors[m.inspector].append(m)
             else:
@@ -44,7 +51,7 @@ class Command(BaseCommand):
             goals_added = 0
             other_event_added = 0
             for m in inspectors[inspector]:
-                goals_added += m.match_goal.count()
-                other_event_added += m.match_substitutions.count() + m.match_event.count()
+                goals_added += m.goals_count
+                other_event_added += other_events_count(m)
             percent = round(100 * ((goals_added + other_event_added) / (all_goals + all_events)), 1)
             print(inspector, len(inspectors[inspector]), goals_added + other_event_added, percent)
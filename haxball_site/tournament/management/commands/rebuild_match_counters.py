@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from ...counters import match_counter_mismatches, refresh_match_counters
+from ...models import Match
+
+
+class Command(BaseCommand):
+    help = 'Сверить счетчики событий (и счет) матчей с голами/событиями/заменами и исправить расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--league', type=int, help='id турнира (по умолчанию - все матчи)')
+        parser.add_argument('--check', action='store_true', help='только показать расхождения, ничего не сохраняя')
+        parser.add_argument(
+            '--scores', action='store_true', help='сверять и счет матчей (кроме матчей с результатом вручную)'
+        )
+
+    def handle(self, *args, **options):
+        matches = Match.objects.all()
+        if options['league']:
+            matches = matches.filter(league=options['league'])
+
+        if options['check']:
+            mismatches = match_counter_mismatches(matches, with_scores=options['scores'])
+            for match_id, field, stored, live in mismatches:
+                print(f'Match {match_id} {field}: stored={stored}, live={live}')
+            print(f'Mismatches found: {len(mismatches)}')
+            return
+
+        updated = refresh_match_counters(matches, with_scores=options['scores'])
+        print(f'Counters rebuilt for {len(updated)} matches')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...aggregates import rebuild_player_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать с нуля статистику игроков по сезонам/командам/турнирам'
+
+    def handle(self, *args, **options):
+        rows = rebuild_player_stats()
+        print(f'Player stats rebuilt: {len(rows)} rows for {len({row.player_id for row in rows})} players')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from ...models import League, Team
+from ...standings import refresh_league_standings, standings_mismatches
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать сохраненные турнирные таблицы и показать расхождения с живым расчетом'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--league', type=int, help='id турнира (по умолчанию - все турниры)')
+        parser.add_argument('--check', action='store_true', help='только показать расхождения, ничего не сохраняя')
+
+    def handle(self, *args, **options):
+        leagues = League.objects.select_related('championship')
+        if options['league']:
+            leagues = leagues.filter(id=options['league'])
+
+        teams = {team.id: team for team in Team.objects.all()}
+        total_mismatches = 0
+        for league in leagues:
+            mismatches = standings_mismatches(league)
+            total_mismatches += len(mismatches)
+            for team_id, field, stored, live in mismatches:
+                print(f'{league}: {teams.get(team_id)} {field}: stored={stored}, live={live}')
+
+            if not options['check']:
+                refresh_league_standings(league)
+
+        print(f'Mismatches found: {total_mismatches}')
+        if not options['check']:
+            print(f'Standings rebuilt for {len(leagues)} leagues')
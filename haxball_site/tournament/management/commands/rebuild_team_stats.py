@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from ...aggregates import rebuild_team_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать с нуля статистику и рекорды команд (после rebuild_player_stats)'
+
+    def handle(self, *args, **options):
+        rows = rebuild_team_stats()
+        print(f'Team stats rebuilt: {len(rows)} rows for {len({row.team_id for row in rows})} teams')
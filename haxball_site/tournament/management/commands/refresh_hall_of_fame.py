@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from ...halloffame import BOARDS, refresh_category, refresh_dirty_categories, refresh_hall_of_fame
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновить снимки таблиц зала славы (все, выбранную категорию или, с --dirty, только изменившиеся). '
+        'refresh_hall_of_fame --dirty запускается по расписанию'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--board', choices=list(BOARDS), help='P - игроки, T - команды')
+        parser.add_argument('--category', help='например goals, assists, player_matches')
+        parser.add_argument('--dirty', action='store_true', help='только категории, данные которых менялись')
+
+    def handle(self, *args, **options):
+        if options['dirty']:
+            refreshed = refresh_dirty_categories()
+            print(f'Hall of fame: {len(refreshed)} categories refreshed')
+            return
+
+        if options['board'] and options['category']:
+            refresh_category(options['board'], options['category'])
+            print(f'Hall of fame {options["board"]}/{options["category"]} refreshed')
+            return
+
+        refresh_hall_of_fame()
+        print('Hall of fame refreshed')
@@ -1,13 +1,13 @@
 from datetime import date
-from typing import Optional
+from typing import ClassVar, Optional
 
 from colorfield.fields import ColorField
 from core.models import NewComment
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericRelation
 from django.db import models
-from django.db.models import Case, Q, Value, When
-from django.db.models.signals import post_save
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
@@ -119,6 +119,51 @@ class Team(models.Model):
 
 
 class League(models.Model):
+    TOP_TIER = 'top'
+    FIRST_TIER = 'first'
+    SECOND_TIER = 'second'
+    TOP_TIER_CUP = 'top_cup'
+    FIRST_TIER_CUP = 'first_cup'
+    SECOND_TIER_CUP = 'second_cup'
+    LEAGUE_CUP = 'league_cup'
+    CHAMPIONS_LEAGUE = 'champions'
+    NATIONAL_CUP = 'national_cup'
+    OTHER = 'other'
+    TOURNAMENT_TYPES = (
+        (TOP_TIER, 'Высшая лига'),
+        (FIRST_TIER, 'Первая лига'),
+        (SECOND_TIER, 'Вторая лига'),
+        (TOP_TIER_CUP, 'Кубок Высшей лиги'),
+        (FIRST_TIER_CUP, 'Кубок Первой лиги'),
+        (SECOND_TIER_CUP, 'Кубок Второй лиги'),
+        (LEAGUE_CUP, 'Кубок лиги'),
+        (CHAMPIONS_LEAGUE, 'Лига Чемпионов'),
+        (NATIONAL_CUP, 'Кубок России'),
+        (OTHER, 'Другой'),
+    )
+    # Порядок важен: берется первый тип, с префикса которого начинается название
+    TITLE_PREFIXES = (
+        (('высшая', 'единая'), TOP_TIER),
+        (('первая',), FIRST_TIER),
+        (('вторая',), SECOND_TIER),
+        (('кубок высшей',), TOP_TIER_CUP),
+        (('кубок первой',), FIRST_TIER_CUP),
+        (('кубок второй',), SECOND_TIER_CUP),
+        (('кубок лиги',), LEAGUE_CUP),
+        (('лига чемпионов',), CHAMPIONS_LEAGUE),
+        (('кубок россии',), NATIONAL_CUP),
+    )
+    TIERS = (TOP_TIER, FIRST_TIER, SECOND_TIER)
+    # Группы турниров на графиках статистики
+    TOURNAMENT_GROUPS = (
+        ('Высшая лига', (TOP_TIER,)),
+        ('Первая лига', (FIRST_TIER,)),
+        ('Вторая лига', (SECOND_TIER,)),
+        ('Кубок лиги', (TOP_TIER_CUP, FIRST_TIER_CUP, SECOND_TIER_CUP, LEAGUE_CUP)),
+        ('Лига Чемпионов', (CHAMPIONS_LEAGUE,)),
+        ('Кубок России', (NATIONAL_CUP,)),
+    )
+
     championship = models.ForeignKey(
         Season, verbose_name='Сезон', related_name='tournaments_in_season', null=True, on_delete=models.CASCADE
     )
@@ -132,10 +177,47 @@ class League(models.Model):
     )
     comments = GenericRelation(NewComment, related_query_name='league_comments')
     commentable = models.BooleanField('Комментируемый турнир', default=True)
+    tournament_type = models.CharField(
+        'Тип турнира',
+        max_length=16,
+        choices=TOURNAMENT_TYPES,
+        blank=True,
+        db_index=True,
+        help_text='если не указан, определяется по названию турнира',
+    )
 
     def __str__(self):
         return '{}, {}'.format(self.title, self.championship)
 
+    def save(self, *args, **kwargs):
+        if not self.tournament_type:
+            self.tournament_type = self.tournament_type_from_title(self.title)
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def tournament_type_from_title(cls, title):
+        title = (title or '').lower()
+        for prefixes, tournament_type in cls.TITLE_PREFIXES:
+            if title.startswith(prefixes):
+                return tournament_type
+        return cls.OTHER
+
+    @classmethod
+    def tournament_group(cls, tournament_type):
+        for group, types in cls.TOURNAMENT_GROUPS:
+            if tournament_type in types:
+                return group
+        return 'Unknown'
+
+    @classmethod
+    def tournament_group_case(cls, league_path='league'):
+        """Группа турнира (см. TOURNAMENT_GROUPS) для аннотаций по связанному турниру."""
+        lookup = f'{league_path}__tournament_type__in'
+        return Case(
+            *[When(**{lookup: types}, then=Value(group)) for group, types in cls.TOURNAMENT_GROUPS],
+            default=Value('Unknown')
+        )
+
     def get_postponement_slots(self):
         return self.postponement_slots.first()
 
@@ -197,6 +279,8 @@ class Player(models.Model):
 
     role = models.CharField('Должность', max_length=2, choices=ROLES, default=JUST_PLAYER)
 
+    tracker = FieldTracker(['team'])
+
     @receiver(post_save, sender=User)
     def create_comment_history_item(sender, instance, created, **kwargs):
         if not created:
@@ -286,6 +370,16 @@ class Match(models.Model):
     score_home = models.SmallIntegerField('Забито хозявами', default=0)
     score_guest = models.SmallIntegerField('Забито гостями', default=0)
 
+    # Счетчики событий матча. Как и счет, поддерживаются в save/delete голов, событий и замен (MatchCountersMixin),
+    # сверяются и пересчитываются командой rebuild_match_counters
+    goals_count = models.PositiveSmallIntegerField('Голов', default=0, editable=False)
+    assists_count = models.PositiveSmallIntegerField('Ассистов', default=0, editable=False)
+    own_goals_count = models.PositiveSmallIntegerField('Автоголов', default=0, editable=False)
+    yellow_cards_count = models.PositiveSmallIntegerField('Жёлтых карточек', default=0, editable=False)
+    red_cards_count = models.PositiveSmallIntegerField('Красных карточек', default=0, editable=False)
+    clean_sheets_count = models.PositiveSmallIntegerField('Сухих таймов', default=0, editable=False)
+    substitutions_count = models.PositiveSmallIntegerField('Замен', default=0, editable=False)
+
     team_home_start = models.ManyToManyField(
         Player, related_name='home_matches', verbose_name='Состав хозяев', blank=True
     )
@@ -300,6 +394,8 @@ class Match(models.Model):
     comments = GenericRelation(NewComment, related_query_name='match_comments')
     commentable = models.BooleanField('Комментируемый матч', default=True)
 
+    tracker = FieldTracker(['league'])
+
     def cards(self):
         return self.match_event.filter(Q(event=OtherEvents.YELLOW_CARD) | Q(event=OtherEvents.RED_CARD)).order_by(
             'team'
@@ -372,6 +468,38 @@ class Match(models.Model):
     def get_absolute_url(self):
         return reverse('tournament:match_detail', args=[self.id])
 
+    def score_field(self, team_id, own_goal=False):
+        """Поле счета, которое увеличивает гол команды (автогол идет в счет соперника)."""
+        if team_id == self.team_home_id:
+            return 'score_guest' if own_goal else 'score_home'
+        if team_id == self.team_guest_id:
+            return 'score_home' if own_goal else 'score_guest'
+        return None
+
+    @classmethod
+    def add_to_counters(cls, match_id, counters):
+        counters = {field: delta for field, delta in counters.items() if delta}
+        if match_id is None or not counters:
+            return
+        # Атомарное обновление в базе: параллельные правки не затирают друг друга, в отличие от match.save()
+        cls.objects.filter(pk=match_id).update(**{field: F(field) + delta for field, delta in counters.items()})
+        if counters.keys() & {'score_home', 'score_guest'}:
+            match = cls.objects.filter(pk=match_id).first()
+            if match:
+                MatchResult.update_for_match(match)
+
+    @classmethod
+    def move_counters(cls, old_match_id, old_counters, new_match_id, new_counters):
+        """Переносит вклад строки (гола, события, замены) в счетчики матча: старый вычитается, новый прибавляется."""
+        if old_match_id == new_match_id:
+            fields = {*old_counters, *new_counters}
+            cls.add_to_counters(
+                new_match_id, {field: new_counters.get(field, 0) - old_counters.get(field, 0) for field in fields}
+            )
+            return
+        cls.add_to_counters(old_match_id, {field: -delta for field, delta in old_counters.items()})
+        cls.add_to_counters(new_match_id, new_counters)
+
     def __str__(self):
         return 'Матч {} - {}, {} тур'.format(
             self.team_home.short_title, self.team_guest.short_title, self.numb_tour.number
@@ -428,12 +556,17 @@ class MatchResult(models.Model):
 
     @receiver(post_save, sender=Match)
     def create_or_update_result(sender, instance, created, **kwargs):
-        if not instance.is_played:
+        MatchResult.update_for_match(instance)
+
+    @staticmethod
+    def update_for_match(match):
+        if not match.is_played:
             return
 
-        result = MatchResult.objects.filter(match=instance).first()
+        result = MatchResult.objects.filter(match=match).first()
         if not result:
-            result = MatchResult(match=instance)
+            result = MatchResult(match=match)
+        result.match = match  # счет берем из переданного матча, а не из закэшированного в результате
         result.save()
 
     def get_result_from_scores(self):
@@ -452,7 +585,78 @@ class MatchResult(models.Model):
         verbose_name_plural = 'Результат матча'
 
 
-class Goal(models.Model):
+class MatchEventQuerySet(models.QuerySet):
+    """
+    Массовые операции обходят save/delete событий, поэтому после них затронутые матчи пересчитываются целиком.
+    С recompute=False пересчет остается за вызывающим (импорт протокола пересчитывает матч один раз в конце).
+    """
+
+    def bulk_create(self, objs, *args, recompute=True, **kwargs):
+        from .counters import recompute_matches
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if recompute:
+            recompute_matches({obj.match_id for obj in objs if obj.match_id is not None})
+        return objs
+
+    def delete(self, recompute=True):
+        from .counters import recompute_matches
+
+        match_ids = set(self.exclude(match=None).order_by().values_list('match', flat=True).distinct())
+        deleted = super().delete()
+        if recompute:
+            recompute_matches(match_ids)
+        return deleted
+
+    def delete_without_signals(self):
+        """
+        Удаление одним запросом без pre/post_delete на каждую строку, счет и статистику пересчитывает вызывающий.
+        Ссылки с SET_NULL (рекорды команд на голы) обнуляются заранее, при других связях - обычное удаление.
+        """
+        relations = self.model._meta.related_objects
+        if any(relation.on_delete is not models.SET_NULL for relation in relations):
+            return self.delete(recompute=False)
+        for relation in relations:
+            relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': self}).update(
+                **{relation.field.name: None}
+            )
+        return self._raw_delete(self.db)
+
+
+class MatchCountersMixin:
+    """
+    Поддерживает счет и счетчики матча (см. Match.add_to_counters) при сохранении и удалении гола/события/замены.
+    Модель задает tracker по counter_fields и match_counters(match, *значения counter_fields).
+    """
+
+    counter_fields = ()
+
+    def current_counters(self):
+        return self.match_counters(self.match, *[self.serializable_value(field) for field in self.counter_fields])
+
+    def save(self, *args, **kwargs):
+        old_match_id, old_counters = None, {}
+        if self.pk is not None:
+            old_match_id = self.tracker.previous('match')
+            if old_match_id == self.match_id:
+                old_match = self.match
+            else:
+                old_match = Match.objects.filter(pk=old_match_id).first()
+            old_counters = self.match_counters(
+                old_match, *[self.tracker.previous(field) for field in self.counter_fields]
+            )
+
+        super().save(*args, **kwargs)
+        Match.move_counters(old_match_id, old_counters, self.match_id, self.current_counters())
+
+    def delete(self, *args, **kwargs):
+        counters = self.current_counters()
+        deleted = super().delete(*args, **kwargs)
+        Match.add_to_counters(self.match_id, {field: -delta for field, delta in counters.items()})
+        return deleted
+
+
+class Goal(MatchCountersMixin, models.Model):
     match = models.ForeignKey(
         Match, verbose_name='Матч', related_name='match_goal', null=True, blank=True, on_delete=models.CASCADE
     )
@@ -483,24 +687,17 @@ class Goal(models.Model):
     time_min = models.SmallIntegerField('Минута')
     time_sec = models.SmallIntegerField('Секунда')
 
-    def save(self, *args, **kwargs):
-        if self.pk is None:  # update score only when goal is created
-            if self.team == self.match.team_home:
-                self.match.score_home += 1
-                self.match.save(update_fields=['score_home'])
-            elif self.team == self.match.team_guest:
-                self.match.score_guest += 1
-                self.match.save(update_fields=['score_guest'])
-        super(Goal, self).save(*args, **kwargs)
+    objects = MatchEventQuerySet.as_manager()
+    tracker = FieldTracker(['match', 'team', 'assistent'])
+    counter_fields = ('team', 'assistent')
 
-    def delete(self, *args, **kwargs):
-        if self.team == self.match.team_home:
-            self.match.score_home -= 1
-            self.match.save(update_fields=['score_home'])
-        elif self.team == self.match.team_guest:
-            self.match.score_guest -= 1
-            self.match.save(update_fields=['score_guest'])
-        super(Goal, self).delete(*args, **kwargs)
+    @staticmethod
+    def match_counters(match, team_id, assistent_id):
+        counters = {'goals_count': 1, 'assists_count': int(assistent_id is not None)}
+        score_field = match.score_field(team_id) if match else None
+        if score_field:
+            counters[score_field] = 1
+        return counters
 
     def __str__(self):
         return 'на {:02d}:{:02d} от {}({}) в {}'.format(
@@ -513,7 +710,7 @@ class Goal(models.Model):
         ordering = ['time_min', 'time_sec']
 
 
-class Substitution(models.Model):
+class Substitution(MatchCountersMixin, models.Model):
     match = models.ForeignKey(
         Match, verbose_name='Матч', related_name='match_substitutions', null=True, on_delete=models.CASCADE
     )
@@ -543,6 +740,13 @@ class Substitution(models.Model):
     time_min = models.SmallIntegerField('Минута')
     time_sec = models.SmallIntegerField('Секунда')
 
+    objects = MatchEventQuerySet.as_manager()
+    tracker = FieldTracker(['match'])
+
+    @staticmethod
+    def match_counters(match):
+        return {'substitutions_count': 1}
+
     def __str__(self):
         return 'в {:02d}:{:02d} {} на {}'.format(self.time_min, self.time_sec, self.player_out, self.player_in)
 
@@ -595,7 +799,7 @@ class Disqualification(models.Model):
         )
 
 
-class OtherEventsQuerySet(models.QuerySet):
+class OtherEventsQuerySet(MatchEventQuerySet):
     def cards(self):
         return self.filter(event__in=[OtherEvents.YELLOW_CARD, OtherEvents.RED_CARD])
 
@@ -612,29 +816,10 @@ class OtherEventsQuerySet(models.QuerySet):
         return self.filter(event=OtherEvents.OWN_GOAL)
 
     def annotate_with_tournament(self):
-        return self.annotate(
-            tournament=Case(
-                When(
-                    Q(match__league__title__istartswith='Высшая') | Q(match__league__title__istartswith='Единая'),
-                    then=Value('Высшая лига')
-                ),
-                When(match__league__title__istartswith='Первая', then=Value('Первая лига')),
-                When(match__league__title__istartswith='Вторая', then=Value('Вторая лига')),
-                When(
-                    Q(match__league__title__istartswith='Кубок Высшей') |
-                    Q(match__league__title__istartswith='Кубок Первой') |
-                    Q(match__league__title__istartswith='Кубок Второй') |
-                    Q(match__league__title__istartswith='Кубок лиги'),
-                    then=Value('Кубок лиги')
-                ),
-                When(match__league__title__istartswith='Лига Чемпионов', then=Value('Лига Чемпионов')),
-                When(match__league__title__istartswith='Кубок России', then=Value('Кубок России')),
-                default=Value('Unknown')
-            )
-        )
+        return self.annotate(tournament=League.tournament_group_case('match__league'))
 
 
-class OtherEvents(models.Model):
+class OtherEvents(MatchCountersMixin, models.Model):
     match = models.ForeignKey(
         Match, verbose_name='Матч', related_name='match_event', null=True, on_delete=models.CASCADE
     )
@@ -676,25 +861,26 @@ class OtherEvents(models.Model):
         'для корректного отображения на странице матча',
     )
 
-    objects = OtherEventsQuerySet.as_manager()
-
-    def save(self, *args, **kwargs):
-        if self.match.team_home == self.team and self.event == 'OG':
-            self.match.score_guest += 1
-            self.match.save(update_fields=['score_guest'])
-        elif self.team == self.match.team_guest and self.event == 'OG':
-            self.match.score_home += 1
-            self.match.save(update_fields=['score_home'])
-        super(OtherEvents, self).save(*args, **kwargs)
+    COUNTER_FIELDS: ClassVar[dict] = {
+        YELLOW_CARD: 'yellow_cards_count',
+        RED_CARD: 'red_cards_count',
+        CLEAN_SHEET: 'clean_sheets_count',
+        OWN_GOAL: 'own_goals_count',
+    }
 
-    def delete(self, *args, **kwargs):
-        if self.match.team_home == self.team and self.event == 'OG':
-            self.match.score_guest -= 1
-            self.match.save(update_fields=['score_guest'])
-        elif self.team == self.match.team_guest and self.event == 'OG':
-            self.match.score_home -= 1
-            self.match.save(update_fields=['score_home'])
-        super(OtherEvents, self).delete(*args, **kwargs)
+    objects = OtherEventsQuerySet.as_manager()
+    tracker = FieldTracker(['match', 'team', 'event'])
+    counter_fields = ('team', 'event')
+
+    @classmethod
+    def match_counters(cls, match, team_id, event):
+        if event not in cls.COUNTER_FIELDS:
+            return {}
+        counters = {cls.COUNTER_FIELDS[event]: 1}
+        score_field = match.score_field(team_id, own_goal=True) if match and event == cls.OWN_GOAL else None
+        if score_field:
+            counters[score_field] = 1
+        return counters
 
     def __str__(self):
         return '{:02d}:{:02d} {} в {}'.format(self.time_min, self.time_sec, self.event, self.match)
@@ -939,3 +1125,227 @@ class TeamRating(models.Model):
         ordering = ['-version__number', 'rank']
         verbose_name = 'Командный рейтинг'
         verbose_name_plural = 'Командный рейтинг'
+
+
+class LeagueStanding(models.Model):
+    league = models.ForeignKey(League, verbose_name='Турнир', related_name='standings', on_delete=models.CASCADE)
+    team = models.ForeignKey(Team, verbose_name='Команда', related_name='standings', on_delete=models.CASCADE)
+    position = models.PositiveSmallIntegerField('Место')
+    played = models.PositiveSmallIntegerField('Игр сыграно', default=0)
+    wins = models.PositiveSmallIntegerField('Побед', default=0)
+    draws = models.PositiveSmallIntegerField('Ничей', default=0)
+    losses = models.PositiveSmallIntegerField('Поражений', default=0)
+    scored = models.PositiveSmallIntegerField('Мячей забито', default=0)
+    conceded = models.PositiveSmallIntegerField('Мячей пропущено', default=0)
+    points = models.PositiveSmallIntegerField('Очки', default=0)
+    form = models.CharField(
+        'Последние матчи', max_length=5, blank=True, help_text='W - победа, D - ничья, L - поражение'
+    )
+
+    @property
+    def goal_diff(self):
+        return self.scored - self.conceded
+
+    @staticmethod
+    def refresh_league(league_id):
+        from .standings import refresh_league_standings
+
+        league = League.objects.filter(id=league_id).first()
+        if league:
+            refresh_league_standings(league)
+
+    def __str__(self):
+        return f'{self.position}. {self.team} ({self.league})'
+
+    class Meta:
+        ordering = ('league', 'position')
+        unique_together = ('league', 'team')
+        verbose_name = 'Положение в таблице'
+        verbose_name_plural = 'Турнирные таблицы'
+
+
+# Результат матча пересохраняется при каждом сохранении сыгранного матча (в т.ч. из Goal/OtherEvents),
+# поэтому для сыгранных матчей таблицу обновляем по сигналу результата, а здесь - только для несыгранных
+@receiver(post_save, sender=Match)
+def refresh_standings_on_match_save(sender, instance, **kwargs):
+    if not instance.is_played:
+        LeagueStanding.refresh_league(instance.league_id)
+
+
+@receiver(post_save, sender=MatchResult)
+def refresh_standings_on_result_save(sender, instance, **kwargs):
+    LeagueStanding.refresh_league(instance.match.league_id)
+
+
+@receiver(post_delete, sender=Match)
+def refresh_standings_on_match_delete(sender, instance, **kwargs):
+    LeagueStanding.refresh_league(instance.league_id)
+
+
+@receiver(m2m_changed, sender=League.teams.through)
+def refresh_standings_on_teams_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        LeagueStanding.refresh_league(instance.id)
+    elif pk_set:
+        for league_id in pk_set:
+            LeagueStanding.refresh_league(league_id)
+
+
+class PlayerSeasonStats(models.Model):
+    player = models.ForeignKey(Player, verbose_name='Игрок', related_name='season_stats', on_delete=models.CASCADE)
+    season = models.ForeignKey(Season, verbose_name='Сезон', related_name='player_stats', on_delete=models.CASCADE)
+    team = models.ForeignKey(
+        Team, verbose_name='Команда', related_name='player_stats', null=True, on_delete=models.CASCADE
+    )
+    league = models.ForeignKey(League, verbose_name='Турнир', related_name='player_stats', on_delete=models.CASCADE)
+    matches = models.PositiveSmallIntegerField('Матчи', default=0)
+    goals = models.PositiveSmallIntegerField('Голы', default=0)
+    assists = models.PositiveSmallIntegerField('Ассисты', default=0)
+    cs = models.PositiveSmallIntegerField('Сухие таймы', default=0)
+    subs_out = models.PositiveSmallIntegerField('Замены (ушел)', default=0)
+    subs_in = models.PositiveSmallIntegerField('Замены (вышел)', default=0)
+    ogs = models.PositiveSmallIntegerField('Автоголы', default=0)
+    yellow_cards = models.PositiveSmallIntegerField('Желтые карточки', default=0)
+    red_cards = models.PositiveSmallIntegerField('Красные карточки', default=0)
+
+    def __str__(self):
+        return f'{self.player} ({self.team}, {self.league})'
+
+    class Meta:
+        verbose_name = 'Статистика игрока за сезон'
+        verbose_name_plural = 'Статистика игроков по сезонам'
+
+
+class TeamSeasonStats(models.Model):
+    team = models.ForeignKey(Team, verbose_name='Команда', related_name='season_stats', on_delete=models.CASCADE)
+    season = models.ForeignKey(Season, verbose_name='Сезон', related_name='team_stats', on_delete=models.CASCADE)
+    league = models.ForeignKey(League, verbose_name='Турнир', related_name='team_stats', on_delete=models.CASCADE)
+    matches = models.PositiveSmallIntegerField('Матчи', default=0)
+    wins = models.PositiveSmallIntegerField('Победы', default=0)
+    draws = models.PositiveSmallIntegerField('Ничьи', default=0)
+    losses = models.PositiveSmallIntegerField('Поражения', default=0)
+    goals = models.PositiveSmallIntegerField('Забито', default=0)
+    conceded_goals = models.PositiveSmallIntegerField('Пропущено', default=0)
+    assists = models.PositiveSmallIntegerField('Ассисты', default=0)
+    cs = models.PositiveSmallIntegerField('Сухие таймы', default=0)
+    subs = models.PositiveSmallIntegerField('Замены', default=0)
+    ogs = models.PositiveSmallIntegerField('Автоголы', default=0)
+    yellow_cards = models.PositiveSmallIntegerField('Желтые карточки', default=0)
+    red_cards = models.PositiveSmallIntegerField('Красные карточки', default=0)
+
+    @property
+    def winrate(self):
+        return float(self.wins) / (self.matches or 1) * 100
+
+    def __str__(self):
+        return f'{self.team} ({self.league})'
+
+    class Meta:
+        verbose_name = 'Статистика команды за сезон'
+        verbose_name_plural = 'Статистика команд по сезонам'
+
+
+class TeamRecords(models.Model):
+    team = models.OneToOneField(
+        Team, verbose_name='Команда', related_name='records', primary_key=True, on_delete=models.CASCADE
+    )
+    first_match = models.ForeignKey(
+        Match, verbose_name='Первый матч', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    biggest_home_win = models.ForeignKey(
+        Match, verbose_name='Самая крупная домашняя победа', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    biggest_guest_win = models.ForeignKey(
+        Match, verbose_name='Самая крупная гостевая победа', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    biggest_home_loss = models.ForeignKey(
+        Match, verbose_name='Самое крупное домашнее поражение', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    biggest_guest_loss = models.ForeignKey(
+        Match, verbose_name='Самое крупное гостевое поражение', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    most_effective_draw = models.ForeignKey(
+        Match, verbose_name='Самая результативная ничья', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    most_cards_match = models.ForeignKey(
+        Match, verbose_name='Больше всего карточек', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    most_cards_count = models.PositiveSmallIntegerField('Карточек в матче', default=0)
+    fastest_goal = models.ForeignKey(
+        Goal, verbose_name='Самый быстрый гол', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    latest_goal = models.ForeignKey(
+        Goal, verbose_name='Самый поздний гол', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    greatest_goalscorer = models.ForeignKey(
+        Player, verbose_name='Лучший бомбардир', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    greatest_goalscorer_count = models.PositiveSmallIntegerField('Голов', default=0)
+    greatest_assistant = models.ForeignKey(
+        Player, verbose_name='Лучший ассистент', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    greatest_assistant_count = models.PositiveSmallIntegerField('Передач', default=0)
+    greatest_goalkeeper = models.ForeignKey(
+        Player, verbose_name='Лучший вратарь', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    greatest_goalkeeper_count = models.PositiveSmallIntegerField('Сухих таймов', default=0)
+    greatest_player = models.ForeignKey(
+        Player, verbose_name='Больше всего матчей', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    greatest_player_count = models.PositiveSmallIntegerField('Матчей', default=0)
+    greatest_sub_in = models.ForeignKey(
+        Player, verbose_name='Больше всего выходов на замену', related_name='+', null=True, on_delete=models.SET_NULL
+    )
+    greatest_sub_in_count = models.PositiveSmallIntegerField('Выходов на замену', default=0)
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    def __str__(self):
+        return f'Рекорды {self.team}'
+
+    class Meta:
+        verbose_name = 'Рекорды команды'
+        verbose_name_plural = 'Рекорды команд'
+
+
+class HallOfFameEntry(models.Model):
+    PLAYERS = 'P'
+    TEAMS = 'T'
+    BOARDS = (
+        (PLAYERS, 'Игроки'),
+        (TEAMS, 'Команды'),
+    )
+
+    board = models.CharField('Таблица', max_length=1, choices=BOARDS)
+    category = models.CharField('Категория', max_length=32)
+    position = models.PositiveSmallIntegerField('Место')
+    player = models.ForeignKey(Player, verbose_name='Игрок', null=True, blank=True, on_delete=models.CASCADE)
+    team = models.ForeignKey(Team, verbose_name='Команда', null=True, blank=True, on_delete=models.CASCADE)
+    value = models.FloatField('Значение')
+    updated = models.DateTimeField('Обновлено', auto_now=True)
+
+    def __str__(self):
+        return f'{self.category} {self.position}. {self.player or self.team} ({self.value})'
+
+    class Meta:
+        ordering = ('board', 'category', 'position')
+        indexes = (models.Index(fields=('board', 'category', 'position')),)
+        verbose_name = 'Зал славы'
+        verbose_name_plural = 'Зал славы'
+
+
+class HallOfFameCategory(models.Model):
+    """Категория зала славы, данные которой менялись после последней пересборки (см. refresh_hall_of_fame --dirty)."""
+
+    board = models.CharField('Таблица', max_length=1, choices=HallOfFameEntry.BOARDS)
+    category = models.CharField('Категория', max_length=32)
+    is_dirty = models.BooleanField('Требует пересборки', default=False)
+
+    def __str__(self):
+        return f'{self.board}/{self.category}'
+
+    class Meta:
+        unique_together = ('board', 'category')
+        verbose_name = 'Категория зала славы'
+        verbose_name_plural = 'Категории зала славы'
@@ -0,0 +1,133 @@
+"""
+Импорт протокола матча одним JSON-документом вместо ручного ввода через инлайны админки.
+
+    {
+        "match": 1234,
+        "lineups": {"home": ["nick1", 15, ...], "guest": [...]},
+        "goals": [{"team": "home", "time": "03:15", "author": "nick1", "assistent": 15}],
+        "events": [{"team": "guest", "time": "08:00", "event": "YEL", "author": "nick2", "card_reason": "..."}],
+        "substitutions": [{"team": "home", "time": "10:30", "player_out": "nick1", "player_in": "nick3"}]
+    }
+
+Игроки задаются id или никнеймом, команда - "home"/"guest", event - код из OtherEvents.EVENT.
+Протокол заменяет все голы, события и замены матча, а счет и результат пересчитываются один раз в конце.
+"""
+from django.db import transaction
+
+from .aggregates import match_player_ids, schedule_player_refresh
+from .counters import MATCH_COUNTER_FIELDS, SCORE_FIELDS, recompute_matches
+from .halloffame import EVENT_CATEGORIES, mark_dirty
+from .models import Goal, HallOfFameEntry, Match, OtherEvents, Player, Substitution
+
+SIDES = ('home', 'guest')
+PLAYER_FIELDS = {
+    'goals': ('author', 'assistent'),
+    'events': ('author',),
+    'substitutions': ('player_out', 'player_in'),
+}
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def parse_time(value):
+    try:
+        minutes, seconds = (int(part) for part in str(value).split(':'))
+    except ValueError:
+        raise ProtocolError(f'Invalid time: {value}')
+    return minutes, seconds
+
+
+def resolve_players(protocol):
+    """Все упомянутые в протоколе игроки двумя запросами: {id или никнейм: id игрока}."""
+    refs = set()
+    for side in SIDES:
+        refs.update(protocol.get('lineups', {}).get(side, ()))
+    for key, fields in PLAYER_FIELDS.items():
+        for row in protocol.get(key, ()):
+            refs.update(row.get(field) for field in fields)
+    refs.discard(None)
+
+    ids = {ref for ref in refs if isinstance(ref, int)}
+    nicknames = refs - ids
+    players = {
+        player_id: player_id for player_id in Player.objects.filter(id__in=ids).values_list('id', flat=True)
+    }
+    for player_id, nickname in Player.objects.filter(nickname__in=nicknames).values_list('id', 'nickname'):
+        if nickname in players:
+            raise ProtocolError(f'Ambiguous nickname: {nickname}')
+        players[nickname] = player_id
+
+    missing = refs - players.keys()
+    if missing:
+        raise ProtocolError('Unknown players: {}'.format(', '.join(sorted(map(str, missing)))))
+    return players
+
+
+def build_rows(match, protocol, players):
+    teams = {'home': match.team_home_id, 'guest': match.team_guest_id}
+
+    def common(row):
+        if row.get('team') not in teams:
+            raise ProtocolError(f'Team must be one of {SIDES}: {row}')
+        time_min, time_sec = parse_time(row.get('time'))
+        return {'match': match, 'team_id': teams[row['team']], 'time_min': time_min, 'time_sec': time_sec}
+
+    def player(row, field):
+        return players.get(row.get(field))
+
+    goals = [
+        Goal(author_id=player(row, 'author'), assistent_id=player(row, 'assistent'), **common(row))
+        for row in protocol.get('goals', ())
+    ]
+    events = []
+    for row in protocol.get('events', ()):
+        if row.get('event') not in OtherEvents.COUNTER_FIELDS:
+            raise ProtocolError(f'Unknown event: {row}')
+        events.append(OtherEvents(
+            event=row['event'], author_id=player(row, 'author'), card_reason=row.get('card_reason'), **common(row)
+        ))
+    substitutions = [
+        Substitution(player_out_id=player(row, 'player_out'), player_in_id=player(row, 'player_in'), **common(row))
+        for row in protocol.get('substitutions', ())
+    ]
+    return goals, events, substitutions
+
+
+def import_match_protocol(protocol, inspector=None):
+    match = Match.objects.filter(id=protocol.get('match')).first()
+    if match is None:
+        raise ProtocolError('Unknown match: {}'.format(protocol.get('match')))
+
+    players = resolve_players(protocol)
+    goals, events, substitutions = build_rows(match, protocol, players)
+
+    with transaction.atomic():
+        # Старые строки удаляются без сигналов на каждую, поэтому их игроков пересчитываем явно. Новых игроков
+        # и команды пересчитает сохранение матча ниже
+        schedule_player_refresh(match.league_id, match_player_ids(match.id))
+        for queryset in (match.match_goal.all(), match.match_event.all(), match.match_substitutions.all()):
+            queryset.delete_without_signals()
+        Goal.objects.bulk_create(goals, recompute=False)
+        OtherEvents.objects.bulk_create(events, recompute=False)
+        Substitution.objects.bulk_create(substitutions, recompute=False)
+
+        lineups = protocol.get('lineups', {})
+        match.team_home_start.set([players[ref] for ref in lineups.get('home', ())])
+        match.team_guest_start.set([players[ref] for ref in lineups.get('guest', ())])
+
+        # Один пересчет счета и счетчиков, затем одно сохранение матча - оно же обновит результат и статистику
+        recompute_matches([match.id], update_results=False)
+        match.refresh_from_db(fields=MATCH_COUNTER_FIELDS + SCORE_FIELDS)
+        match.is_played = True
+        if inspector is not None:
+            match.inspector = inspector
+        match.save()
+
+        # Удаление и bulk_create не шлют сигналов, поэтому категории зала славы по событиям отмечаем явно
+        for board in (HallOfFameEntry.PLAYERS, HallOfFameEntry.TEAMS):
+            mark_dirty(board, 'goals', 'assists', *EVENT_CATEGORIES)
+        mark_dirty(HallOfFameEntry.PLAYERS, 'subs_in', 'subs_out')
+        mark_dirty(HallOfFameEntry.TEAMS, 'subs')
+    return match
@@ -0,0 +1,197 @@
+from collections import defaultdict
+
+from .models import Goal, Match, OtherEvents, Player, Substitution
+
+MATCH_SECONDS = 16 * 60
+TIMELINE_MINUTES = 16
+# Игроки с меньшим временем на поле в рейтинг очков за минуту не попадают
+MIN_PLAYER_MINUTES = 10
+
+SIDE_FIELDS = (
+    'matches', 'score_red', 'score_blue', 'wins_red', 'wins_blue', 'draws', 'losses',
+    'goals', 'goals_with_assist', 'own_goals', 'opponent_own_goals',
+)
+
+
+def side_stats():
+    return {**dict.fromkeys(SIDE_FIELDS, 0), 'timeline': [0] * TIMELINE_MINUTES}
+
+
+def add_to_timeline(timeline, minute):
+    # Доп. время складываем в последнюю минуту, чтобы длина распределения не зависела от матчей
+    timeline[min(minute, TIMELINE_MINUTES - 1)] += 1
+
+
+def percent(part, total):
+    return round(100 * part / total, 2) if total else None
+
+
+def load_matches(league):
+    """
+    Сыгранные матчи лиги одним запросом. Матчи, где счет не сходится с голами и автоголами протокола (ТП),
+    в статистику не идут - они только считаются.
+    """
+    matches, technical = {}, 0
+    rows = (
+        Match.objects.filter(league=league, is_played=True)
+        .values_list('id', 'team_home', 'team_guest', 'score_home', 'score_guest', 'goals_count', 'own_goals_count')
+        .iterator()
+    )
+    for match_id, home_id, guest_id, score_home, score_guest, goals_count, own_goals_count in rows:
+        if score_home + score_guest == goals_count + own_goals_count:
+            matches[match_id] = (home_id, guest_id, score_home, score_guest)
+        else:
+            technical += 1
+    return matches, technical
+
+
+def count_results(matches, league_stats, teams):
+    for home_id, guest_id, score_home, score_guest in matches.values():
+        home, guest = teams[home_id], teams[guest_id]
+        for stats in (league_stats, home, guest):
+            stats['matches'] += 1
+        league_stats['score_red'] += score_home
+        league_stats['score_blue'] += score_guest
+        home['score_red'] += score_home
+        guest['score_blue'] += score_guest
+
+        if score_home > score_guest:
+            league_stats['wins_red'] += 1
+            home['wins_red'] += 1
+            guest['losses'] += 1
+        elif score_home < score_guest:
+            league_stats['wins_blue'] += 1
+            guest['wins_blue'] += 1
+            home['losses'] += 1
+        else:
+            for stats in (league_stats, home, guest):
+                stats['draws'] += 1
+
+
+def count_goals(league, matches, league_stats, teams, players):
+    goals = (
+        Goal.objects.filter(match__league=league, match__is_played=True)
+        .values_list('match', 'team', 'author', 'assistent', 'time_min')
+        .iterator()
+    )
+    for match_id, team_id, author_id, assistent_id, time_min in goals:
+        if match_id not in matches:
+            continue
+        for stats in (league_stats, teams[team_id]) if team_id else (league_stats,):
+            stats['goals'] += 1
+            stats['goals_with_assist'] += assistent_id is not None
+            add_to_timeline(stats['timeline'], time_min)
+        players[author_id]['goals'] += 1
+        if assistent_id is not None:
+            players[assistent_id]['assists'] += 1
+
+    own_goals = (
+        OtherEvents.objects.filter(match__league=league, match__is_played=True, event=OtherEvents.OWN_GOAL)
+        .values_list('match', 'team', 'time_min')
+        .iterator()
+    )
+    for match_id, team_id, time_min in own_goals:
+        if match_id not in matches or team_id is None:
+            continue
+        home_id, guest_id = matches[match_id][:2]
+        opponent = teams[guest_id if team_id == home_id else home_id]
+        league_stats['own_goals'] += 1
+        teams[team_id]['own_goals'] += 1
+        opponent['opponent_own_goals'] += 1
+        add_to_timeline(opponent['timeline'], time_min)
+
+
+def count_minutes(league, matches, players):
+    """Секунды на поле: от старта (если в составе) или выхода на замену до ухода на замену или конца матча."""
+    changes = defaultdict(list)
+    lineups = (Match.team_home_start.through, Match.team_guest_start.through)
+    for through in lineups:
+        rows = through.objects.filter(match__league=league, match__is_played=True).values_list('match', 'player')
+        for match_id, player_id in rows.iterator():
+            changes[match_id, player_id].append((0, True))
+
+    substitutions = (
+        Substitution.objects.filter(match__league=league, match__is_played=True)
+        .values_list('match', 'player_in', 'player_out', 'time_min', 'time_sec')
+        .iterator()
+    )
+    for match_id, player_in, player_out, time_min, time_sec in substitutions:
+        seconds = time_min * 60 + time_sec
+        changes[match_id, player_in].append((seconds, True))
+        changes[match_id, player_out].append((seconds, False))
+
+    for (match_id, player_id), player_changes in changes.items():
+        if match_id not in matches or player_id is None:
+            continue
+        on_field_since = None
+        for seconds, comes_in in sorted(player_changes):
+            if comes_in and on_field_since is None:
+                on_field_since = seconds
+            elif not comes_in and on_field_since is not None:
+                players[player_id]['seconds'] += seconds - on_field_since
+                on_field_since = None
+        if on_field_since is not None:
+            players[player_id]['seconds'] += max(MATCH_SECONDS - on_field_since, 0)
+
+
+def team_row(title, stats):
+    scored = stats['score_red'] + stats['score_blue']
+    return {
+        'team': title,
+        **{field: stats[field] for field in SIDE_FIELDS},
+        'scored': scored,
+        'opponent_own_goals_percent': percent(stats['opponent_own_goals'], scored),
+        'assists_percent': percent(stats['goals_with_assist'], stats['goals']),
+        'timeline': stats['timeline'],
+    }
+
+
+def player_rows(players):
+    rows = []
+    nicknames = dict(Player.objects.filter(id__in=players).values_list('id', 'nickname'))
+    for player_id, stats in players.items():
+        points = stats['goals'] + stats['assists']
+        # Порог, как и раньше, по округленным минутам
+        minutes = round(stats['seconds'] / 60)
+        if player_id is None or minutes <= MIN_PLAYER_MINUTES or not points:
+            continue
+        rows.append({
+            'player': nicknames.get(player_id),
+            'points_per_minute': round(60 * points / stats['seconds'], 2),
+            'minutes': minutes,
+            'goals': stats['goals'],
+            'assists': stats['assists'],
+        })
+    rows.sort(key=lambda row: row['points_per_minute'], reverse=True)
+    return rows
+
+
+def build_season_report(league):
+    """
+    Статистика лиги, команд и игроков за один проход по матчам, голам, автоголам, составам и заменам лиги.
+    Каждая таблица читается одним потоковым запросом, поэтому число запросов не зависит от числа матчей и команд.
+    """
+    matches, technical = load_matches(league)
+    league_stats = side_stats()
+    teams = defaultdict(side_stats)
+    players = defaultdict(lambda: {'goals': 0, 'assists': 0, 'seconds': 0})
+
+    count_results(matches, league_stats, teams)
+    count_goals(league, matches, league_stats, teams, players)
+    count_minutes(league, matches, players)
+
+    titles = dict(league.teams.values_list('id', 'title'))
+    return {
+        'league': str(league),
+        'matches': len(matches),
+        'technical_matches': technical,
+        'league_stats': {
+            **{field: league_stats[field] for field in SIDE_FIELDS if field != 'losses'},
+            'timeline': league_stats['timeline'],
+        },
+        'teams': sorted(
+            (team_row(titles.get(team_id, str(team_id)), stats) for team_id, stats in teams.items()),
+            key=lambda row: row['team'],
+        ),
+        'players': player_rows(players),
+    }
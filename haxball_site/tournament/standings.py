@@ -0,0 +1,154 @@
+from collections import defaultdict
+from itertools import groupby
+
+from django.db import transaction
+
+from .models import League, LeagueStanding, Match, MatchResult, Team
+
+FORM_LENGTH = 5
+FORM_LETTERS = {1: 'W', 0: 'D', -1: 'L'}
+STANDING_FIELDS = ('position', 'played', 'wins', 'draws', 'losses', 'scored', 'conceded', 'points', 'form')
+
+
+def get_league_table(league: League):
+    teams = list(Team.objects.filter(leagues=league))
+    matches = list(
+        Match.objects.filter(league=league, is_played=True).select_related(
+            'team_home', 'team_guest', 'result__winner', 'numb_tour'
+        )
+    )
+    return build_league_table(teams, matches)
+
+
+def build_league_table(teams, matches):
+    """
+    Строки таблицы в виде
+    (team, played, wins, draws, losses, scored, conceded, goal_diff, points, last_matches).
+    Все считается в памяти по уже загруженным сыгранным матчам лиги.
+    """
+    matches_by_team = defaultdict(list)
+    for match in matches:
+        matches_by_team[match.team_home_id].append(match)
+        matches_by_team[match.team_guest_id].append(match)
+
+    table = []
+    for team in teams:
+        team_matches = matches_by_team[team.id]
+        row = _tally(team.id, team_matches)
+        last_matches = sorted(
+            ((match, match_outcome(match, team.id)) for match in team_matches),
+            key=lambda x: x[0].numb_tour.number,
+        )[-FORM_LENGTH:]
+        table.append((team, *row, last_matches))
+
+    table.sort(key=_sort_key, reverse=True)
+
+    # Команды с равным количеством очков сортируем по личным встречам
+    result = []
+    for _, group in groupby(table, key=lambda x: x[8]):
+        group = list(group)
+        if len(group) > 1:
+            group = _sort_by_head_to_head(group, matches_by_team)
+        result.extend(group)
+
+    return result
+
+
+def match_outcome(match: Match, team_id):
+    if match.result.winner_id == team_id:
+        return 1
+    if match.result.value == MatchResult.DRAW:
+        return 0
+    return -1
+
+
+def _sort_key(row):
+    return row[8], row[7], row[5]
+
+
+def _tally(team_id, matches):
+    wins = draws = losses = scored = conceded = 0
+    for match in matches:
+        if match.team_home_id == team_id:
+            scored += match.score_home
+            conceded += match.score_guest
+        else:
+            scored += match.score_guest
+            conceded += match.score_home
+
+        outcome = match_outcome(match, team_id)
+        if outcome == 1:
+            wins += 1
+        elif outcome == 0:
+            draws += 1
+        else:
+            losses += 1
+    points = wins * 3 + draws
+    return len(matches), wins, draws, losses, scored, conceded, scored - conceded, points
+
+
+def _sort_by_head_to_head(group, matches_by_team):
+    group_ids = {row[0].id for row in group}
+    mini_table = {}
+    for row in group:
+        team_id = row[0].id
+        head_to_head = [
+            match
+            for match in matches_by_team[team_id]
+            if match.team_home_id in group_ids and match.team_guest_id in group_ids
+        ]
+        mini_table[team_id] = (None, *_tally(team_id, head_to_head))
+    return sorted(group, key=lambda row: _sort_key(mini_table[row[0].id]), reverse=True)
+
+
+def standings_from_table(league: League, table):
+    return [
+        LeagueStanding(
+            league=league,
+            team=team,
+            position=position,
+            played=played,
+            wins=wins,
+            draws=draws,
+            losses=losses,
+            scored=scored,
+            conceded=conceded,
+            points=points,
+            form=''.join(FORM_LETTERS[outcome] for _, outcome in last_matches),
+        )
+        for position, (team, played, wins, draws, losses, scored, conceded, _, points, last_matches) in enumerate(
+            table, start=1
+        )
+    ]
+
+
+def refresh_league_standings(league: League):
+    # Позиции зависят от личных встреч, поэтому пересчитываем всю лигу целиком - это один запрос матчей
+    standings = standings_from_table(league, get_league_table(league))
+    with transaction.atomic():
+        LeagueStanding.objects.filter(league=league).delete()
+        LeagueStanding.objects.bulk_create(standings)
+    return standings
+
+
+def standings_mismatches(league: League):
+    stored = {s.team_id: s for s in LeagueStanding.objects.filter(league=league)}
+    live = {s.team_id: s for s in standings_from_table(league, get_league_table(league))}
+
+    mismatches = []
+    for team_id in stored.keys() | live.keys():
+        stored_row, live_row = stored.get(team_id), live.get(team_id)
+        if stored_row is None or live_row is None:
+            mismatches.append((team_id, 'row', stored_row is not None, live_row is not None))
+            continue
+        for field in STANDING_FIELDS:
+            if getattr(stored_row, field) != getattr(live_row, field):
+                mismatches.append((team_id, field, getattr(stored_row, field), getattr(live_row, field)))
+    return mismatches
+
+
+def get_team_position(league: League, team: Team):
+    position = LeagueStanding.objects.filter(league=league, team=team).values_list('position', flat=True).first()
+    if position is None:  # таблица лиги еще не сохранена
+        position = [row[0] for row in get_league_table(league)].index(team) + 1
+    return position
@@ -1,308 +1,286 @@
-from django.db.models import Case, Count, Exists, F, FloatField, OuterRef, Q, Subquery, Value, When
+import numpy as np
+import pandas as pd
+from django.db.models import Case, Count, F, FloatField, OuterRef, Q, Subquery, Value, When
 from django.db.models.functions import Cast, Coalesce
-
-from .models import Goal, Match, MatchResult, OtherEvents, Player, Season
+from django.utils.functional import cached_property
+
+from .cache import PLAYER, TEAM, cached_by_revision
+from .models import Goal, League, Match, MatchResult, OtherEvents, Player, Season, Substitution
+
+PLAYER_MATCH_COLUMNS = (
+    'match', 'team', 'team_title', 'season', 'season_title', 'season_number', 'league_type', 'result', 'winner',
+)
+PLAYER_GOAL_COLUMNS = ('author', 'assistent', 'team_title', 'season', 'league_type')
+PLAYER_EVENT_COLUMNS = ('event', 'team_title', 'season', 'league_type')
+
+
+@cached_by_revision(PLAYER, lambda player: player.id)
+def load_player_rows(player):
+    """Строки матчей, голов и событий игрока. Кэшируются до смены ревизии и общие для всех секций графиков."""
+    # По строке на пару (матч, команда, за которую играл игрок)
+    matches = (
+        Match.objects
+        .filter(Q(team_home_start=player) | Q(team_guest_start=player) | Q(match_substitutions__player_in=player),
+                is_played=True)
+        .annotate(
+            team=Case(
+                When(team_home_start=player, then=F('team_home')),
+                When(team_guest_start=player, then=F('team_guest')),
+                When(match_substitutions__player_in=player, then=F('match_substitutions__team')),
+                default=None
+            ),
+            team_title=Case(
+                When(team_home_start=player, then=F('team_home__title')),
+                When(team_guest_start=player, then=F('team_guest__title')),
+                When(match_substitutions__player_in=player, then=F('match_substitutions__team__title')),
+                default=Value('Unknown')
+            ),
+        )
+        .order_by()
+        .values_list(
+            'id', 'team', 'team_title', 'league__championship', 'league__championship__short_title',
+            'league__championship__number', 'league__tournament_type', 'result__value', 'result__winner',
+        )
+        .distinct()
+    )
+    goals = (
+        Goal.objects.filter(Q(author=player) | Q(assistent=player))
+        .values_list(
+            'author', 'assistent', 'team__title', 'match__league__championship', 'match__league__tournament_type'
+        )
+    )
+    events = (
+        OtherEvents.objects.filter(author=player)
+        .values_list('event', 'team__title', 'match__league__championship', 'match__league__tournament_type')
+    )
+    return {'matches': list(matches), 'goals': list(goals), 'events': list(events)}
+
+
+def load_frame(rows, columns):
+    frame = pd.DataFrame.from_records(rows, columns=columns)
+    frame['tournament'] = frame['league_type'].map(League.tournament_group)
+    return frame
+
+
+def count_by(frame, column, **masks):
+    return (
+        frame.assign(**masks)
+        .groupby(column, dropna=False)[list(masks)].sum()
+        .astype(int)
+        .reset_index()
+    )
 
 
 class PlayerStatsSource:
+    """
+    Статистика игрока для графиков. Матчи, голы и события игрока загружаются тремя запросами
+    (см. load_player_rows) в таблицы pandas, а все разбивки по сезонам/командам/турнирам считаются уже по ним.
+    """
+
     def __init__(self, player):
         self.player = player
 
+    @cached_property
+    def matches(self):
+        return load_frame(load_player_rows(self.player)['matches'], PLAYER_MATCH_COLUMNS)
+
+    @cached_property
+    def goals(self):
+        return load_frame(load_player_rows(self.player)['goals'], PLAYER_GOAL_COLUMNS)
+
+    @cached_property
+    def events(self):
+        return load_frame(load_player_rows(self.player)['events'], PLAYER_EVENT_COLUMNS)
+
+    def _seasons(self):
+        # Сезоны, в которых игрок провел хотя бы один матч
+        return (
+            self.matches.groupby(['season', 'season_title', 'season_number'])['match'].nunique()
+            .rename('matches')
+            .reset_index()
+            .sort_values('season_number', kind='stable')
+        )
+
+    def _count_by_season(self, frame, **masks):
+        counts = count_by(frame, 'season', **masks)
+        seasons = self._seasons().merge(counts, on='season', how='left')
+        return seasons.fillna({name: 0 for name in masks}).astype({name: int for name in masks})
+
+    def _goal_masks(self):
+        goals = self.goals
+        return {'goals': goals['author'] == self.player.id, 'assists': goals['assistent'] == self.player.id}
+
+    def _card_masks(self):
+        events = self.events
+        return {
+            'yellow_cards': events['event'] == OtherEvents.YELLOW_CARD,
+            'red_cards': events['event'] == OtherEvents.RED_CARD,
+        }
+
     def get_matches_by_season(self):
-        player = self.player
+        matches = self.matches
+        win = matches['winner'] == matches['team']
+        draw = matches['result'] == MatchResult.DRAW
         return (
-            Match.objects
-            .filter(Q(team_home_start=player) | Q(team_guest_start=player) | Q(match_substitutions__player_in=player),
-                    is_played=True)
-            .values(season_title=F('league__championship__short_title'))
-            .annotate(
-                matches=Count('pk', distinct=True),
-                team=Case(
-                    When(team_home_start=player, then=F('team_home')),
-                    When(team_guest_start=player, then=F('team_guest')),
-                    When(match_substitutions__player_in=player, then=F('match_substitutions__team')),
-                    default=None
-                )
-            )
-            .filter(matches__gt=0)
-            .annotate(
-                wins=Count('pk', distinct=True, filter=Q(result__winner=F('team'))),
-                draws=Count('pk', distinct=True, filter=Q(result__value=MatchResult.DRAW)),
-                losses=Count(
-                    'pk',
-                    distinct=True,
-                    filter=~Q(result__value=MatchResult.DRAW) & ~Q(result__winner=F('team'))
-                )
-            )
-            .order_by('league__championship__number')
+            matches.assign(win=win, draw=draw, loss=~win & ~draw)
+            .groupby(['season_number', 'season_title', 'team'], dropna=False)
+            .agg(matches=('match', 'nunique'), wins=('win', 'sum'), draws=('draw', 'sum'), losses=('loss', 'sum'))
+            .reset_index()
+            .sort_values('season_number', kind='stable')
         )
 
     def get_matches_by_team(self):
-        player = self.player
         return (
-            Match.objects
-            .filter(Q(team_home_start=player) | Q(team_guest_start=player) | Q(match_substitutions__player_in=player),
-                    is_played=True)
-            .annotate(
-                team=Case(
-                    When(team_home_start=player, then=F('team_home__title')),
-                    When(team_guest_start=player, then=F('team_guest__title')),
-                    When(match_substitutions__player_in=player, then=F('match_substitutions__team__title')),
-                    default=Value('Unknown')
-                )
-            )
-            .values('team')
-            .annotate(matches=Count('pk', distinct=True))
-            .filter(matches__gt=0)
-            .order_by('-team')
+            self.matches.groupby('team_title')['match'].nunique()
+            .rename('matches')
+            .reset_index()
+            .rename(columns={'team_title': 'team'})
+            .sort_values('team', ascending=False, kind='stable')
         )
 
     def get_matches_by_tournament(self):
-        player = self.player
         return (
-            Match.objects
-            .filter(Q(team_home_start=player) | Q(team_guest_start=player) | Q(match_substitutions__player_in=player),
-                    is_played=True)
-            .annotate(
-                tournament=Case(
-                    When(
-                        Q(league__title__istartswith='Высшая') | Q(league__title__istartswith='Единая'),
-                        then=Value('Высшая лига')
-                    ),
-                    When(league__title__istartswith='Первая', then=Value('Первая лига')),
-                    When(league__title__istartswith='Вторая', then=Value('Вторая лига')),
-                    When(
-                        Q(league__title__istartswith='Кубок Высшей') |
-                        Q(league__title__istartswith='Кубок Первой') |
-                        Q(league__title__istartswith='Кубок Второй') |
-                        Q(league__title__istartswith='Кубок лиги'),
-                        then=Value('Кубок лиги')
-                    ),
-                    When(league__title__istartswith='Лига Чемпионов', then=Value('Лига Чемпионов')),
-                    When(league__title__istartswith='Кубок России', then=Value('Кубок России')),
-                    default=Value('Unknown')
-                )
-            )
-            .values('tournament')
-            .annotate(matches=Count('pk', distinct=True), )
-            .filter(matches__gt=0)
-            .order_by('-matches')
+            self.matches.groupby('tournament')['match'].nunique()
+            .rename('matches')
+            .reset_index()
+            .sort_values('matches', ascending=False, kind='stable')
         )
 
     def get_goals_by_season(self):
-        player = self.player
-        matches_subquery = (
-            Match.objects
-            .filter(
-                Q(team_home_start=player) | Q(team_guest_start=player) | Q(match_substitutions__player_in=player),
-                league__championship=OuterRef('id'),
-                is_played=True
-            )
-            .order_by()
-            .values('league__championship')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-        goals_subquery = (
-            Goal.objects.filter(match__league__championship=OuterRef('id'), author=player)
-            .order_by()
-            .values('match__league__championship')
-            .annotate(c=Count('*'))
-            .values('c')
-        )
-        assists_subquery = (
-            Goal.objects.filter(match__league__championship=OuterRef('id'), assistent=player)
-            .order_by()
-            .values('match__league__championship')
-            .annotate(c=Count('*'))
-            .values('c')
+        seasons = self._count_by_season(self.goals, **self._goal_masks())
+        return seasons.assign(
+            goals_per_match=seasons['goals'] / seasons['matches'],
+            assists_per_match=seasons['assists'] / seasons['matches'],
+            goals_assists_per_match=(seasons['goals'] + seasons['assists']) / seasons['matches'],
         )
 
+    def _get_goals_by(self, column):
+        goals = count_by(self.goals, column, **self._goal_masks())
         return (
-            Season.objects
-            .values(season_title=F('short_title'))
-            .annotate(
-                matches=Coalesce(Subquery(matches_subquery), 0),
-                goals=Coalesce(Subquery(goals_subquery), 0),
-                assists=Coalesce(Subquery(assists_subquery), 0),
-            )
-            .filter(matches__gt=0)
-            .annotate(
-                goals_per_match=Cast(F('goals'), FloatField()) / F('matches'),
-                assists_per_match=Cast(F('assists'), FloatField()) / F('matches'),
-                goals_assists_per_match=Cast(F('goals') + F('assists'), FloatField()) / F('matches'),
-            )
-            .order_by('number')
+            goals.assign(goals_assists=goals['goals'] + goals['assists'])
+            .sort_values('goals', ascending=False, kind='stable')
         )
 
     def get_goals_by_team(self):
-        player = self.player
-        return (
-            Goal.objects.filter(Q(author=player) | Q(assistent=player))
-            .values(team_title=F('team__title'))
-            .annotate(
-                goals=Count('author', filter=Q(author=player)),
-                assists=Count('assistent', filter=Q(assistent=player)),
-                goals_assists=F('goals') + F('assists'),
-            )
-            .order_by('-goals')
-        )
+        return self._get_goals_by('team_title')
 
     def get_goals_by_tournament(self):
-        player = self.player
-        return (
-            Goal.objects.filter(Q(author=player) | Q(assistent=player))
-            .annotate(
-                tournament=Case(
-                    When(
-                        Q(match__league__title__istartswith='Высшая') | Q(match__league__title__istartswith='Единая'),
-                        then=Value('Высшая лига')
-                    ),
-                    When(match__league__title__istartswith='Первая', then=Value('Первая лига')),
-                    When(match__league__title__istartswith='Вторая', then=Value('Вторая лига')),
-                    When(
-                        Q(match__league__title__istartswith='Кубок Высшей') |
-                        Q(match__league__title__istartswith='Кубок Первой') |
-                        Q(match__league__title__istartswith='Кубок Второй') |
-                        Q(match__league__title__istartswith='Кубок лиги'),
-                        then=Value('Кубок лиги')
-                    ),
-                    When(match__league__title__istartswith='Лига Чемпионов', then=Value('Лига Чемпионов')),
-                    When(match__league__title__istartswith='Кубок России', then=Value('Кубок России')),
-                    default=Value('Unknown')
-                )
-            )
-            .values('tournament')
-            .annotate(
-                goals=Count('author', filter=Q(author=player)),
-                assists=Count('assistent', filter=Q(assistent=player)),
-                goals_assists=F('goals') + F('assists'),
-            )
-            .order_by('-goals')
-        )
+        return self._get_goals_by('tournament')
 
     def get_cs_by_season(self):
-        player = self.player
-        matches_subquery = (
-            Match.objects
-            .filter(
-                Q(team_home_start=player) | Q(team_guest_start=player) | Q(match_substitutions__player_in=player),
-                league__championship=OuterRef('id'),
-                is_played=True
-            )
-            .order_by()
-            .values('league__championship')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-        cs_subquery = (
-            OtherEvents.objects.cs().filter(match__league__championship=OuterRef('id'), author=player)
-            .order_by()
-            .values('match__league__championship')
-            .annotate(c=Count('*'))
-            .values('c')
-        )
+        seasons = self._count_by_season(self.events, cs=self.events['event'] == OtherEvents.CLEAN_SHEET)
+        return seasons.assign(cs_per_match=seasons['cs'] / seasons['matches'])
 
-        return (
-            Season.objects
-            .values(season_title=F('short_title'))
-            .annotate(
-                matches=Coalesce(Subquery(matches_subquery), 0),
-                cs=Coalesce(Subquery(cs_subquery), 0),
-            )
-            .filter(matches__gt=0)
-            .annotate(cs_per_match=Cast(F('cs'), FloatField()) / F('matches'))
-            .order_by('number')
-        )
+    def _get_cs_by(self, column):
+        cs = count_by(self.events, column, cs=self.events['event'] == OtherEvents.CLEAN_SHEET)
+        return cs[cs['cs'] > 0].sort_values('cs', ascending=False, kind='stable')
 
     def get_cs_by_team(self):
-        return (
-            OtherEvents.objects.cs().filter(author=self.player)
-            .values(team_title=F('team__title'))
-            .annotate(cs=Count('*'))
-            .order_by('-cs')
-        )
+        return self._get_cs_by('team_title')
 
     def get_cs_by_tournament(self):
-        return (
-            OtherEvents.objects.cs().filter(author=self.player)
-            .annotate_with_tournament()
-            .values('tournament')
-            .annotate(cs=Count('*'))
-            .order_by('-cs')
-        )
+        return self._get_cs_by('tournament')
 
     def get_cards_by_season(self):
-        player = self.player
-        matches_subquery = (
-            Match.objects
-            .filter(
-                Q(team_home_start=player) | Q(team_guest_start=player) | Q(match_substitutions__player_in=player),
-                league__championship=OuterRef('id'),
-                is_played=True
-            )
-            .order_by()
-            .values('league__championship')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-        yellow_cards_subquery = (
-            OtherEvents.objects.filter(match__league__championship=OuterRef('id'), author=player)
-            .order_by()
-            .values('match__league__championship')
-            .annotate(c=Count('id', filter=Q(event=OtherEvents.YELLOW_CARD)))
-            .values('c')
-        )
-        red_cards_subquery = (
-            OtherEvents.objects.filter(match__league__championship=OuterRef('id'), author=player)
-            .order_by()
-            .values('match__league__championship')
-            .annotate(c=Count('id', filter=Q(event=OtherEvents.RED_CARD)))
-            .values('c')
+        seasons = self._count_by_season(self.events, **self._card_masks())
+        return seasons.assign(
+            yellow_cards_per_match=seasons['yellow_cards'] / seasons['matches'],
+            red_cards_per_match=seasons['red_cards'] / seasons['matches'],
         )
 
-        return (
-            Season.objects
-            .values(season_title=F('short_title'))
-            .annotate(
-                matches=Coalesce(Subquery(matches_subquery), 0),
-                yellow_cards=Coalesce(Subquery(yellow_cards_subquery), 0),
-                red_cards=Coalesce(Subquery(red_cards_subquery), 0),
-            )
-            .filter(matches__gt=0)
-            .annotate(
-                yellow_cards_per_match=Cast(F('yellow_cards'), FloatField()) / F('matches'),
-                red_cards_per_match=Cast(F('red_cards'), FloatField()) / F('matches'),
-            )
-            .order_by('number')
-        )
+    def _get_cards_by(self, column):
+        cards = count_by(self.events, column, **self._card_masks())
+        cards = cards.assign(cards=cards['yellow_cards'] + cards['red_cards'])
+        return cards[cards['cards'] > 0].sort_values('cards', ascending=False, kind='stable')
 
     def get_cards_by_team(self):
-        return (
-            OtherEvents.objects.filter(author=self.player)
-            .values(team_title=F('team__title'))
-            .annotate(
-                yellow_cards=Count('id', filter=Q(event=OtherEvents.YELLOW_CARD)),
-                red_cards=Count('id', filter=Q(event=OtherEvents.RED_CARD)),
-                cards=F('yellow_cards') + F('red_cards'),
-            )
-            .filter(cards__gt=0)
-            .order_by('-cards')
-        )
+        return self._get_cards_by('team_title')
 
     def get_cards_by_tournament(self):
-        return (
-            OtherEvents.objects.filter(author=self.player)
-            .annotate_with_tournament()
-            .values('tournament')
-            .annotate(
-                yellow_cards=Count('id', filter=Q(event=OtherEvents.YELLOW_CARD)),
-                red_cards=Count('id', filter=Q(event=OtherEvents.RED_CARD)),
-                cards=F('yellow_cards') + F('red_cards'),
-            )
-            .filter(cards__gt=0)
-            .order_by('-cards')
-        )
+        return self._get_cards_by('tournament')
+
+
+@cached_by_revision(TEAM, lambda team: team.id)
+def load_team_player_rows(team):
+    """Составы, замены и события команды для счетчиков игроков. Кэшируются до смены ревизии команды."""
+    home_starts = list(
+        Match.team_home_start.through.objects.filter(match__team_home=team)
+        .values_list('player', 'match', 'match__is_played')
+    )
+    guest_starts = (
+        Match.team_guest_start.through.objects.filter(match__team_guest=team, match__is_played=True)
+        .values_list('player', 'match')
+    )
+    # Замены в матчах команды за обе стороны: выход на замену после старта за команду не должен считаться дважды
+    substitutions = (
+        Substitution.objects
+        .filter(Q(team=team) | Q(match__team_home=team) | Q(match__team_guest=team),
+                match__is_played=True, player_in__isnull=False)
+        .values_list('player_in', 'match', 'team')
+    )
+    goals = Goal.objects.filter(team=team).values_list('author', 'assistent')
+    cs = OtherEvents.objects.cs().filter(team=team, author__isnull=False).values_list('author', flat=True)
+    return {
+        'home_starts': home_starts,
+        'guest_starts': list(guest_starts),
+        'substitutions': list(substitutions),
+        'goals': list(goals),
+        'cs': list(cs),
+        'nicknames': dict(
+            Player.objects.filter(id__in={player for player, *_ in home_starts}).values_list('id', 'nickname')
+        ),
+    }
+
+
+def pair_keys(pairs):
+    # Пара (игрок, матч) -> одно число, чтобы считать различные пары и пересекать их множества средствами numpy
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    return np.unique((pairs[:, 0] << 32) | pairs[:, 1])
+
+
+def id_array(ids):
+    return np.asarray([obj_id for obj_id in ids if obj_id is not None], dtype=np.int64)
+
+
+def count_ids(players, ids):
+    """Сколько раз каждый игрок из отсортированного массива players встречается в ids."""
+    ids = ids[np.isin(ids, players)]
+    return np.bincount(np.searchsorted(players, ids), minlength=len(players))
+
+
+def count_pairs(players, keys):
+    return count_ids(players, keys >> 32)
+
+
+def player_counters(team):
+    """
+    Матчи, голы, передачи и сухари игроков команды, посчитанные массивами numpy.
+    Числа совпадают с прежними подзапросами: матчи = старты дома + старты в гостях + выходы на замену
+    за команду - матчи, где игрок и начал, и вышел на замену; игроки - те, кто хоть раз начинал дома.
+    """
+    rows = load_team_player_rows(team)
+    home_starts = np.asarray(rows['home_starts'], dtype=np.int64).reshape(-1, 3)
+    players = np.unique(home_starts[:, 0])
+
+    home = pair_keys(home_starts[home_starts[:, 2] == 1][:, :2])
+    guest = pair_keys(rows['guest_starts'])
+    substitutions = np.asarray([row[:2] for row in rows['substitutions']], dtype=np.int64).reshape(-1, 2)
+    is_team_substitution = np.asarray([row[2] == team.id for row in rows['substitutions']], dtype=bool)
+    team_substitutions = pair_keys(substitutions[is_team_substitution])
+    all_substitutions = pair_keys(substitutions)
+    starts_and_substitutions = np.intersect1d(np.union1d(home, guest), all_substitutions)
+
+    goals = rows['goals']
+    return pd.DataFrame({
+        'player': [rows['nicknames'][player_id] for player_id in players.tolist()],
+        'matches': (
+            count_pairs(players, home) + count_pairs(players, guest) + count_pairs(players, team_substitutions)
+            - count_pairs(players, starts_and_substitutions)
+        ),
+        'goals': count_ids(players, id_array(author for author, _ in goals)),
+        'assists': count_ids(players, id_array(assistent for _, assistent in goals)),
+        'cs': count_ids(players, id_array(rows['cs'])),
+    })
 
 
 class TeamStatsSource:
@@ -341,10 +319,7 @@ class TeamStatsSource:
         return (
             Match.objects
             .filter(Q(team_home=team) | Q(team_guest=team), is_played=True)
-            .filter(
-                Q(league__title__in=['Высшая лига', 'Единая лига', 'Первая лига', 'Вторая лига']) |
-                Q(league__title__istartswith='Первая лига')
-            )
+            .filter(league__tournament_type__in=League.TIERS)
             .values(season_title=F('league__championship__short_title'))
             .annotate(
                 matches=Count('pk', distinct=True),
@@ -374,26 +349,7 @@ class TeamStatsSource:
         return (
             Match.objects
             .filter(Q(team_home=team) | Q(team_guest=team), is_played=True)
-            .annotate(
-                tournament=Case(
-                    When(
-                        Q(league__title__istartswith='Высшая') | Q(league__title__istartswith='Единая'),
-                        then=Value('Высшая лига')
-                    ),
-                    When(league__title__istartswith='Первая', then=Value('Первая лига')),
-                    When(league__title__istartswith='Вторая', then=Value('Вторая лига')),
-                    When(
-                        Q(league__title__istartswith='Кубок Высшей') |
-                        Q(league__title__istartswith='Кубок Первой') |
-                        Q(league__title__istartswith='Кубок Второй') |
-                        Q(league__title__istartswith='Кубок лиги'),
-                        then=Value('Кубок лиги')
-                    ),
-                    When(league__title__istartswith='Лига Чемпионов', then=Value('Лига Чемпионов')),
-                    When(league__title__istartswith='Кубок России', then=Value('Кубок России')),
-                    default=Value('Unknown')
-                )
-            )
+            .annotate(tournament=League.tournament_group_case())
             .values('tournament')
             .annotate(matches=Count('pk', distinct=True))
             .filter(matches__gt=0)
@@ -401,12 +357,8 @@ class TeamStatsSource:
         )
 
     def get_top_players_by_matches(self, top_n=10):
-        return (
-            self._get_players_with_matches()
-            .filter(matches__gt=0)
-            .order_by('-matches')
-            [:top_n]
-        )
+        players = self.player_counters
+        return players[players['matches'] > 0].sort_values('matches', ascending=False, kind='stable').head(top_n)
 
     def get_goals_by_season(self):
         team = self.team
@@ -470,26 +422,7 @@ class TeamStatsSource:
         team = self.team
         return (
             Goal.objects.filter(team=team)
-            .annotate(
-                tournament=Case(
-                    When(
-                        Q(match__league__title__istartswith='Высшая') | Q(match__league__title__istartswith='Единая'),
-                        then=Value('Высшая лига')
-                    ),
-                    When(match__league__title__istartswith='Первая', then=Value('Первая лига')),
-                    When(match__league__title__istartswith='Вторая', then=Value('Вторая лига')),
-                    When(
-                        Q(match__league__title__istartswith='Кубок Высшей') |
-                        Q(match__league__title__istartswith='Кубок Первой') |
-                        Q(match__league__title__istartswith='Кубок Второй') |
-                        Q(match__league__title__istartswith='Кубок лиги'),
-                        then=Value('Кубок лиги')
-                    ),
-                    When(match__league__title__istartswith='Лига Чемпионов', then=Value('Лига Чемпионов')),
-                    When(match__league__title__istartswith='Кубок России', then=Value('Кубок России')),
-                    default=Value('Unknown')
-                )
-            )
+            .annotate(tournament=League.tournament_group_case('match__league'))
             .values('tournament')
             .annotate(
                 goals=Count('team'),
@@ -510,82 +443,19 @@ class TeamStatsSource:
         )
 
     def get_top_players_by_goals_per_match(self, top_n=10):
-        team = self.team
+        return self._get_top_players_per_match('goals', top_n)
 
-        goals_subquery = (
-            Goal.objects
-            .filter(author=OuterRef('id'), team=team)
-            .order_by()
-            .values('author')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
+    @cached_property
+    def player_counters(self):
+        return player_counters(self.team)
 
-        return (
-            self._get_players_with_matches()
-            .annotate(
-                goals = Coalesce(Subquery(goals_subquery), 0),
-            )
-            .filter(matches__gte=10, goals__gt=0)
-            .annotate(
-                goals_per_match=Cast(F('goals'), FloatField()) / F('matches')
-            )
-            .order_by('-goals_per_match')
-            [:top_n]
-        )
-
-    def _get_players_with_matches(self):
-        team = self.team
-        home_matches_subquery = (
-            Match.objects
-            .filter(team_home=team, team_home_start=OuterRef('id'), is_played=True)
-            .order_by()
-            .values('team_home_start')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-        guest_matches_subquery = (
-            Match.objects
-            .filter(team_guest=team, team_guest_start=OuterRef('id'), is_played=True)
-            .order_by()
-            .values('team_guest_start')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-        sub_matches_subquery = (
-            Match.objects
-            .filter(match_substitutions__team=team, match_substitutions__player_in=OuterRef('id'), is_played=True)
-            .order_by()
-            .values('match_substitutions__player_in')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-        dup_matches_subquery = (
-            Match.objects
-            .filter(
-                (Q(team_home=team) & Q(team_home_start=OuterRef('id'))) |
-                (Q(team_guest=team) & Q(team_guest_start=OuterRef('id'))),
-                match_substitutions__player_in=OuterRef('id'),
-                is_played=True
-            )
-            .order_by()
-            .values('match_substitutions__player_in')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-
-        return (
-            Player.objects
-            .filter(Exists(Match.objects.filter(team_home=team, team_home_start=OuterRef('id'))))
-            .values(player=F('nickname'))
-            .annotate(
-                home_matches_c=Coalesce(Subquery(home_matches_subquery), 0),
-                guest_matches_c=Coalesce(Subquery(guest_matches_subquery), 0),
-                sub_matches=Coalesce(Subquery(sub_matches_subquery), 0),
-                dup_matches=Coalesce(Subquery(dup_matches_subquery), 0),
-                matches=F('home_matches_c') + F('guest_matches_c') + F('sub_matches') - F('dup_matches'),
-            )
-        )
+    def _get_top_players_per_match(self, column, top_n):
+        players = self.player_counters
+        matches, values = players['matches'].to_numpy(), players[column].to_numpy()
+        selected = np.flatnonzero((matches >= 10) & (values > 0))
+        per_match = values[selected] / matches[selected]
+        order = np.argsort(-per_match, kind='stable')[:top_n]
+        return players.iloc[selected[order]].assign(**{column + '_per_match': per_match[order]})
 
     def get_top_players_by_assists(self, top_n=10):
         return (
@@ -598,28 +468,7 @@ class TeamStatsSource:
         )
 
     def get_top_players_by_assists_per_match(self, top_n=10):
-        team = self.team
-        assists_subquery = (
-            Goal.objects
-            .filter(assistent=OuterRef('id'), team=team)
-            .order_by()
-            .values('assistent')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-
-        return (
-            self._get_players_with_matches()
-            .annotate(
-                assists=Coalesce(Subquery(assists_subquery), 0),
-            )
-            .filter(matches__gte=10, assists__gt=0)
-            .annotate(
-                assists_per_match=Cast(F('assists'), FloatField()) / F('matches')
-            )
-            .order_by('-assists_per_match')
-            [:top_n]
-        )
+        return self._get_top_players_per_match('assists', top_n)
 
     def get_cs_by_season(self):
         team = self.team
@@ -675,28 +524,7 @@ class TeamStatsSource:
         )
 
     def get_top_players_by_cs_per_match(self, top_n=5):
-        team = self.team
-        cs_subquery = (
-            OtherEvents.objects.cs()
-            .filter(author=OuterRef('id'), team=team)
-            .order_by()
-            .values('author')
-            .annotate(c=Count('id', distinct=True))
-            .values('c')
-        )
-
-        return (
-            self._get_players_with_matches()
-            .annotate(
-                cs=Coalesce(Subquery(cs_subquery), 0),
-            )
-            .filter(matches__gte=10, cs__gt=0)
-            .annotate(
-                cs_per_match=Cast(F('cs'), FloatField()) / F('matches')
-            )
-            .order_by('-cs_per_match')
-            [:top_n]
-        )
+        return self._get_top_players_per_match('cs', top_n)
 
     def get_cards_by_season(self):
         team = self.team
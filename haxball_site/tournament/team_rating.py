@@ -0,0 +1,240 @@
+import datetime
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .aggregates import on_commit_once
+from .cache import RATING, bump_revisions, cached_by_revision
+from .models import League, Match, RatingVersion, Season, SeasonTeamRating, Team, TeamRating
+
+# В рейтинге учитываются только сезоны после 5-го
+FIRST_RATED_SEASON = 6
+# Вес сезона по давности: текущий ЧР и два предыдущих целиком, дальше по убыванию
+SEASON_WEIGHTS = (1, 1, 1, 0.9, 0.8, 0.7)
+LEAGUE_WEIGHTS = {
+    League.TOP_TIER: 1,
+    League.TOP_TIER_CUP: 1,
+    League.NATIONAL_CUP: 0.75,
+    League.CHAMPIONS_LEAGUE: 0.75,
+    League.FIRST_TIER: 0.5,
+    League.FIRST_TIER_CUP: 0.5,
+    League.SECOND_TIER: 0.25,
+    League.SECOND_TIER_CUP: 0.25,
+}
+
+
+def is_rated(season):
+    return season.number >= FIRST_RATED_SEASON and season.title.startswith('ЧР')
+
+
+def load_seasons():
+    """Все сезоны одним запросом, от последнего к первому - цепочки рейтинга строятся по ним в памяти."""
+    return list(Season.objects.order_by('-number'))
+
+
+def season_weights(source_season, seasons):
+    """
+    {сезон: вес} для рейтинга на конец source_season: сам сезон и пять предыдущих ЧР,
+    связанные с ними сезоны (ЛЧ и т.п.) идут с тем же весом.
+    """
+    seasons_by_id = {season.id: season for season in seasons}
+    chain = [season for season in seasons if is_rated(season) and season.number <= source_season.number]
+    weights = {}
+    for season, weight in zip(chain, SEASON_WEIGHTS):
+        weights[season] = weight
+        bound_season = seasons_by_id.get(season.bound_season_id)
+        if bound_season is not None:
+            weights[bound_season] = weight
+    return weights
+
+
+def _side_results(seasons, side, opponent):
+    return (
+        Match.objects.filter(
+            league__championship__in=seasons, league__tournament_type__in=LEAGUE_WEIGHTS, is_played=True
+        )
+        .order_by()
+        .values(season=F('league__championship'), tournament_type=F('league__tournament_type'), team=F(f'team_{side}'))
+        .annotate(
+            wins=Count('id', filter=Q(**{f'score_{side}__gt': F(f'score_{opponent}')})),
+            draws=Count('id', filter=Q(score_home=F('score_guest'))),
+        )
+    )
+
+
+def season_points(seasons):
+    """
+    Очки за матчи {(id сезона, id команды): очки} одним запросом: победы и ничьи команды
+    по каждому типу турнира сезона, победа - 1, ничья - 0.5, умноженные на вес турнира.
+    """
+    points = defaultdict(float)
+    rows = _side_results(seasons, 'home', 'guest').union(_side_results(seasons, 'guest', 'home'), all=True)
+    for row in rows:
+        weight = LEAGUE_WEIGHTS[row['tournament_type']]
+        points[row['season'], row['team']] += (row['wins'] + row['draws'] * 0.5) * weight
+    return points
+
+
+def refresh_season_points(seasons):
+    """Пересчитывает очки за матчи сезонов, очки за итоговый результат (вносятся вручную) не трогает."""
+    points = season_points(seasons)
+    to_update, duplicates, stored = [], [], set()
+    for rating in SeasonTeamRating.objects.filter(season__in=seasons):
+        key = (rating.season_id, rating.team_id)
+        if key in stored:
+            duplicates.append(rating.id)
+            continue
+        stored.add(key)
+        rating.points_for_matches = points.get(key, 0)
+        to_update.append(rating)
+
+    SeasonTeamRating.objects.filter(id__in=duplicates).delete()
+    SeasonTeamRating.objects.bulk_update(to_update, ['points_for_matches'])
+    SeasonTeamRating.objects.bulk_create(
+        SeasonTeamRating(season_id=season_id, team_id=team_id, points_for_matches=value)
+        for (season_id, team_id), value in points.items()
+        if (season_id, team_id) not in stored
+    )
+
+
+def season_ratings(seasons):
+    """{сезон: {id команды: очки за сезон}} по сохраненному сезонному рейтингу."""
+    seasons_by_id = {season.id: season for season in seasons}
+    ratings = defaultdict(dict)
+    rows = SeasonTeamRating.objects.filter(season__in=seasons).values_list(
+        'season', 'team', 'points_for_matches', 'points_for_result'
+    )
+    for season_id, team_id, points_for_matches, points_for_result in rows:
+        ratings[seasons_by_id[season_id]][team_id] = points_for_matches + points_for_result
+    return ratings
+
+
+def weighted_ratings(weights, ratings):
+    """{сезон: {id команды: очки с весом сезона}} в порядке сезонов."""
+    return {
+        season: {team_id: round(points * weights[season], 2) for team_id, points in ratings[season].items()}
+        for season in sorted(weights, key=lambda season: season.number)
+    }
+
+
+def build_rating(weighted):
+    totals = defaultdict(float)
+    for season_rating in weighted.values():
+        for team_id, points in season_rating.items():
+            totals[team_id] += points
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def refresh_team_rating(rebuild=False):
+    """
+    Создает версии рейтинга для завершенных ЧР, у которых их еще нет, с rebuild - пересчитывает все.
+    Очки за матчи пересчитываются только у сезонов без сохраненного рейтинга и у самих новых сезонов.
+    Возвращает пересчитанные версии.
+    """
+    seasons = load_seasons()
+    versions = {version.related_season_id: version for version in RatingVersion.objects.all()}
+    closed = [season for season in reversed(seasons) if is_rated(season) and not season.is_active]
+    pending = closed if rebuild else [season for season in closed if season.id not in versions]
+    if not pending:
+        return []
+
+    weights = {source_season: season_weights(source_season, seasons) for source_season in pending}
+    chain_seasons = {season for season_weight in weights.values() for season in season_weight}
+    if rebuild:
+        stale = chain_seasons
+    else:
+        stored = set(SeasonTeamRating.objects.filter(season__in=chain_seasons).values_list('season', flat=True))
+        stale = {season for season in chain_seasons if season.id not in stored}
+        # Только что завершившиеся сезоны считаем заново, даже если по ним уже что-то сохранено
+        for source_season in pending:
+            bound = (source_season.id, source_season.bound_season_id)
+            stale.update(season for season in weights[source_season] if season.id in bound)
+
+    next_number = max((version.number for version in versions.values()), default=0) + 1
+    new_versions = []
+    for source_season in pending:
+        if source_season.id not in versions:
+            versions[source_season.id] = RatingVersion(
+                number=next_number, date=datetime.date.today(), related_season=source_season
+            )
+            new_versions.append(versions[source_season.id])
+            next_number += 1
+    pending_versions = [versions[source_season.id] for source_season in pending]
+
+    with transaction.atomic():
+        refresh_season_points(stale)
+        ratings = season_ratings(chain_seasons)
+        RatingVersion.objects.bulk_create(new_versions)
+        store_ratings({versions[source_season.id]: weights[source_season] for source_season in pending}, ratings)
+    return pending_versions
+
+
+def store_ratings(version_weights, ratings):
+    """Перезаписывает места и итоговые очки команд в версиях рейтинга {версия: веса сезонов}."""
+    versions = list(version_weights)
+    TeamRating.objects.filter(version__in=versions).delete()
+    TeamRating.objects.bulk_create(
+        TeamRating(version=version, rank=rank, team_id=team_id, total_points=total_points)
+        for version, weights in version_weights.items()
+        for rank, (team_id, total_points) in enumerate(build_rating(weighted_ratings(weights, ratings)), 1)
+    )
+    transaction.on_commit(lambda: bump_revisions(RATING, [version.number for version in versions]))
+
+
+def refresh_season_ratings(season_ids):
+    """
+    Пересчитывает итоговый рейтинг версий, в цепочку которых входят сезоны: очки за результат вносятся вручную
+    уже после создания версии, и без пересчета места и итоговые очки не сходились бы с очками по сезонам.
+    """
+    seasons = load_seasons()
+    seasons_by_id = {season.id: season for season in seasons}
+    version_weights = {}
+    for version in RatingVersion.objects.all():
+        source_season = seasons_by_id.get(version.related_season_id)
+        if source_season is None:
+            continue
+        weights = season_weights(source_season, seasons)
+        if any(season.id in season_ids for season in weights):
+            version_weights[version] = weights
+    if not version_weights:
+        return []
+
+    with transaction.atomic():
+        ratings = season_ratings({season for weights in version_weights.values() for season in weights})
+        store_ratings(version_weights, ratings)
+    return list(version_weights)
+
+
+@cached_by_revision(RATING, lambda version: version.number)
+def weighted_seasons_rating(version):
+    """
+    Очки команд по сезонам с учетом веса сезона для таблицы версии рейтинга: ({сезон: {команда: очки}}, веса).
+    Считается один раз на версию и хранится в кэше до пересчета рейтинга.
+    """
+    seasons = load_seasons()
+    source_season = next(season for season in seasons if season.id == version.related_season_id)
+    weights = season_weights(source_season, seasons)
+    weighted = weighted_ratings(weights, season_ratings(weights))
+    teams = Team.objects.in_bulk({team_id for season_rating in weighted.values() for team_id in season_rating})
+    seasons_rating = {
+        season: {teams[team_id]: points for team_id, points in season_rating.items()}
+        for season, season_rating in weighted.items()
+    }
+    return seasons_rating, weights
+
+
+@receiver(post_save, sender=Season)
+def update_on_season_close(sender, instance, **kwargs):
+    if is_rated(instance) and not instance.is_active:
+        on_commit_once(('team_rating',), refresh_team_rating)
+
+
+@receiver(post_save, sender=SeasonTeamRating)
+@receiver(post_delete, sender=SeasonTeamRating)
+def update_on_season_rating_change(sender, instance, **kwargs):
+    season_id = instance.season_id
+    on_commit_once(('season_team_rating', season_id), partial(refresh_season_ratings, {season_id}))
@@ -8,6 +8,7 @@ from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, QuerySet,
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from ..cache import LEAGUE, TEAM, cached_by_revision
 from ..models import (
     Disqualification,
     FreeAgent,
@@ -23,6 +24,7 @@ from ..models import (
     Team,
     TourNumber,
 )
+from ..standings import get_league_table, get_team_position
 
 register = template.Library()
 
@@ -219,6 +221,7 @@ def cup_table(league):
 
 
 @register.filter
+@cached_by_revision(LEAGUE, lambda tour: tour.league_id, get_key_id=lambda tour: tour.id)
 def pairs_in_round(tour):
     matches = Match.objects.filter(numb_tour=tour).order_by('id')
     pairs = {}
@@ -281,6 +284,7 @@ def league_table(league: League):
 
 
 @register.filter
+@cached_by_revision(LEAGUE, lambda league: league.id)
 def top_goalscorers(league):
     return (
         Player.objects.select_related('team', 'name__user_profile')
@@ -291,6 +295,7 @@ def top_goalscorers(league):
 
 
 @register.filter
+@cached_by_revision(LEAGUE, lambda league: league.id)
 def top_assistent(league):
     return (
         Player.objects.select_related('team', 'name__user_profile')
@@ -301,6 +306,7 @@ def top_assistent(league):
 
 
 @register.filter
+@cached_by_revision(LEAGUE, lambda league: league.id)
 def top_clean_sheets(league):
     return (
         Player.objects.select_related('team', 'name__user_profile')
@@ -327,6 +333,7 @@ def all_league_season(team, season):
 
 
 @register.filter
+@cached_by_revision(TEAM, lambda team: team.id)
 def all_seasons(team):
     return (
         Season.objects.filter(tournaments_in_season__teams=team)
@@ -358,127 +365,6 @@ def sort_teams(league: League):
     return [i[0] for i in lt]
 
 
-def get_league_table(league: League):
-    teams = list(Team.objects.filter(leagues=league))
-    teams_count = len(teams)
-    points = [0 for _ in range(teams_count)]  # Количество очков
-    goal_diff = [0 for _ in range(teams_count)]  # Разница мячей
-    scored = [0 for _ in range(teams_count)]  # Мячей забито
-    conceded = [0 for _ in range(teams_count)]  # Мячей пропущено
-    matches_played = [0 for _ in range(teams_count)]  # Игр сыграно
-    wins = [0 for _ in range(teams_count)]  # Побед
-    draws = [0 for _ in range(teams_count)]  # Ничей
-    losses = [0 for _ in range(teams_count)]  # Поражений
-    last_matches = [[] for _ in range(teams_count)]
-    for i, team in enumerate(teams):
-        matches = Match.objects.select_related('team_home', 'team_guest', 'result__winner', 'numb_tour').filter(
-            (Q(team_home=team) | Q(team_guest=team)), league=league, is_played=True
-        )
-        matches_played[i] = matches.count()
-
-        wins_count = 0
-        draws_count = 0
-        losses_count = 0
-        goals_scored = 0
-        goals_conceded = 0
-        for match in matches:
-            goals_scored += match.scored_by(team)
-            goals_conceded += match.conceded_by(team)
-
-            if match.is_win(team):
-                wins_count += 1
-                last_matches[i].append((match, 1))
-            elif match.is_draw():
-                draws_count += 1
-                last_matches[i].append((match, 0))
-            else:
-                losses_count += 1
-                last_matches[i].append((match, -1))
-
-        last_matches[i] = sorted(last_matches[i], key=lambda x: x[0].numb_tour.number)[-5:]
-        points[i] = wins_count * 3 + draws_count * 1
-        goal_diff[i] = goals_scored - goals_conceded
-        scored[i] = goals_scored
-        conceded[i] = goals_conceded
-        wins[i] = wins_count
-        losses[i] = losses_count
-        draws[i] = draws_count
-
-    table = zip(teams, matches_played, wins, draws, losses, scored, conceded, goal_diff, points, last_matches)
-    sorted_table = sorted(table, key=lambda x: (x[8], x[7], x[5]), reverse=True)
-
-    result = []
-    i = 0
-    while i < len(sorted_table) - 1:
-        mini_table = [sorted_table[i][0]]
-        mini_res = [sorted_table[i]]
-        k = i
-        for j in range(i + 1, len(sorted_table)):
-            if sorted_table[i][8] == sorted_table[j][8]:
-                mini_table.append(sorted_table[j][0])
-                mini_res.append(sorted_table[j])
-                k += 1
-            else:
-                k += 1
-                break
-        if len(mini_table) >= 2:
-            teams_count = len(mini_table)
-            points = [0 for _ in range(teams_count)]  # Количество очков
-            goal_diff = [0 for _ in range(teams_count)]  # Разница мячей
-            scored = [0 for _ in range(teams_count)]  # Мячей забито
-            conceded = [0 for _ in range(teams_count)]  # Мячей пропущено
-            matches_played = [0 for _ in range(teams_count)]  # Игр сыграно
-            wins = [0 for _ in range(teams_count)]  # Побед
-            draws = [0 for _ in range(teams_count)]  # Ничей
-            losses = [0 for _ in range(teams_count)]  # Поражений
-            for i, team in enumerate(mini_table):
-                matches = []
-                matches_all = Match.objects.filter(
-                    (Q(team_home=team) | Q(team_guest=team)), league=league, is_played=True
-                )
-                for match in matches_all:
-                    if (match.team_home in mini_table) and (match.team_guest in mini_table):
-                        matches.append(match)
-                matches_played[i] = len(matches)
-
-                wins_count = 0
-                draws_count = 0
-                losses_count = 0
-                goals_scored = 0
-                goals_conceded = 0
-                for match in matches:
-                    goals_scored += match.scored_by(team)
-                    goals_conceded += match.conceded_by(team)
-
-                    if match.is_win(team):
-                        wins_count += 1
-                    elif match.is_draw():
-                        draws_count += 1
-                    else:
-                        losses_count += 1
-                points[i] = wins_count * 3 + draws_count * 1
-                goal_diff[i] = goals_scored - goals_conceded
-                scored[i] = goals_scored
-                conceded[i] = goals_conceded
-                wins[i] = wins_count
-                losses[i] = losses_count
-                draws[i] = draws_count
-            table = zip(mini_table, matches_played, wins, draws, losses, scored, conceded, goal_diff, points)
-            lss = sorted(table, key=lambda x: (x[8], x[7], x[5]), reverse=True)
-            for lll in lss:
-                for h in mini_res:
-                    if lll[0] == h[0]:
-                        result.append(h)
-                        break
-        else:
-            result.append(mini_res[0])
-        i = k
-    if len(result) < len(sorted_table):
-        result.append(sorted_table[len(sorted_table) - 1])
-
-    return result
-
-
 @register.filter
 def current_league(team):
     primary_leagues = ['Высшая лига', 'Первая лига', 'Вторая лига']
@@ -498,8 +384,7 @@ def current_position(team):
     if not league:
         return '-'
 
-    sorted_teams = list(sort_teams(league))
-    return sorted_teams.index(team) + 1
+    return get_team_position(league, team)
 
 
 @register.filter
@@ -512,6 +397,7 @@ def teams_in_league_count(team):
 
 
 @register.filter
+@cached_by_revision(TEAM, lambda team: team.id)
 def team_achievements_by_season(team):
     achievements = team.achievements.select_related('season').all()
     achievements_by_season = dict()
@@ -521,7 +407,7 @@ def team_achievements_by_season(team):
             achievements_by_season[season] = list()
         achievements_by_season[season].append(achievement)
 
-    return achievements_by_season.items()
+    return list(achievements_by_season.items())
 
 
 @register.filter
@@ -16,9 +16,11 @@ from .views import (
     halloffame,
     player_detailed_statistics,
     player_statistics_charts,
+    player_statistics_charts_data,
     remove_entry,
     team_statistics,
     team_statistics_charts,
+    team_statistics_charts_data,
     update_entry, CardsList,
 )
 
@@ -44,6 +46,8 @@ urlpatterns = [
     path('match/<int:pk>', MatchDetail.as_view(), name='match_detail'),
     path('player_stats/<int:pk>', player_detailed_statistics, name='player_stats'),
     path('player_stats/<int:pk>/charts', player_statistics_charts, name='player_stats_charts'),
+    path('player_stats/<int:pk>/charts/<str:section>', player_statistics_charts_data, name='player_stats_charts_data'),
     path('team_stats/<int:pk>', team_statistics, name='team_stats'),
     path('team_stats/<int:pk>/charts', team_statistics_charts, name='team_stats_charts'),
+    path('team_stats/<int:pk>/charts/<str:section>', team_statistics_charts_data, name='team_stats_charts_data'),
 ]
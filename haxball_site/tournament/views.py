@@ -7,37 +7,55 @@ from core.utils import get_comments_for_object, get_paginated_comments
 from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.paginator import Paginator
-from django.db.models import Count, Exists, F, FloatField, OuterRef, Prefetch, Q, Subquery
-from django.db.models.functions import Cast, Coalesce
-from django.http import HttpResponse
+from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.utils import timezone
 from django.views import View
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.views.generic import DetailView, ListView
 from django_filters import ChoiceFilter, FilterSet, ModelChoiceFilter
 
-from .charts import StatCharts
+from .aggregates import (
+    PLAYER_STAT_FIELDS,
+    TEAM_RECORD_MATCHES,
+    TEAM_RECORD_PLAYERS,
+    TEAM_STAT_FIELDS,
+    get_team_records,
+)
+from .cache import PLAYER, TEAM
+from .charts import (
+    CHART_SECTIONS,
+    PLAYER_CHARTS,
+    SECTION_TITLES,
+    TEAM_CHARTS,
+    chart_data_etag,
+    player_chart_data,
+    team_chart_data,
+)
 from .forms import EditTeamProfileForm, FreeAgentForm
+from .halloffame import get_hall_of_fame
 from .models import (
     Disqualification,
     FreeAgent,
     Goal,
+    HallOfFameEntry,
     League,
     Match,
-    MatchResult,
     OtherEvents,
     Player,
+    PlayerSeasonStats,
     PlayerTransfer,
     Postponement,
     RatingVersion,
     Season,
-    SeasonTeamRating,
-    Substitution,
     Team,
     TeamRating,
+    TeamSeasonStats,
 )
+from .team_rating import weighted_seasons_rating
 from .templatetags.tournament_extras import get_user_teams
 
 
@@ -420,26 +438,31 @@ class MatchDetail(DetailView):
         context['team_home_substitutes'] = substitutes[match.team_home]
         context['team_guest_substitutes'] = substitutes[match.team_guest]
 
-        goals = match.match_goal.values('author').annotate(goals=Count('author')).order_by('author')
-        goals_by_player = {d['author']: d['goals'] for d in goals}
+        # Счетчики матча позволяют не ходить в базу за пустыми разбивками
+        goals_by_player, assists_by_player, clean_sheets_by_player = {}, {}, {}
+        if match.goals_count:
+            goals = match.match_goal.values('author').annotate(goals=Count('author')).order_by('author')
+            goals_by_player = {d['author']: d['goals'] for d in goals}
         context['goals_by_player'] = goals_by_player
 
-        assists = (
-            match.match_goal.exclude(assistent=None)
-            .values('assistent')
-            .annotate(assists=Count('assistent'))
-            .order_by('assistent')
-        )
-        assists_by_player = {d['assistent']: d['assists'] for d in assists}
+        if match.assists_count:
+            assists = (
+                match.match_goal.exclude(assistent=None)
+                .values('assistent')
+                .annotate(assists=Count('assistent'))
+                .order_by('assistent')
+            )
+            assists_by_player = {d['assistent']: d['assists'] for d in assists}
         context['assists_by_player'] = assists_by_player
 
-        clean_sheets = (
-            match.match_event.filter(event=OtherEvents.CLEAN_SHEET)
-            .values('author')
-            .annotate(cs=Count('author'))
-            .order_by('author')
-        )
-        clean_sheets_by_player = {d['author']: d['cs'] for d in clean_sheets}
+        if match.clean_sheets_count:
+            clean_sheets = (
+                match.match_event.filter(event=OtherEvents.CLEAN_SHEET)
+                .values('author')
+                .annotate(cs=Count('author'))
+                .order_by('author')
+            )
+            clean_sheets_by_player = {d['author']: d['cs'] for d in clean_sheets}
         context['clean_sheets_by_player'] = clean_sheets_by_player
 
         time_played = defaultdict(int)
@@ -463,6 +486,7 @@ class MatchDetail(DetailView):
 
         cards = match.cards().select_related('author', 'team')
         context['cards'] = cards
+        context['replay_indexes'] = match.replay_indexes.filter(error='').select_related('replay')
 
         if all_matches_between.count() == 0:
             context['no_history'] = True
@@ -653,197 +677,12 @@ def cancel_postponement(request, pk):
 
 
 def halloffame(request):
-    players = players_halloffame()
-    teams = teams_halloffame()
+    players = get_hall_of_fame(HallOfFameEntry.PLAYERS)
+    teams = get_hall_of_fame(HallOfFameEntry.TEAMS)
 
     return render(request, 'tournament/hall_of_fame.html', {'players': players, 'teams': teams})
 
 
-def players_halloffame():
-    players = Player.objects.select_related('team', 'name__user_profile')
-
-    top_goalscorers = (
-        players.annotate(goals_count=Count('goals__match__league'))
-        .filter(goals_count__gt=0)
-        .order_by('-goals_count')
-    )
-
-    top_assistants = (
-        players.annotate(assists_count=Count('assists__match__league'))
-        .filter(assists_count__gt=0)
-        .order_by('-assists_count')
-    )
-
-    top_cs = (
-        players.filter(event__event=OtherEvents.CLEAN_SHEET)
-        .annotate(cs_count=Count('event__match__league'))
-        .filter(cs_count__gt=0)
-        .order_by('-cs_count')
-    )
-
-    top_ogs = (
-        players.filter(event__event=OtherEvents.OWN_GOAL)
-        .annotate(og_count=Count('event__match__league'))
-        .filter(og_count__gt=0)
-        .order_by('-og_count')
-    )
-
-    top_yellow_cards = (
-        players.filter(event__event=OtherEvents.YELLOW_CARD)
-        .annotate(yellow_cards_count=Count('event__match__league'))
-        .filter(yellow_cards_count__gt=0)
-        .order_by('-yellow_cards_count')
-    )
-
-    top_red_cards = (
-        players.filter(event__event=OtherEvents.RED_CARD)
-        .annotate(red_cards_count=Count('event__match__league'))
-        .filter(red_cards_count__gt=0)
-        .order_by('-red_cards_count')
-    )
-
-    top_subs_in = (
-        players
-        .annotate(subs_in_count=Count('join_game__player_in'))
-        .filter(subs_in_count__gt=0)
-        .order_by('-subs_in_count')
-    )
-
-    top_subs_out = (
-        players
-        .annotate(subs_out_count=Count('replaced__player_out'))
-        .filter(subs_out_count__gt=0)
-        .order_by('-subs_out_count')
-    )
-
-    home_matches_subquery = (
-        Match.objects.filter(team_home_start=OuterRef('id'), is_played=True)
-        .order_by().values('team_home_start')
-        .annotate(c=Count('*')).values('c')
-    )
-    guest_matches_subquery = (
-        Match.objects.filter(team_guest_start=OuterRef('id'), is_played=True)
-        .order_by().values('team_guest_start')
-        .annotate(c=Count('*')).values('c')
-    )
-
-    sub_matches_subquery = (
-        Match.objects.filter(~(Q(team_guest_start=OuterRef('id')) | Q(team_home_start=OuterRef('id'))),
-                             match_substitutions__player_in=OuterRef('id'), is_played=True)
-        .order_by().values('match_substitutions__player_in')
-        .annotate(c=Count('*')).values('c')
-    )
-
-    top_matches = (
-        players
-        .annotate(home_matches_count=Coalesce(Subquery(home_matches_subquery), 0),
-                  guest_matches_count=Coalesce(Subquery(guest_matches_subquery), 0),
-                  sub_matches_count=Coalesce(Subquery(sub_matches_subquery), 0),
-                  matches_count=F('home_matches_count') + F('guest_matches_count') + F('sub_matches_count'))
-        .filter(matches_count__gt=0)
-        .order_by('-matches_count'))
-
-    return {
-        'goals': top_goalscorers,
-        'assists': top_assistants,
-        'clean_sheets': top_cs,
-        'yellow_cards': top_yellow_cards,
-        'red_cards': top_red_cards,
-        'ogs': top_ogs,
-        'player_matches': top_matches,
-        'subs_in': top_subs_in,
-        'subs_out': top_subs_out,
-    }
-
-
-def teams_halloffame():
-    top_goalscorers = (
-        Team.objects.annotate(goals_count=Count('goals__match__league'))
-        .filter(goals_count__gt=0)
-        .order_by('-goals_count')
-    )
-
-    top_assistants = (
-        Team.objects.annotate(assists_count=Count('goals__match__league', filter=Q(goals__assistent__isnull=False)))
-        .filter(assists_count__gt=0)
-        .order_by('-assists_count')
-    )
-
-    top_cs = (
-        Team.objects.filter(team_events__event=OtherEvents.CLEAN_SHEET)
-        .annotate(cs_count=Count('team_events__match__league'))
-        .filter(cs_count__gt=0)
-        .order_by('-cs_count')
-    )
-
-    top_ogs = (
-        Team.objects.filter(team_events__event=OtherEvents.OWN_GOAL)
-        .annotate(og_count=Count('team_events__match__league'))
-        .filter(og_count__gt=0)
-        .order_by('-og_count')
-    )
-
-    top_yellow_cards = (
-        Team.objects.filter(team_events__event=OtherEvents.YELLOW_CARD)
-        .annotate(yellow_cards_count=Count('team_events__match__league'))
-        .filter(yellow_cards_count__gt=0)
-        .order_by('-yellow_cards_count')
-    )
-
-    top_red_cards = (
-        Team.objects.filter(team_events__event=OtherEvents.RED_CARD)
-        .annotate(red_cards_count=Count('team_events__match__league'))
-        .filter(red_cards_count__gt=0)
-        .order_by('-red_cards_count')
-    )
-
-    top_subs = (
-        Team.objects
-        .annotate(subs_count=Count('substitutions'))
-        .filter(subs_count__gt=0)
-        .order_by('-subs_count')
-    )
-
-    home_matches_subquery = (
-        Match.objects.filter(team_home=OuterRef('id'), is_played=True)
-        .order_by().values('team_home')
-        .annotate(c=Count('*')).values('c')
-    )
-    guest_matches_subquery = (
-        Match.objects.filter(team_guest=OuterRef('id'), is_played=True)
-        .order_by().values('team_guest')
-        .annotate(c=Count('*')).values('c')
-    )
-
-    matches = (
-        Team.objects
-        .annotate(home_matches_count=Coalesce(Subquery(home_matches_subquery), 0),
-                  guest_matches_count=Coalesce(Subquery(guest_matches_subquery), 0),
-                  matches_count=F('home_matches_count') + F('guest_matches_count'))
-        .filter(matches_count__gt=0)
-        .annotate(wins_count=Count('won_matches'),
-                  winrate=Cast(F('wins_count'), FloatField()) / F('matches_count') * 100)
-        .order_by()
-    )
-
-    top_matches = matches.order_by('-matches_count')
-    top_wins = matches.order_by('-wins_count')
-    top_winrate = matches.filter(matches_count__gt=10).order_by('-winrate')
-
-    return {
-        'goals': top_goalscorers,
-        'assists': top_assistants,
-        'clean_sheets': top_cs,
-        'yellow_cards': top_yellow_cards,
-        'red_cards': top_red_cards,
-        'ogs': top_ogs,
-        'team_matches': top_matches,
-        'wins': top_wins,
-        'winrates': top_winrate,
-        'subs': top_subs,
-    }
-
-
 class TeamRatingFilter(FilterSet):
     version = ModelChoiceFilter(
         queryset=RatingVersion.objects.select_related('related_season').all(), label='Версия', empty_label=None
@@ -857,31 +696,19 @@ class TeamRatingFilter(FilterSet):
 class TeamRatingView(ListView):
     queryset = TeamRating.objects.select_related('team').all()
     template_name = 'tournament/team_rating.html'
-    latest_rating_version = RatingVersion.objects.order_by('-number').first()
 
     def get(self, request,  **kwargs):
-        params = request.GET or {'version': self.latest_rating_version.number}
+        params = request.GET or {'version': RatingVersion.objects.order_by('-number').first().number}
         filter = TeamRatingFilter(params, queryset=self.queryset)
         selected_version = int(params['version'])
-        source_season = (
-            RatingVersion.objects.select_related('related_season').get(number=selected_version).related_season
-        )
-        previous_seasons = Season.objects.filter(
-            number__lt=source_season.number, number__gt=5, title__contains='ЧР'
-        ).order_by('-number')
-        earliest_season_taken_into_account = None
-        if previous_seasons.count() > 0:
-            earliest_season_taken_into_account = list(previous_seasons[:5])[-1]
-
-        seasons_weights = self.get_seasons_weights(source_season, earliest_season_taken_into_account)
-        seasons = list(sorted(seasons_weights, key=lambda s: s.number))
-        weighted_seasons_rating = self.get_weighted_seasons_rating(seasons, seasons_weights)
+        rating_version = get_object_or_404(RatingVersion, number=selected_version)
+        seasons_rating, seasons_weights = weighted_seasons_rating(rating_version)
 
         previous_rating_version = TeamRating.objects.select_related('team').filter(version__number=selected_version - 1)
         previous_rating = {item.team: item.rank for item in previous_rating_version.all()}
 
         context = {
-            'seasons_rating': weighted_seasons_rating,
+            'seasons_rating': seasons_rating,
             'seasons_weights': seasons_weights,
             'previous_rating': previous_rating,
             'filter': filter,
@@ -892,45 +719,6 @@ class TeamRatingView(ListView):
 
         return render(request, self.template_name, context)
 
-    @staticmethod
-    def get_seasons_weights(source_season, earliest_season):
-        weights = [1, 1, 1, 0.9, 0.8, 0.7]
-        season_weights = {source_season: 1}
-        season_count = 1
-        if earliest_season:
-            previous_seasons = (
-                Season.objects.select_related('bound_season')
-                .filter(number__gte=earliest_season.number, number__lt=source_season.number)
-                .order_by('-number')
-            )
-            for season in previous_seasons:
-                if season.title.startswith('ЧР'):
-                    season_weights[season] = weights[season_count]
-                    if season.bound_season:
-                        season_weights[season.bound_season] = weights[season_count]
-                    season_count += 1
-
-        return season_weights
-
-    @staticmethod
-    def get_weighted_seasons_rating(seasons, seasons_weights):
-        weighted_seasons_rating = {}
-        seasons_rating = (
-            SeasonTeamRating.objects.select_related('team', 'season')
-            .filter(season__in=seasons)
-            .order_by('season__number')
-        )
-        for rating_entry in seasons_rating:
-            season = rating_entry.season
-            season_weight = seasons_weights[season]
-            team = rating_entry.team
-            if season not in weighted_seasons_rating:
-                weighted_seasons_rating[season] = {}
-            if team not in weighted_seasons_rating[season]:
-                weighted_seasons_rating[season][team] = round(rating_entry.total_points() * season_weight, 2)
-
-        return weighted_seasons_rating
-
 
 def player_detailed_statistics(request, pk):
     user = User.objects.filter(id=pk).select_related('user_player').first()
@@ -939,108 +727,36 @@ def player_detailed_statistics(request, pk):
     except:
         return HttpResponse(200)
 
-    prefetches = (
-        Prefetch('match_goal', queryset=Goal.objects.filter(author=player, match__is_played=True), to_attr='goals'),
-        Prefetch(
-            'match_goal', queryset=Goal.objects.filter(assistent=player, match__is_played=True), to_attr='assists'
-        ),
-        Prefetch(
-            'match_event', queryset=OtherEvents.objects.cs().filter(author=player, match__is_played=True), to_attr='cs'
-        ),
-        Prefetch(
-            'match_event',
-            queryset=Substitution.objects.filter(player_out=player, match__is_played=True),
-            to_attr='subs_out',
-        ),
-        Prefetch(
-            'match_event',
-            queryset=Substitution.objects.filter(player_in=player, match__is_played=True),
-            to_attr='subs_in',
-        ),
-        Prefetch(
-            'match_event',
-            queryset=OtherEvents.objects.ogs().filter(author=player, match__is_played=True),
-            to_attr='ogs',
-        ),
-        Prefetch(
-            'match_event',
-            queryset=OtherEvents.objects.yellow_cards().filter(author=player, match__is_played=True),
-            to_attr='yellow_cards',
-        ),
-        Prefetch(
-            'match_event',
-            queryset=OtherEvents.objects.red_cards().filter(author=player, match__is_played=True),
-            to_attr='red_cards',
-        ),
-    )
-
-    matches = Match.objects.select_related('league__championship')
-    home_matches = (
-        matches.filter(team_home_start=player, is_played=True)
-        .select_related('league__championship')
-        .prefetch_related(Prefetch('team_home', to_attr='player_team'), *prefetches)
-    )
-    guest_matches = (
-        matches.filter(team_guest_start=player, is_played=True)
-        .select_related('league__championship')
-        .prefetch_related(Prefetch('team_guest', to_attr='player_team'), *prefetches)
-    )
-    sub_matches = (
-        Match.objects.filter(
-            ~(Q(team_guest_start=player) | Q(team_home_start=player)),
-            is_played=True,
-            match_substitutions__player_in=player,
-        )
-        .select_related('league__championship')
-        .prefetch_related(
-            Prefetch(
-                'match_substitutions',
-                queryset=Substitution.objects.filter(player_in=player, match__is_played=True).select_related('team'),
-                to_attr='player_subs',
-            ),
-            *prefetches,
-        )
-    )
-
-    all_matches = list(sub_matches) + list(home_matches) + list(guest_matches)
+    player_stats = PlayerSeasonStats.objects.filter(player=player).select_related('season', 'team', 'league')
 
     stats_by_season = defaultdict(lambda: defaultdict(lambda: defaultdict(lambda: defaultdict(int))))
-    for match in all_matches:
-        team = match.player_team if hasattr(match, 'player_team') else match.player_subs[0].team
-        league = match.league
-        season = league.championship
-
-        stats_by_league = stats_by_season[season][team][league]
-        stats_by_league['matches'] += 1
-        stats_by_league['goals'] += len(match.goals)
-        stats_by_league['assists'] += len(match.assists)
-        stats_by_league['goals_assists'] += len(match.goals) + len(match.assists)
-        stats_by_league['cs'] += len(match.cs)
-        stats_by_league['subs_out'] += len(match.subs_out)
-        stats_by_league['subs_in'] += len(match.subs_in)
-        stats_by_league['ogs'] += len(match.ogs)
-        stats_by_league['yellow_cards'] += len(match.yellow_cards)
-        stats_by_league['red_cards'] += len(match.red_cards)
-
-    all_goals = Goal.objects.filter(author=player, match__is_played=True)
-    all_assists = Goal.objects.filter(assistent=player, match__is_played=True)
-    all_clean_sheets = OtherEvents.objects.cs().filter(author=player, match__is_played=True)
-    all_subs_out = Substitution.objects.filter(player_out=player, match__is_played=True)
-    all_subs_in = Substitution.objects.filter(player_in=player, match__is_played=True)
-    all_ogs = OtherEvents.objects.ogs().filter(author=player, match__is_played=True)
-    all_yellow_cards = OtherEvents.objects.yellow_cards().filter(author=player, match__is_played=True)
-    all_red_cards = OtherEvents.objects.red_cards().filter(author=player, match__is_played=True)
-
-    overall_matches = len(all_matches)
-    overall_goals = all_goals.count()
-    overall_assists = all_assists.count()
-    overall_goals_assists = overall_goals + overall_assists
-    overall_clean_sheets = all_clean_sheets.count()
-    overall_subs_out = all_subs_out.count()
-    overall_subs_in = all_subs_in.count()
-    overall_ogs = all_ogs.count()
-    overall_yellow_cards = all_yellow_cards.count()
-    overall_red_cards = all_red_cards.count()
+    totals = defaultdict(int)
+    totals_by_season = defaultdict(lambda: defaultdict(int))
+    seasons = {}
+    for row in player_stats:
+        row.goals_assists = row.goals + row.assists
+        for field in PLAYER_STAT_FIELDS:
+            totals[field] += getattr(row, field)
+            totals_by_season[row.season_id][field] += getattr(row, field)
+        seasons[row.season_id] = row.season
+
+        # события в матчах, где игрока нет в составе, идут только в общую статистику
+        if row.matches == 0:
+            continue
+        stats_by_league = stats_by_season[row.season][row.team][row.league]
+        for field in PLAYER_STAT_FIELDS:
+            stats_by_league[field] += getattr(row, field)
+
+    overall_matches = totals['matches']
+    overall_goals = totals['goals']
+    overall_assists = totals['assists']
+    overall_goals_assists = totals['goals_assists']
+    overall_clean_sheets = totals['cs']
+    overall_subs_out = totals['subs_out']
+    overall_subs_in = totals['subs_in']
+    overall_ogs = totals['ogs']
+    overall_yellow_cards = totals['yellow_cards']
+    overall_red_cards = totals['red_cards']
 
     overall_stats = [
         overall_matches,
@@ -1144,57 +860,22 @@ def player_detailed_statistics(request, pk):
         .first()
     )
 
-    goals_subquery = (
-        Goal.objects.filter(author=player, match__league__championship=OuterRef('id'))
-        .order_by()
-        .values('match__league__championship')
-        .annotate(c=Count('*'))
-        .values('c')
-    )
-
-    assists_subquery = (
-        Goal.objects.filter(assistent=player, match__league__championship=OuterRef('id'))
-        .order_by()
-        .values('match__league__championship')
-        .annotate(c=Count('*'))
-        .values('c')
-    )
-
-    goals_assists_subquery = (
-        Goal.objects.filter(Q(author=player) | Q(assistent=player), match__league__championship=OuterRef('id'))
-        .order_by()
-        .values('match__league__championship')
-        .annotate(c=Count('*'))
-        .values('c')
-    )
+    def best_season(field, attr):
+        season_id = max(
+            (season_id for season_id in totals_by_season if totals_by_season[season_id][field] > 0),
+            key=lambda season_id: totals_by_season[season_id][field],
+            default=None,
+        )
+        if season_id is None:
+            return None
+        season = seasons[season_id]
+        setattr(season, attr, totals_by_season[season_id][field])
+        return season
 
-    cs_subquery = (
-        OtherEvents.objects.cs()
-        .filter(author=player, match__league__championship=OuterRef('id'))
-        .order_by()
-        .values('match__league__championship')
-        .annotate(c=Count('*'))
-        .values('c')
-    )
-
-    most_goals_in_season = (
-        Season.objects.annotate(goals=Subquery(goals_subquery)).filter(goals__isnull=False).order_by('-goals').first()
-    )
-    most_assists_in_season = (
-        Season.objects.annotate(assists=Subquery(assists_subquery))
-        .filter(assists__isnull=False)
-        .order_by('-assists')
-        .first()
-    )
-    most_goals_assists_in_season = (
-        Season.objects.annotate(actions=Subquery(goals_assists_subquery))
-        .filter(actions__isnull=False)
-        .order_by('-actions')
-        .first()
-    )
-    most_cs_in_season = (
-        Season.objects.annotate(cs=Subquery(cs_subquery)).filter(cs__isnull=False).order_by('-cs').first()
-    )
+    most_goals_in_season = best_season('goals', 'goals')
+    most_assists_in_season = best_season('assists', 'assists')
+    most_goals_assists_in_season = best_season('goals_assists', 'actions')
+    most_cs_in_season = best_season('cs', 'cs')
 
     other_stats = {
         'first_match': first_match,
@@ -1223,131 +904,63 @@ def player_detailed_statistics(request, pk):
 
 def player_statistics_charts(request, pk):
     user = User.objects.filter(id=pk).select_related('user_player').first()
-    try:
-        player = user.user_player
-    except:
+    if not hasattr(user, 'user_player'):
         return HttpResponse(200)
 
-    player_charts = StatCharts.for_player(player)
-    matches_charts = player_charts.matches()
-    goals_assists_charts = player_charts.goals_assists()
-    cs_charts = player_charts.cs()
-    cards_charts = player_charts.cards()
-
     context = {
-        'matches_charts': matches_charts,
-        'goals_assists_charts': goals_assists_charts,
-        'cs_charts': cs_charts,
-        'cards_charts': cards_charts,
+        'charts': chart_sections(PLAYER_CHARTS, 'tournament:player_stats_charts_data', pk),
+        'specs_id': 'player-chart-specs',
     }
 
     return render(request, 'tournament/partials/player_stats_charts.html', context)
 
 
+def player_charts_etag(request, pk, section):
+    player_id = Player.objects.filter(name_id=pk).values_list('id', flat=True).first()
+    if player_id is None or section not in CHART_SECTIONS:
+        return None
+    return chart_data_etag(PLAYER, player_id, section)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=player_charts_etag)
+def player_statistics_charts_data(request, pk, section):
+    if section not in CHART_SECTIONS:
+        raise Http404
+    player = get_object_or_404(Player, name_id=pk)
+
+    return JsonResponse(player_chart_data(player, section))
+
+
 def team_statistics(request, pk):
     team = Team.objects.get(pk=pk)
-    prefetches = (
-        Prefetch('match_goal', queryset=Goal.objects.filter(team=team, match__is_played=True), to_attr='goals'),
-        Prefetch(
-            'match_goal', queryset=Goal.objects.filter(~Q(team=team), match__is_played=True), to_attr='conceded_goals'
-        ),
-        Prefetch(
-            'match_goal',
-            queryset=Goal.objects.filter(team=team, assistent__isnull=False, match__is_played=True),
-            to_attr='assists',
-        ),
-        Prefetch(
-            'match_event', queryset=OtherEvents.objects.cs().filter(team=team, match__is_played=True), to_attr='cs'
-        ),
-        Prefetch('match_event', queryset=Substitution.objects.filter(team=team, match__is_played=True), to_attr='subs'),
-        Prefetch(
-            'match_event', queryset=OtherEvents.objects.ogs().filter(team=team, match__is_played=True), to_attr='ogs'
-        ),
-        Prefetch(
-            'match_event',
-            queryset=OtherEvents.objects.yellow_cards().filter(team=team, match__is_played=True),
-            to_attr='yellow_cards',
-        ),
-        Prefetch(
-            'match_event',
-            queryset=OtherEvents.objects.red_cards().filter(team=team, match__is_played=True),
-            to_attr='red_cards',
-        ),
-    )
-
-    all_matches = (
-        Match.objects.filter(Q(team_home=team) | Q(team_guest=team), is_played=True)
-        .select_related('league__championship', 'result__winner')
-        .prefetch_related(*prefetches)
-    )
+    team_stats = TeamSeasonStats.objects.filter(team=team).select_related('season', 'league')
 
     stats_by_season = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
-    for match in all_matches:
-        league = match.league
-        season = league.championship
-
-        stats_by_league = stats_by_season[season][league]
-        stats_by_league['matches'] += 1
-        stats_by_league['wins'] = stats_by_league['wins']
-        stats_by_league['draws'] = stats_by_league['draws']
-        stats_by_league['losses'] = stats_by_league['losses']
-        if match.winner == team:
-            stats_by_league['wins'] += 1
-        elif match.is_draw():
-            stats_by_league['draws'] += 1
-        else:
-            stats_by_league['losses'] += 1
-        stats_by_league['winrate'] = 0
-        stats_by_league['goals'] += len(match.goals)
-        stats_by_league['conceded_goals'] += len(match.conceded_goals)
-        stats_by_league['assists'] += len(match.assists)
-        stats_by_league['cs'] += len(match.cs)
-        stats_by_league['subs'] += len(match.subs)
-        stats_by_league['ogs'] += len(match.ogs)
-        stats_by_league['yellow_cards'] += len(match.yellow_cards)
-        stats_by_league['red_cards'] += len(match.red_cards)
-
+    totals = defaultdict(int)
+    for row in team_stats:
+        stats_by_league = stats_by_season[row.season][row.league]
+        for field in TEAM_STAT_FIELDS:
+            stats_by_league[field] += getattr(row, field)
+            totals[field] += getattr(row, field)
     for season in stats_by_season:
         for league in stats_by_season[season]:
             league_stats = stats_by_season[season][league]
-            league_matches = league_stats['matches']
-            league_wins = league_stats['wins']
-            league_stats['winrate'] = float(league_wins) / (league_matches or 1) * 100
+            league_stats['winrate'] = float(league_stats['wins']) / (league_stats['matches'] or 1) * 100
 
-    all_wins = Match.objects.filter(Q(team_home=team) | Q(team_guest=team), result__winner=team, is_played=True)
-    all_draws = Match.objects.filter(
-        Q(team_home=team) | Q(team_guest=team), result__value=MatchResult.DRAW, is_played=True
-    )
-    all_losses = Match.objects.filter(
-        Q(team_home=team) | Q(team_guest=team),
-        ~Q(result__winner=team),
-        ~Q(result__value=MatchResult.DRAW),
-        is_played=True,
-    )
-    all_goals = Goal.objects.filter(team=team, match__is_played=True)
-    all_conceded_goals = Goal.objects.filter(
-        Q(match__team_home=team) | Q(match__team_guest=team), ~Q(team=team), match__is_played=True
-    )
-    all_assists = Goal.objects.filter(team=team, assistent__isnull=False, match__is_played=True)
-    all_clean_sheets = OtherEvents.objects.cs().filter(team=team, match__is_played=True)
-    all_subs = Substitution.objects.filter(team=team, match__is_played=True)
-    all_ogs = OtherEvents.objects.ogs().filter(team=team, match__is_played=True)
-    all_yellow_cards = OtherEvents.objects.yellow_cards().filter(team=team, match__is_played=True)
-    all_red_cards = OtherEvents.objects.red_cards().filter(team=team, match__is_played=True)
-
-    overall_matches = len(all_matches)
-    overall_wins = all_wins.count()
-    overall_draws = all_draws.count()
-    overall_losses = all_losses.count()
+    overall_matches = totals['matches']
+    overall_wins = totals['wins']
+    overall_draws = totals['draws']
+    overall_losses = totals['losses']
     overall_winrate = float(overall_wins) / (overall_matches or 1) * 100
-    overall_goals = all_goals.count()
-    overall_conceded_goals = all_conceded_goals.count()
-    overall_assists = all_assists.count()
-    overall_clean_sheets = all_clean_sheets.count()
-    overall_subs = all_subs.count()
-    overall_ogs = all_ogs.count()
-    overall_yellow_cards = all_yellow_cards.count()
-    overall_red_cards = all_red_cards.count()
+    overall_goals = totals['goals']
+    overall_conceded_goals = totals['conceded_goals']
+    overall_assists = totals['assists']
+    overall_clean_sheets = totals['cs']
+    overall_subs = totals['subs']
+    overall_ogs = totals['ogs']
+    overall_yellow_cards = totals['yellow_cards']
+    overall_red_cards = totals['red_cards']
 
     overall_stats = [
         overall_matches,
@@ -1407,181 +1020,21 @@ def team_statistics(request, pk):
                 extra_stats_by_league['red_cards'] = league_stats['red_cards'] / league_matches_count
 
     other_stats = {}
-
-    first_match = (
-        (team.home_matches.all() | team.guest_matches.all())
-        .filter(is_played=True, match_date__isnull=False)
-        .select_related('league__championship')
-        .order_by('match_date')
-        .first()
-    )
-
-    biggest_home_win = (
-        team.home_matches.filter(score_home__gt=F('score_guest'))
-        .annotate(goal_diff=F('score_home') - F('score_guest'))
-        .select_related('league__championship')
-        .order_by('-goal_diff')
-        .first()
-    )
-
-    biggest_guest_win = (
-        team.guest_matches.filter(score_guest__gt=F('score_home'))
-        .annotate(goal_diff=F('score_guest') - F('score_home'))
-        .select_related('league__championship')
-        .order_by('-goal_diff')
-        .first()
-    )
-
-    biggest_home_loss = (
-        team.home_matches.filter(score_home__lt=F('score_guest'))
-        .annotate(goal_diff=F('score_home') - F('score_guest'))
-        .select_related('league__championship')
-        .order_by('goal_diff')
-        .first()
-    )
-
-    biggest_guest_loss = (
-        team.guest_matches.filter(score_guest__lt=F('score_home'))
-        .annotate(goal_diff=F('score_guest') - F('score_home'))
-        .select_related('league__championship')
-        .order_by('goal_diff')
-        .first()
-    )
-
-    most_effective_draw = (
-        (team.home_matches.all() | team.guest_matches.all())
-        .filter(score_guest=F('score_home'))
-        .annotate(scored_total=F('score_home') + F('score_guest'))
-        .select_related('league__championship')
-        .order_by('-scored_total')
-        .first()
-    )
-
-    cards_filter = Q(match_event__event=OtherEvents.YELLOW_CARD) | Q(match_event__event=OtherEvents.RED_CARD)
-    most_biggest_cards_given = (
-        (team.home_matches.all() | team.guest_matches.all())
-        .annotate(cards_count=Count('match_event', filter=cards_filter))
-        .select_related('league__championship')
-        .order_by('-cards_count')
-    ).first()
-
-    fastest_goal = (
-        Goal.objects.filter(team=team)
-        .select_related('match__team_home', 'match__team_guest', 'match__league__championship')
-        .order_by('time_min', 'time_sec')
-        .first()
-    )
-    latest_goal = (
-        Goal.objects.filter(team=team)
-        .select_related('match__team_home', 'match__team_guest', 'match__league__championship')
-        .order_by('-time_min', '-time_sec')
-        .first()
-    )
-
-    greatest_goalscorer = team.goals.values('author').annotate(goals=Count('author')).order_by('-goals').first()
-    greatest_assistant = (
-        team.goals.values('assistent').annotate(assists=Count('assistent')).order_by('-assists').first()
-    )
-    greatest_goalkeeper = (
-        team.team_events.filter(event=OtherEvents.CLEAN_SHEET)
-        .values('author')
-        .annotate(cs=Count('author'))
-        .order_by('-cs')
-        .first()
-    )
-
-    home_matches = (
-        Match.objects.filter(team_home=team, is_played=True)
-        .values(player=F('team_home_start__id'))
-        .annotate(matches=Count('team_home_start__id'))
-        .order_by('-matches')
-    )
-    guest_matches = (
-        Match.objects.filter(team_guest=team, is_played=True)
-        .values(player=F('team_guest_start__id'))
-        .annotate(matches=Count('team_guest_start__id'))
-        .order_by('-matches')
-    )
-    sub_matches = (
-        Substitution.objects.filter(team=team)
-        .values(player=F('player_in'))
-        .distinct()
-        .annotate(matches=Count('match', distinct=True))
-        .order_by('-matches')
-    )
-
-    all_team_matches = list(home_matches) + list(guest_matches) + list(sub_matches)
-
-    # find all matches where player was in start but then also appeared on the field as a substitute
-    # to eliminate duplicates while calculating total matches count per player
-    all_team_players = set((player_matches['player'] for player_matches in all_team_matches))
-    dup_matches_subqery = (
-        Match.objects
-        .filter(
-            Q(team_home_start=OuterRef('id')) | Q(team_guest_start=OuterRef('id')),
-            match_substitutions__player_in=OuterRef('id'),
-            is_played=True
-        )
-        .order_by()
-        .values('match_substitutions__player_in')
-        .annotate(c=Count('id', distinct=True))
-        .values('c')
-    )
-    dup_matches = (
-        Player.objects.filter(pk__in=all_team_players)
-        .values(player=F('id'))
-        .annotate(matches=Coalesce(Subquery(dup_matches_subqery), 0))
-    )
-    dup_matches_dict = {item['player']: item['matches'] for item in dup_matches}
-
-    matches_by_player = defaultdict(int)
-    for player_matches in all_team_matches:
-        matches_by_player[player_matches['player']] += player_matches['matches']
-    for player in all_team_players:
-        if player in dup_matches_dict:
-            matches_by_player[player] -= dup_matches_dict[player]
-
-    greatest_player = None
-    if len(all_team_matches) > 0:
-        greatest_player = sorted(matches_by_player.items(), key=lambda kv: kv[1], reverse=True)[0]
-
-    greatest_sub_in = sub_matches.first()
-
-    other_stats['first_match'] = first_match
-    other_stats['biggest_home_win'] = biggest_home_win
-    other_stats['biggest_guest_win'] = biggest_guest_win
-    other_stats['biggest_home_loss'] = biggest_home_loss
-    other_stats['biggest_guest_loss'] = biggest_guest_loss
-    other_stats['most_effective_draw'] = most_effective_draw
-    other_stats['most_biggest_cards_given'] = most_biggest_cards_given
-    other_stats['fastest_goal'] = fastest_goal
-    other_stats['latest_goal'] = latest_goal
-
-    if greatest_goalscorer:
-        other_stats['greatest_goalscorer'] = {
-            'player': User.objects.get(user_player=greatest_goalscorer['author']),
-            'count': greatest_goalscorer['goals'],
-        }
-    if greatest_assistant:
-        other_stats['greatest_assistant'] = {
-            'player': User.objects.get(user_player=greatest_assistant['assistent']),
-            'count': greatest_assistant['assists'],
-        }
-    if greatest_goalkeeper:
-        other_stats['greatest_goalkeeper'] = {
-            'player': User.objects.get(user_player=greatest_goalkeeper['author']),
-            'count': greatest_goalkeeper['cs'],
-        }
-    if greatest_player:
-        other_stats['greatest_player'] = {
-            'player': User.objects.get(user_player=greatest_player[0]),
-            'count': greatest_player[1],
-        }
-    if greatest_sub_in:
-        other_stats['greatest_sub_in'] = {
-            'player': User.objects.get(user_player=greatest_sub_in['player']),
-            'count': greatest_sub_in['matches'],
-        }
+    records = get_team_records(team)
+    if records:
+        for field in TEAM_RECORD_MATCHES:
+            other_stats[field] = getattr(records, field)
+        other_stats['fastest_goal'] = records.fastest_goal
+        other_stats['latest_goal'] = records.latest_goal
+
+        other_stats['most_biggest_cards_given'] = records.most_cards_match
+        if records.most_cards_match:
+            records.most_cards_match.cards_count = records.most_cards_count
+
+        for field in TEAM_RECORD_PLAYERS:
+            player = getattr(records, field)
+            if player:
+                other_stats[field] = {'player': player.name, 'count': getattr(records, field + '_count')}
 
     context = {
         'team': team,
@@ -1596,19 +1049,40 @@ def team_statistics(request, pk):
 
 
 def team_statistics_charts(request, pk):
-    team = Team.objects.filter(id=pk).first()
-
-    team_charts = StatCharts.for_team(team)
-    matches_charts = team_charts.matches()
-    goals_assists_charts = team_charts.goals_assists()
-    cs_charts = team_charts.cs()
-    cards_charts = team_charts.cards()
+    get_object_or_404(Team, id=pk)
 
     context = {
-        'matches_charts': matches_charts,
-        'goals_assists_charts': goals_assists_charts,
-        'cs_charts': cs_charts,
-        'cards_charts': cards_charts,
+        'charts': chart_sections(TEAM_CHARTS, 'tournament:team_stats_charts_data', pk),
+        'specs_id': 'team-chart-specs',
     }
 
     return render(request, 'tournament/partials/team_stats_charts.html', context)
+
+
+def team_charts_etag(request, pk, section):
+    if section not in CHART_SECTIONS:
+        return None
+    return chart_data_etag(TEAM, pk, section)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=team_charts_etag)
+def team_statistics_charts_data(request, pk, section):
+    if section not in CHART_SECTIONS:
+        raise Http404
+    team = get_object_or_404(Team, id=pk)
+
+    return JsonResponse(team_chart_data(team, section))
+
+
+def chart_sections(specs, data_url_name, pk):
+    return [
+        {
+            'key': section,
+            'name': section.replace('_', '-'),
+            'title': SECTION_TITLES[section],
+            'url': reverse(data_url_name, args=(pk, section)),
+            'specs': specs[section],
+        }
+        for section in CHART_SECTIONS
+    ]